@@ -0,0 +1,93 @@
+"""
+API压测：对比异步接口与 /sync 下的同步接口的吞吐量（requests/sec）与p99延迟
+
+先启动API服务（uvicorn api.main:app），再运行：
+    python api/benchmark.py --base-url http://localhost:8000 --requests 2000 --concurrency 64
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from typing import Dict, List
+
+import httpx
+import numpy as np
+
+# Add project root to path to allow importing from backend
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config.questions import QUESTIONS
+
+
+async def run_load(client: httpx.AsyncClient, paths: List[str], total: int, concurrency: int) -> Dict[str, float]:
+    """以固定并发轮流请求paths，共total次，返回吞吐量与延迟分位数"""
+    latencies = []
+    errors = 0
+    counter = iter(range(total))
+
+    async def worker():
+        nonlocal errors
+        for i in counter:
+            start = time.perf_counter()
+            try:
+                response = await client.get(paths[i % len(paths)])
+                if response.status_code >= 500:
+                    errors += 1
+            except httpx.HTTPError:
+                errors += 1
+            latencies.append(time.perf_counter() - start)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    latencies_ms = np.array(latencies) * 1000
+    return {
+        "requests": total,
+        "errors": errors,
+        "rps": round(total / elapsed, 1),
+        "p50_ms": round(float(np.percentile(latencies_ms, 50)), 2),
+        "p99_ms": round(float(np.percentile(latencies_ms, 99)), 2),
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Benchmark async vs sync API handlers")
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--requests", type=int, default=2000, help="requests per endpoint and variant")
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--user-ids", default="", help="comma separated user ids for /score (default: sample from Redis)")
+    args = parser.parse_args()
+
+    user_ids = [u for u in args.user_ids.split(",") if u]
+    if not user_ids:
+        from backend.redis_manager import RedisManager
+        user_ids = RedisManager().get_all_users()[:50]
+    if not user_ids:
+        parser.error("no users found; pass --user-ids or load some answers first")
+
+    endpoints = {
+        "score": [f"/score/{user_id}" for user_id in user_ids],
+        "distribution": [f"/distribution/{question_id}" for question_id in QUESTIONS],
+        "questions": ["/questions"],
+    }
+
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    report = {}
+    async with httpx.AsyncClient(base_url=args.base_url, limits=limits, timeout=60) as client:
+        for name, paths in endpoints.items():
+            report[name] = {}
+            for variant, prefix in (("sync", "/sync"), ("async", "")):
+                # 预热，避免把建连时间计入结果
+                await run_load(client, [prefix + path for path in paths], args.concurrency, args.concurrency)
+                report[name][variant] = await run_load(
+                    client, [prefix + path for path in paths], args.requests, args.concurrency
+                )
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
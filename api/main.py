@@ -1,6 +1,10 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import APIRouter, Depends, FastAPI, HTTPException, Query, Request
+from fastapi.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
 from pydantic import BaseModel
-from typing import Dict, Any, Tuple, List
+from typing import Dict, Any, Tuple, List, Literal, Optional
+from contextlib import asynccontextmanager
+import asyncio
+import base64
 import numpy as np
 import sys
 import os
@@ -10,23 +14,48 @@ import json
 # Add project root to path to allow importing from backend
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from backend.redis_manager import RedisManager
-from backend.scoring_engine import ScoringEngine
+from backend.async_redis_manager import AsyncRedisManager
+from backend.live_updates import LiveUpdates
+from backend.redis_manager import RedisManager, histogram_bucket
+from backend.redis_metrics import REDIS_METRICS
 from config.questions import QUESTIONS, QuestionType
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # 启动时创建共享连接池的管理器，所有请求复用；API只读取重算结果，不创建ScoringEngine
+    # 异步接口使用AsyncRedisManager；/sync 下的同步接口保留原有实现，用于对比压测
+    redis_manager = RedisManager()
+    async_redis_manager = AsyncRedisManager()
+    app.state.redis_manager = redis_manager
+    app.state.async_redis_manager = async_redis_manager
+    # 问题分布缓存：question_id -> (统计版本, 响应内容)
+    app.state.distribution_cache = {}
+    # 实时推送：整个进程共用一个Redis订阅
+    app.state.question_versions = {}
+    live_updates = LiveUpdates(async_redis_manager, transform=lambda update: add_question_counts(app, update))
+    live_updates.start()
+    app.state.live_updates = live_updates
+    yield
+    await live_updates.stop()
+    redis_manager.close()
+    await async_redis_manager.close()
+
 app = FastAPI(
     title="ChongQing Identity Map API",
     description="API for fetching user scores and question distributions from the ChongQing Identity Map project.",
     version="1.0.0",
+    lifespan=lifespan,
 )
 
 # --- Pydantic Models ---
 class ScoreResponse(BaseModel):
     user_id: str
-    final_x: float
-    final_y: float
+    final_x: Optional[float] = None
+    final_y: Optional[float] = None
     average_x: float
     average_y: float
+    generation: int
+    stale: bool
 
 class DistributionResponse(BaseModel):
     question_id: str
@@ -37,106 +66,352 @@ class DistributionResponse(BaseModel):
 class AllQuestionsResponse(BaseModel):
     questions: Dict[str, str]
 
+class UserCoordinates(BaseModel):
+    user_id: str
+    x: float
+    y: float
+
+class BulkScoresResponse(BaseModel):
+    generation: int
+    total: int
+    offset: int
+    limit: int
+    average_x: float
+    average_y: float
+    users: Optional[List[UserCoordinates]] = None
+    user_ids: Optional[List[str]] = None
+    xy: Optional[str] = None
+
+class HealthResponse(BaseModel):
+    status: str
+    redis: bool
+    live_updates: bool
+    pool: Dict[str, int]
+    async_pool: Dict[str, int]
+
 # --- Dependencies ---
-def get_scoring_engine():
-    redis_manager = RedisManager()
-    return ScoringEngine(redis_manager)
+def get_redis_manager(request: Request) -> RedisManager:
+    return request.app.state.redis_manager
 
-def get_redis_manager():
-    return RedisManager()
+def get_async_redis_manager(request: Request) -> AsyncRedisManager:
+    return request.app.state.async_redis_manager
+
+# --- Helpers ---
+def build_distribution(question_config: Dict[str, Any], answers: List[Any]) -> Dict[str, Any]:
+    """
+    Builds the response distribution from a question's answers: percentages per
+    option for SINGLE_CHOICE, per ingredient for COMBINATION (share of respondents
+    who picked it), counts per unique answer otherwise.
+    """
+    total_respondents = len(answers)
+    distribution = {}
+    if total_respondents == 0:
+        return distribution
+
+    q_type = question_config.get('type')
+
+    if q_type == QuestionType.SINGLE_CHOICE.value:
+        counts = Counter(answers)
+        options = question_config.get('options', [])
+        for option in options:
+            count = counts.get(option, 0)
+            percentage = (count / total_respondents) * 100
+            distribution[option] = f"{percentage:.2f}%"
+
+    elif q_type == QuestionType.COMBINATION.value:
+        # Nearly every combination is unique, so count each ingredient separately
+        counts = Counter(option for ans in answers if isinstance(ans, list) for option in set(ans))
+        for option in question_config.get('options', []):
+            percentage = (counts.get(option, 0) / total_respondents) * 100
+            distribution[option] = f"{percentage:.2f}%"
+
+    else: # For TEXT, NUMBER, etc.
+        # Numeric answers are counted per histogram bucket, like the `bin:` counters
+        numeric = [answer for answer in answers if isinstance(answer, (int, float)) and not isinstance(answer, bool)]
+        for bucket, count in Counter(histogram_bucket(question_config['id'], answer) for answer in numeric).items():
+            distribution[bucket] = count
+        answers = [answer for answer in answers if not isinstance(answer, (int, float)) or isinstance(answer, bool)]
+        # Use the stringified list for counting to handle potential unhashable types
+        counts = Counter(json.dumps(answer, sort_keys=True) for answer in answers)
+        # Create a user-friendly distribution dict
+        for stringified_answer, count in counts.items():
+            # Convert the string back to its original Python object for the response key
+            original_answer = json.loads(stringified_answer)
+            # Ensure the key is a string for the Pydantic model
+            distribution[str(original_answer)] = count
+
+    return distribution
+
+def distribution_from_counts(question_config: Dict[str, Any], total_respondents: int,
+                             counts: Dict[str, int]) -> Dict[str, Any]:
+    """
+    Builds the same distribution as build_distribution from the maintained
+    `question:stats` counters (option:/bin: fields) instead of the answers.
+    """
+    distribution = {}
+    if total_respondents == 0:
+        return distribution
+
+    q_type = question_config.get('type')
+
+    if q_type in (QuestionType.SINGLE_CHOICE.value, QuestionType.COMBINATION.value):
+        # Combination questions keep one option: counter per ingredient
+        for option in question_config.get('options', []):
+            percentage = (counts.get(f"option:{option}", 0) / total_respondents) * 100
+            distribution[option] = f"{percentage:.2f}%"
+
+    else: # For TEXT, NUMBER, etc.
+        for field, count in counts.items():
+            if field.startswith("option:"):
+                distribution[field[len("option:"):]] = count
+            elif field.startswith("bin:"):
+                distribution[field[len("bin:"):]] = count
+
+    return distribution
+
+def option_counts(question_config: Dict[str, Any], counts: Dict[str, int]) -> Dict[str, int]:
+    """Maps `question:stats` counter fields to the answer they count."""
+    result = {}
+    if question_config.get('type') in (QuestionType.SINGLE_CHOICE.value, QuestionType.COMBINATION.value):
+        for option in question_config.get('options', []):
+            result[option] = counts.get(f"option:{option}", 0)
+        return result
+
+    for field, count in counts.items():
+        _, _, value = field.partition(":")
+        result[value] = count
+    return result
+
+async def add_question_counts(app: FastAPI, update: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Adds the option counts of every question whose statistics changed since the
+    previous update. Runs once per recompute generation for all stream clients.
+    """
+    redis = app.state.async_redis_manager
+    versions = await redis.get_question_versions()
+    changed = [qid for qid, version in versions.items()
+               if qid in QUESTIONS and app.state.question_versions.get(qid) != version]
+
+    question_counts = {}
+    for question_id in changed:
+        version, total_respondents, counts = await redis.get_question_distribution_counts(question_id)
+        question_counts[question_id] = {
+            "total_respondents": total_respondents,
+            "counts": option_counts(QUESTIONS[question_id], counts),
+        }
+        versions[question_id] = version
+
+    app.state.question_versions = versions
+    return {**update, "question_counts": question_counts}
+
+def score_response(user_id: str, snapshot: Dict[str, Any]) -> Dict[str, Any]:
+    """Builds the `/score` body from a stored score snapshot; 404 for unknown users."""
+    if not snapshot["exists"]:
+        raise HTTPException(status_code=404, detail="User not found")
+
+    final_x, final_y = snapshot["final"] or (None, None)
+    avg_x, avg_y = snapshot["average"]
+    return {
+        "user_id": user_id,
+        "final_x": final_x,
+        "final_y": final_y,
+        "average_x": avg_x,
+        "average_y": avg_y,
+        "generation": snapshot["generation"],
+        "stale": snapshot["stale"],
+    }
 
 # --- API Endpoints ---
 @app.get("/score/{user_id}", response_model=ScoreResponse)
-def get_user_score(user_id: str):
+async def get_user_score(user_id: str, redis: AsyncRedisManager = Depends(get_async_redis_manager)):
     """
     Retrieves the final (x, y) coordinates for a given user,
     as well as the average coordinates for all participants.
+
+    Read-only: returns the coordinates written by the last recompute. `generation`
+    is the recompute generation of the average; `stale` is true while a submitted
+    recompute is still pending or the user has no coordinates yet (final_x/final_y null).
     """
-    try:
-        scoring_engine = get_scoring_engine()
-        
-        # Check if user exists
-        if not get_redis_manager().get_user_answers(user_id):
-            raise HTTPException(status_code=404, detail="User not found")
-
-        final_x, final_y = scoring_engine.get_final_axes_scores(user_id)
-        avg_x, avg_y = scoring_engine.get_average_axes_scores()
-        
-        return {
-            "user_id": user_id,
-            "final_x": final_x,
-            "final_y": final_y,
-            "average_x": avg_x,
-            "average_y": avg_y,
-        }
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    return score_response(user_id, await redis.get_score_snapshot(user_id))
+
+@app.get("/scores", response_model=BulkScoresResponse, response_model_exclude_none=True)
+async def get_all_scores(offset: int = Query(0, ge=0),
+                         limit: int = Query(500, ge=1, le=5000),
+                         format: Literal["json", "float32"] = "json",
+                         redis: AsyncRedisManager = Depends(get_async_redis_manager)):
+    """
+    Retrieves the final (x, y) coordinates of every participant, ordered by user id
+    and paginated, together with the average over all participants. Read-only.
+    - `format=json`: a `users` list of objects.
+    - `format=float32`: columnar `user_ids` plus `xy`, the base64 encoding of
+      little-endian float32 values x0, y0, x1, y1, ...
+    """
+    generation = await redis.get_scores_generation()
+    all_final_axes = await redis.get_final_axes_by_user()
+
+    avg_x, avg_y = 0, 0
+    if all_final_axes:
+        avg_x, avg_y = np.mean(list(all_final_axes.values()), axis=0).tolist()
+
+    user_ids = sorted(all_final_axes)[offset:offset + limit]
+    body = {
+        "generation": generation,
+        "total": len(all_final_axes),
+        "offset": offset,
+        "limit": limit,
+        "average_x": avg_x,
+        "average_y": avg_y,
+    }
+    if format == "float32":
+        coords = np.array([all_final_axes[user_id] for user_id in user_ids], dtype="<f4").reshape(-1)
+        body["user_ids"] = user_ids
+        body["xy"] = base64.b64encode(coords.tobytes()).decode("ascii")
+    else:
+        body["users"] = [
+            {"user_id": user_id, "x": all_final_axes[user_id][0], "y": all_final_axes[user_id][1]}
+            for user_id in user_ids
+        ]
+    return body
 
 @app.get("/distribution/{question_id}", response_model=DistributionResponse)
-def get_question_distribution(question_id: str):
+async def get_question_distribution(question_id: str, request: Request,
+                                    redis: AsyncRedisManager = Depends(get_async_redis_manager)):
     """
     Retrieves the answer distribution for a given question.
     - For SINGLE_CHOICE and COMBINATION questions, it returns the percentage for each option.
     - For TEXT, NUMBER, and other types, it returns the count for each unique answer.
+
+    Served from the maintained per-question counters. The ETag changes whenever the
+    question's statistics change; polls with a matching If-None-Match get 304.
     """
-    redis = get_redis_manager()
-    
     if question_id not in QUESTIONS:
         raise HTTPException(status_code=404, detail="Question not found")
-        
-    question_config = QUESTIONS[question_id]
-    all_answers_data = redis.get_question_answers(question_id)
-    total_respondents = len(all_answers_data)
-    
-    # Convert all answers to a hashable type (string) to be used in Counter
-    stringified_answers = [json.dumps(a['answer'], sort_keys=True) for a in all_answers_data]
-    answers = [a['answer'] for a in all_answers_data]
 
-    distribution = {}
-    if total_respondents > 0:
-        q_type = question_config.get('type')
-
-        if q_type == QuestionType.SINGLE_CHOICE.value:
-            counts = Counter(answers)
-            options = question_config.get('options', [])
-            for option in options:
-                count = counts.get(option, 0)
-                percentage = (count / total_respondents) * 100
-                distribution[option] = f"{percentage:.2f}%"
-        
-        elif q_type == QuestionType.COMBINATION.value:
-            # For combinations, we treat each unique combination as an option
-            # Answers are lists, so we sort them to ensure consistent representation
-            flat_list = [",".join(sorted(ans)) for ans in answers if isinstance(ans, list)]
-            counts = Counter(flat_list)
-            for combo, count in counts.items():
-                percentage = (count / total_respondents) * 100
-                distribution[combo] = f"{percentage:.2f}%"
-
-        else: # For TEXT, NUMBER, etc.
-            # Use the stringified list for counting to handle potential unhashable types
-            counts = Counter(stringified_answers)
-            # Create a user-friendly distribution dict
-            for stringified_answer, count in counts.items():
-                # Convert the string back to its original Python object for the response key
-                original_answer = json.loads(stringified_answer)
-                # Ensure the key is a string for the Pydantic model
-                distribution[str(original_answer)] = count
+    version = await redis.get_question_version(question_id)
+    headers = {"ETag": f'W/"{question_id}-{version}"', "Cache-Control": "no-cache"}
+    if request.headers.get("if-none-match") == headers["ETag"]:
+        return Response(status_code=304, headers=headers)
 
-    return {
-        "question_id": question_id,
-        "label": question_config['label'],
-        "total_respondents": total_respondents,
-        "distribution": distribution,
-    }
+    cache = request.app.state.distribution_cache
+    cached = cache.get(question_id)
+    if cached is None or cached[0] != version:
+        version, total_respondents, counts = await redis.get_question_distribution_counts(question_id)
+        question_config = QUESTIONS[question_id]
+        cached = (version, {
+            "question_id": question_id,
+            "label": question_config['label'],
+            "total_respondents": total_respondents,
+            "distribution": distribution_from_counts(question_config, total_respondents, counts),
+        })
+        cache[question_id] = cached
+        headers["ETag"] = f'W/"{question_id}-{version}"'
+
+    return JSONResponse(cached[1], headers=headers)
 
 @app.get("/questions", response_model=AllQuestionsResponse)
-def get_all_questions():
+async def get_all_questions():
     """
     Retrieves a list of all available question IDs and their labels.
     """
     return {"questions": {qid: qconfig['label'] for qid, qconfig in QUESTIONS.items()}}
 
+@app.get("/stream")
+async def stream_updates(request: Request):
+    """
+    Server-Sent Events stream. After a `hello` event with the current generation,
+    an `update` event is pushed whenever a recompute generation finishes:
+    changed users' final (x, y), the new average, and the option counts of
+    questions whose statistics changed.
+    """
+    live_updates = request.app.state.live_updates
+    generation = await request.app.state.async_redis_manager.get_scores_generation()
+
+    async def events():
+        async with live_updates.subscribe() as queue:
+            yield f"event: hello\ndata: {json.dumps({'generation': generation})}\n\n"
+            while not await request.is_disconnected():
+                try:
+                    update = await asyncio.wait_for(queue.get(), timeout=15)
+                except asyncio.TimeoutError:
+                    # 注释行保持连接，避免被代理判定为空闲
+                    yield ": keep-alive\n\n"
+                    continue
+                yield (f"id: {update['generation']}\nevent: update\n"
+                       f"data: {json.dumps(update, ensure_ascii=False)}\n\n")
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.get("/health", response_model=HealthResponse)
+async def health(request: Request):
+    """
+    Pings Redis, checks the live updates listener and reports connection pool usage.
+    Returns 503 when Redis is unreachable or the listener task has stopped.
+    """
+    redis = get_async_redis_manager(request)
+    redis_ok = await redis.ping()
+    live_updates_ok = request.app.state.live_updates.running
+    healthy = redis_ok and live_updates_ok
+    body = {
+        "status": "ok" if healthy else "unavailable",
+        "redis": redis_ok,
+        "live_updates": live_updates_ok,
+        "pool": get_redis_manager(request).pool_stats(),
+        "async_pool": redis.pool_stats(),
+    }
+    return JSONResponse(body, status_code=200 if healthy else 503)
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics(request: Request):
+    """
+    Prometheus text exposition of the Redis instrumentation: commands and round
+    trips by calling method, per-command latency histograms, slow calls, plus
+    connection pool gauges for the sync and async managers.
+    """
+    lines = [
+        "# HELP redis_pool_connections Connections in the Redis connection pool, by state.",
+        "# TYPE redis_pool_connections gauge",
+    ]
+    pools = {"sync": get_redis_manager(request).pool_stats(),
+             "async": get_async_redis_manager(request).pool_stats()}
+    for pool, stats in pools.items():
+        for state in ("max", "created", "available", "in_use"):
+            lines.append(f'redis_pool_connections{{pool="{pool}",state="{state}"}} {stats[f"{state}_connections"]}')
+    return PlainTextResponse(REDIS_METRICS.prometheus() + "\n".join(lines) + "\n",
+                             media_type="text/plain; version=0.0.4")
+
 @app.get("/")
-def read_root():
-    return {"message": "Welcome to the ChongQing Identity Map API. Visit /docs for documentation."} 
\ No newline at end of file
+async def read_root():
+    return {"message": "Welcome to the ChongQing Identity Map API. Visit /docs for documentation."}
+
+# --- Sync Endpoints ---
+# 原有的同步实现（在Starlette线程池中执行阻塞I/O），与异步接口返回相同结果，供压测对比
+sync_router = APIRouter(prefix="/sync", tags=["sync"])
+
+@sync_router.get("/score/{user_id}", response_model=ScoreResponse)
+def get_user_score_sync(user_id: str, redis: RedisManager = Depends(get_redis_manager)):
+    """Blocking implementation of `/score/{user_id}`."""
+    return score_response(user_id, redis.get_score_snapshot(user_id))
+
+@sync_router.get("/distribution/{question_id}", response_model=DistributionResponse)
+def get_question_distribution_sync(question_id: str, redis: RedisManager = Depends(get_redis_manager)):
+    """Blocking implementation of `/distribution/{question_id}`."""
+    if question_id not in QUESTIONS:
+        raise HTTPException(status_code=404, detail="Question not found")
+
+    question_config = QUESTIONS[question_id]
+    answers = [a['answer'] for a in redis.get_question_answers(question_id)]
+
+    return {
+        "question_id": question_id,
+        "label": question_config['label'],
+        "total_respondents": len(answers),
+        "distribution": build_distribution(question_config, answers),
+    }
+
+@sync_router.get("/questions", response_model=AllQuestionsResponse)
+def get_all_questions_sync():
+    """Blocking implementation of `/questions`."""
+    return {"questions": {qid: qconfig['label'] for qid, qconfig in QUESTIONS.items()}}
+
+app.include_router(sync_router)
@@ -5,12 +5,21 @@ import streamlit as st
 import pandas as pd
 import numpy as np
 import plotly.graph_objects as go
-from backend.redis_manager import RedisManager
+from backend.data_export import EXPORT_FILES, available_formats, export_bytes
+from backend.redis_manager import RedisManager, storage_backend
+from backend.redis_metrics import LATENCY_BUCKETS, REDIS_METRICS, instrument_client, is_instrumented
 from backend.scoring_engine import ScoringEngine
-from config.questions import QUESTIONS, QuestionType, ScoringRule
-import json
+from backend.scoring_profiler import InstrumentProfiler, profile_recalculation, report_json
+from config.questions import QUESTIONS, QuestionType
+import os
+import time
 from datetime import datetime
 
+# 是否把全局重算交给后台服务（python -m backend.recompute_worker）
+# 进程内存储（REDIS_BACKEND=memory）无法与后台服务共享数据，总是在提交时直接重算
+RECOMPUTE_IN_BACKGROUND = (os.environ.get("RECOMPUTE_IN_BACKGROUND", "true").lower() == "true"
+                           and storage_backend() != "memory")
+
 # 初始化
 @st.cache_resource
 def init_redis():
@@ -33,6 +42,8 @@ if 'user_id' not in st.session_state:
     st.session_state.user_id = None
 if 'current_answers' not in st.session_state:
     st.session_state.current_answers = {}
+if 'pending_version' not in st.session_state:
+    st.session_state.pending_version = 0
 
 # 侧边栏
 with st.sidebar:
@@ -258,46 +269,46 @@ else:
             submitted = st.form_submit_button("提交所有答案", type="primary")
 
             if submitted:
-                # 保存答案
-                success_count = 0
-                for q_id, answer in answers.items():
-                    if redis_manager.save_user_answer(st.session_state.user_id, q_id, answer):
-                        success_count += 1
-                
-                if success_count == len(answers):
+                # 保存答案（整份提交一次写入）
+                if redis_manager.save_user_answers(st.session_state.user_id, answers):
                     st.success("答案提交成功！")
-                    
-                    # 计算得分
-                    scores = scoring_engine.calculate_user_scores(st.session_state.user_id)
-                    
-                    # 定义需要全局重算的评分规则
-                    recalculation_rules = {
-                        ScoringRule.REAL_TIME_RANK.value,
-                        ScoringRule.DISTANCE_SCORE.value,
-                        ScoringRule.MAJORITY_VOTE.value,
-                        ScoringRule.COUNT_RANK.value,
-                        ScoringRule.DYNAMIC_YN.value
-                    }
 
-                    # 对于需要重算的题目，重新计算所有人的分数
-                    needs_recalculation = any(
-                        QUESTIONS.get(q_id, {}).get("rule") in recalculation_rules 
-                        for q_id in answers
-                    )
-
-                    if needs_recalculation:
-                        with st.spinner("正在重新计算所有用户得分..."):
-                            scoring_engine.recalculate_all_scores()
+                    # 得分与最终坐标依赖全体分布，只在重算中写入，因此每次提交都触发一次重算
+                    if RECOMPUTE_IN_BACKGROUND:
+                        st.session_state.pending_version = redis_manager.enqueue_recompute(st.session_state.user_id)
+                        st.info("坐标正在后台更新，可在「查看成绩」页面查看最新结果")
+                    else:
+                        with st.spinner("正在重新计算受影响用户的得分..."):
+                            report = scoring_engine.recalculate_incremental([st.session_state.user_id])
+                        st.caption(f"本次更新了 {report['touched_users']} / {report['total_users']} 位用户的得分")
                     
                     st.balloons()
                 else:
-                    st.error("部分答案保存失败，请重试")
+                    st.error("答案保存失败，请重试")
     
     elif page == "查看成绩":
         st.title("我的坐标")
 
-        final_x, final_y = scoring_engine.get_final_axes_scores(st.session_state.user_id)
-        avg_x, avg_y = scoring_engine.get_average_axes_scores()
+        # 等待后台重算完成本次提交对应的版本
+        scores_version = redis_manager.get_scores_version()
+        if scores_version < st.session_state.pending_version:
+            with st.spinner("坐标正在后台更新..."):
+                deadline = time.time() + 10
+                while scores_version < st.session_state.pending_version and time.time() < deadline:
+                    time.sleep(0.5)
+                    scores_version = redis_manager.get_scores_version()
+        if scores_version < st.session_state.pending_version:
+            st.warning("坐标仍在更新中，当前显示的是上一版本的结果")
+            st.button("刷新")
+        st.caption(f"坐标版本: {scores_version}")
+
+        # 只读取重算写入的坐标，查看成绩不会触发任何计算或写入
+        snapshot = redis_manager.get_score_snapshot(st.session_state.user_id)
+        if snapshot["final"] is None:
+            st.info("尚未生成坐标，请先完成答题并稍后刷新")
+            st.stop()
+        final_x, final_y = snapshot["final"]
+        avg_x, avg_y = snapshot["average"]
         
         st.markdown("---")
         
@@ -393,16 +404,11 @@ else:
             else:
                 if question_config['type'] in [QuestionType.SINGLE_CHOICE.value, QuestionType.COMBINATION.value]:
                     
+                    # 组合题按每种调料被选择的人数统计（百分比之和可超过100%）
                     vote_counts = {}
-                    if question_config['type'] == QuestionType.SINGLE_CHOICE.value:
-                        for option in question_config['options']:
-                            count = int(stats.get(f"option:{option}", 0))
-                            vote_counts[option] = count
-                    else: # Combination
-                        for key, value in stats.items():
-                            if key.startswith("combo:"):
-                                combo = key.replace("combo:", "")
-                                vote_counts[combo] = int(value)
+                    for option in question_config['options']:
+                        count = int(stats.get(f"option:{option}", 0))
+                        vote_counts[option] = count
                     
                     if not vote_counts:
                         st.info("该题目暂无回答记录")
@@ -432,16 +438,20 @@ else:
         col1, col2, col3 = st.columns(3)
         
         with col1:
+            export_format = st.selectbox("导出格式", available_formats(),
+                                         help="ndjson保留全部数据；csv/parquet为每个用户一行的表格")
             if st.button("导出所有数据", type="secondary"):
-                data = redis_manager.export_data()
+                with st.spinner("正在导出..."):
+                    # 逐批读取并压缩，不在内存中构建完整的JSON
+                    data = export_bytes(redis_manager, export_format)
                 
                 # 提供下载
-                json_str = json.dumps(data, ensure_ascii=False, indent=2)
+                extension, mime = EXPORT_FILES[export_format]
                 st.download_button(
                     label="下载数据",
-                    data=json_str,
-                    file_name=f"questionnaire_data_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json",
-                    mime="application/json"
+                    data=data,
+                    file_name=f"questionnaire_data_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{extension}",
+                    mime=mime
                 )
         
         with col2:
@@ -451,12 +461,151 @@ else:
                 st.success("重算完成！")
         
         with col3:
+            if st.button("校验统计数据", type="secondary"):
+                drift = redis_manager.check_question_stats()
+                if drift:
+                    st.warning(f"{len(drift)} 道题目的统计与答案不一致")
+                    st.json(drift)
+                else:
+                    st.success("统计数据与答案一致")
+
+            # 修复会用读取时的答案覆盖统计，期间到达的提交会被回滚，只能在没有观众提交时执行
+            confirm_repair = st.checkbox("我确认当前没有观众提交")
+            if st.button("修复统计数据", type="secondary", disabled=not confirm_repair):
+                with st.spinner("正在修复..."):
+                    drift = redis_manager.check_question_stats(repair=True)
+                st.success(f"已修复 {len(drift)} 道题目的统计")
+
             if st.button("清空所有数据", type="secondary"):
                 if st.checkbox("我确认要清空所有数据"):
                     redis_manager.clear_all_data()
                     st.success("数据已清空！")
                     st.experimental_rerun()
 
+        st.markdown("---")
+        st.header("坐标回放")
+        latest_generation = redis_manager.get_scores_generation()
+        if latest_generation == 0:
+            st.info("暂无重算记录")
+        else:
+            generation = st.slider("重算代数", min_value=1, max_value=max(latest_generation, 2),
+                                   value=latest_generation)
+            positions = redis_manager.get_positions_at_generation(generation)
+            st.caption(f"第 {generation} 代：{len(positions)} 位用户")
+            replay_fig = go.Figure(go.Scatter(
+                x=[x for x, _ in positions.values()],
+                y=[y for _, y in positions.values()],
+                mode='markers',
+                text=list(positions.keys()),
+                marker=dict(color='gray', size=8)
+            ))
+            replay_fig.update_layout(
+                xaxis=dict(range=[-110, 110], zeroline=True, zerolinewidth=2, zerolinecolor='black'),
+                yaxis=dict(range=[-110, 110], zeroline=True, zerolinewidth=2, zerolinecolor='black'),
+                height=600,
+                showlegend=False
+            )
+            st.plotly_chart(replay_fig, use_container_width=True)
+
+        st.markdown("---")
+        st.header("Redis调用统计")
+        if not is_instrumented(redis_manager.redis_client):
+            st.info("未启用Redis调用统计（每个命令都要回溯调用栈归因，默认关闭；也可设置 REDIS_INSTRUMENTATION=true）")
+            if st.button("在本进程中启用调用统计"):
+                instrument_client(redis_manager.redis_client)
+                st.experimental_rerun()
+        else:
+            st.caption("统计本进程（答题页面及此处的操作）发出的Redis命令，按发起调用的评分引擎/数据管理器方法归因；"
+                       "后台重算服务在自己的进程中单独统计，可通过API的 /metrics 查看API进程的统计。")
+            by_caller = REDIS_METRICS.by_caller()
+            if not by_caller:
+                st.info("暂无Redis调用记录")
+            else:
+                st.dataframe(pd.DataFrame([
+                    {
+                        "调用方法": row["caller"],
+                        "耗时(秒)": row["seconds"],
+                        "往返次数": row["round_trips"],
+                        "命令数": sum(row["commands"].values()),
+                        "命令": ", ".join(f"{count} {command}" for command, count in row["commands"].items()),
+                    }
+                    for row in by_caller
+                ]), use_container_width=True)
+
+                st.subheader("单次调用延迟分布")
+                histogram_rows = []
+                for kind, histogram in REDIS_METRICS.latency_histograms().items():
+                    cumulative = list(histogram["buckets"].values())
+                    row = {"命令": kind, "次数": histogram["count"],
+                           "平均(ms)": round(histogram["sum"] * 1000 / histogram["count"], 3)}
+                    # 直方图为累积计数，展示时换算为各区间的次数
+                    previous = 0
+                    for bound, count in zip(list(LATENCY_BUCKETS) + ["+Inf"], cumulative):
+                        label = f"≤{bound * 1000:g}ms" if bound != "+Inf" else f">{LATENCY_BUCKETS[-1] * 1000:g}ms"
+                        row[label] = count - previous
+                        previous = count
+                    histogram_rows.append(row)
+                st.dataframe(pd.DataFrame(histogram_rows), use_container_width=True)
+
+            if REDIS_METRICS.slow_call_ms > 0:
+                st.subheader(f"慢调用（≥{REDIS_METRICS.slow_call_ms:g}ms）")
+                slow_calls = list(REDIS_METRICS.slow_calls)
+                if slow_calls:
+                    st.dataframe(pd.DataFrame(slow_calls[::-1]), use_container_width=True)
+                else:
+                    st.info("暂无慢调用")
+            else:
+                st.caption("设置环境变量 REDIS_SLOW_CALL_MS 可记录慢调用日志")
+
+            if st.button("清空调用统计"):
+                REDIS_METRICS.reset()
+                st.experimental_rerun()
+
+        st.markdown("---")
+        st.header("评分性能分析")
+        st.caption("完整执行一次重算所有得分，按阶段、评分规则与题目统计耗时，并采集调用栈分析。")
+        profile_tools = ["cprofile"] + (["pyinstrument"] if InstrumentProfiler is not None else [])
+        profile_tool = st.selectbox("分析工具", profile_tools)
+        if st.button("分析重算耗时", type="secondary"):
+            with st.spinner("正在重新计算..."):
+                st.session_state.scoring_profile = profile_recalculation(scoring_engine, profile_tool)
+
+        profile_report = st.session_state.get("scoring_profile")
+        if profile_report:
+            st.caption(f"{profile_report['timestamp']}：{profile_report['users']} 位用户，"
+                       f"总耗时 {profile_report['wall_s']} 秒（{profile_report['tool']}）")
+            timers = profile_report["timers"]
+            st.subheader("各阶段耗时")
+            st.dataframe(pd.DataFrame(timers["phases"]), use_container_width=True)
+            st.subheader("各评分规则耗时")
+            st.dataframe(pd.DataFrame(timers["rules"]), use_container_width=True)
+            with st.expander("各题耗时"):
+                st.dataframe(pd.DataFrame(timers["questions"]), use_container_width=True)
+            with st.expander("调用栈分析"):
+                st.text(profile_report["profile"])
+
+            stamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+            st.download_button(
+                label="下载分析报告",
+                data=report_json(profile_report),
+                file_name=f"scoring_profile_{stamp}.json",
+                mime="application/json"
+            )
+            if profile_report["tool"] == "cprofile":
+                st.download_button(
+                    label="下载cProfile数据（.prof）",
+                    data=profile_report["raw"],
+                    file_name=f"recalculate_{stamp}.prof",
+                    mime="application/octet-stream"
+                )
+            else:
+                st.download_button(
+                    label="下载pyinstrument报告（.html）",
+                    data=profile_report["raw"],
+                    file_name=f"recalculate_{stamp}.html",
+                    mime="text/html"
+                )
+
 # 添加一些样式
 st.markdown("""
 <style>
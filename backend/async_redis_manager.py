@@ -0,0 +1,124 @@
+"""
+异步Redis数据管理器（基于redis.asyncio），供FastAPI异步接口使用
+"""
+import json
+from typing import AsyncIterator, Dict, Any, List, Optional, Tuple
+
+import redis.asyncio as aioredis
+
+from backend.redis_manager import RedisManager, SCORES_UPDATES_CHANNEL, USERS_KEY, connection_settings
+from backend.redis_metrics import instrument_async_client, instrumentation_enabled
+
+
+class AsyncRedisManager:
+    def __init__(self, host=None, port=None, db=None, password=None, decode_responses=True, **pool_options):
+        """初始化异步Redis连接池（池参数见connection_settings），与RedisManager读取同一组环境变量"""
+        self.connection_pool = aioredis.ConnectionPool(
+            **connection_settings(host, port, db, password, decode_responses, **pool_options)
+        )
+        self.redis_client = aioredis.Redis(connection_pool=self.connection_pool)
+        if instrumentation_enabled():
+            instrument_async_client(self.redis_client)
+
+    async def ping(self) -> bool:
+        """检查Redis是否可用"""
+        try:
+            return bool(await self.redis_client.ping())
+        except aioredis.RedisError:
+            return False
+
+    def pool_stats(self) -> Dict[str, int]:
+        """连接池状态：上限、已创建、空闲与使用中的连接数"""
+        pool = self.connection_pool
+        available = len(pool._available_connections)
+        in_use = len(pool._in_use_connections)
+        return {
+            "max_connections": pool.max_connections,
+            "created_connections": available + in_use,
+            "available_connections": available,
+            "in_use_connections": in_use,
+        }
+
+    async def close(self):
+        """断开连接池中的所有连接"""
+        await self.connection_pool.disconnect()
+
+    async def get_question_version(self, question_id: str) -> str:
+        """问题统计的版本标识（见RedisManager.get_question_version）"""
+        async with self.redis_client.pipeline(transaction=False) as pipe:
+            pipe.get("question:versions:epoch")
+            pipe.hget("question:versions", question_id)
+            epoch, version = await pipe.execute()
+        return RedisManager._format_question_version(epoch, version)
+
+    async def get_question_versions(self) -> Dict[str, str]:
+        """所有问题统计的版本标识"""
+        async with self.redis_client.pipeline(transaction=False) as pipe:
+            pipe.get("question:versions:epoch")
+            pipe.hgetall("question:versions")
+            epoch, versions = await pipe.execute()
+        return {
+            question_id: RedisManager._format_question_version(epoch, version)
+            for question_id, version in versions.items()
+        }
+
+    async def get_question_distribution_counts(self, question_id: str) -> Tuple[str, int, Dict[str, int]]:
+        """在一个事务中读取问题统计的版本、回答人数及各计数字段（见RedisManager.get_question_distribution_counts）"""
+        async with self.redis_client.pipeline() as pipe:
+            pipe.get("question:versions:epoch")
+            pipe.hget("question:versions", question_id)
+            pipe.scard(f"question:respondents:{question_id}")
+            pipe.hgetall(f"question:stats:{question_id}")
+            epoch, version, total_respondents, stats = await pipe.execute()
+        return (RedisManager._format_question_version(epoch, version), total_respondents,
+                {field: int(count) for field, count in RedisManager._drop_empty_counts(stats).items()})
+
+    async def get_final_axes_by_user(self) -> Dict[str, Tuple[float, float]]:
+        """按用户获取所有用户的最终轴得分"""
+        return await self._get_all_axes("user:axes:final:")
+
+    async def _get_all_axes(self, prefix: str) -> Dict[str, Tuple[float, float]]:
+        """按用户注册表单次pipeline读取全部坐标，返回有坐标的用户"""
+        user_ids = await self.get_all_users()
+
+        async with self.redis_client.pipeline(transaction=False) as pipe:
+            for user_id in user_ids:
+                pipe.hgetall(f"{prefix}{user_id}")
+            results = await pipe.execute()
+
+        return {
+            user_id: (float(data["x"]), float(data["y"]))
+            for user_id, data in zip(user_ids, results) if "x" in data and "y" in data
+        }
+
+    async def get_all_users(self) -> List[str]:
+        """获取所有用户ID（按首次答题时间排序）"""
+        return await self.redis_client.zrange(USERS_KEY, 0, -1)
+
+    async def get_score_snapshot(self, user_id: str) -> Dict[str, Any]:
+        """只读地获取用户已保存的最终坐标与缓存的全体平均坐标（见RedisManager.get_score_snapshot）"""
+        async with self.redis_client.pipeline(transaction=False) as pipe:
+            RedisManager._queue_score_snapshot(pipe, user_id)
+            snapshot = RedisManager._parse_score_snapshot(await pipe.execute())
+        if snapshot["average"] is None:
+            all_final_axes = await self.get_final_axes_by_user()
+            snapshot["average"] = RedisManager._average_position(all_final_axes.values())
+        return snapshot
+
+    async def get_scores_generation(self) -> int:
+        """获取最近一次重算写入的代数（尚未重算过时为0）"""
+        return int(await self.redis_client.get("scores:generation") or 0)
+
+    async def listen_scores_updates(self, poll_timeout: float = 1.0) -> AsyncIterator[Optional[Dict[str, Any]]]:
+        """订阅每代重算发布的变化，依次产出消息内容
+
+        每隔poll_timeout秒没有消息时产出None，便于调用方检查是否需要退出。
+        """
+        pubsub = self.redis_client.pubsub(ignore_subscribe_messages=True)
+        await pubsub.subscribe(SCORES_UPDATES_CHANNEL)
+        try:
+            while True:
+                message = await pubsub.get_message(timeout=poll_timeout)
+                yield json.loads(message["data"]) if message else None
+        finally:
+            await pubsub.aclose()
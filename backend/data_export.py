@@ -0,0 +1,201 @@
+"""
+流式导出
+
+按用户注册表逐批（每批一次pipeline）读取答案、得分与坐标，边读边输出，内存占用只与批大小有关：
+- ndjson：首行为导出信息，其后每题一行统计，每个用户一行（答案只出现一次），gzip压缩
+- csv：每个用户一行，列为用户信息、坐标以及每题的答案（JSON文本）、答题时间与得分，gzip压缩
+- parquet：与csv相同的列，每批写一个行组（需 pip install pyarrow）
+
+    python -m backend.data_export --output data.ndjson.gz
+    python -m backend.data_export --format csv --output data.csv.gz
+"""
+import argparse
+import io
+import itertools
+import json
+import os
+import sys
+import zlib
+from datetime import datetime
+from typing import Any, Dict, Iterator, List
+
+import pandas as pd
+
+# Add project root to path to allow running this file directly
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backend.redis_manager import USERS_KEY, RedisManager
+from config.questions import QUESTIONS
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+EXPORT_FORMATS = ("ndjson", "csv", "parquet")
+EXPORT_FORMAT_VERSION = 1
+
+# 文件扩展名与MIME类型
+EXPORT_FILES = {
+    "ndjson": ("ndjson.gz", "application/gzip"),
+    "csv": ("csv.gz", "application/gzip"),
+    "parquet": ("parquet", "application/vnd.apache.parquet"),
+}
+
+# 表格中答案列的JSON编码（复用编码器，省去json.dumps每次构造的开销）
+_encode_cell = json.JSONEncoder(ensure_ascii=False).encode
+
+
+def available_formats() -> List[str]:
+    """当前环境可用的导出格式（parquet需要pyarrow）"""
+    return [fmt for fmt in EXPORT_FORMATS if fmt != "parquet" or pq is not None]
+
+
+def iter_export_records(redis_manager: RedisManager, batch_size: int = 500) -> Iterator[List[Dict[str, Any]]]:
+    """依次产出导出记录的批次：首批为导出信息与各题统计，其后每批为一批用户的记录"""
+    header = {
+        "type": "export",
+        "version": EXPORT_FORMAT_VERSION,
+        "timestamp": datetime.now().isoformat(),
+        "users": redis_manager.redis_client.zcard(USERS_KEY),
+    }
+    yield [header] + [
+        {"type": "question", "question_id": question_id, "stats": stats}
+        for question_id, stats in redis_manager.get_all_question_stats(list(QUESTIONS)).items()
+    ]
+
+    for batch in redis_manager.iter_user_batches(batch_size):
+        records = redis_manager.get_user_records([user_id for user_id, _ in batch])
+        yield [
+            {
+                "type": "user",
+                "user_id": user_id,
+                "joined_at": datetime.fromtimestamp(joined_at).isoformat(),
+                **records[user_id],
+            }
+            for user_id, joined_at in batch
+        ]
+
+
+def user_rows(records: List[Dict[str, Any]]) -> pd.DataFrame:
+    """将一批用户记录展开为每个用户一行的表（列固定，答案为JSON文本，缺失为空）"""
+    rows = []
+    for record in records:
+        raw = record["raw"] or (None, None)
+        final = record["final"] or (None, None)
+        row = {
+            "user_id": record["user_id"],
+            "joined_at": record["joined_at"],
+            "raw_x": raw[0], "raw_y": raw[1],
+            "final_x": final[0], "final_y": final[1],
+        }
+        for question_id in QUESTIONS:
+            answer = record["answers"].get(question_id)
+            row[question_id] = _encode_cell(answer["answer"]) if answer else None
+            row[f"{question_id}_at"] = answer["timestamp"] if answer else None
+            row[f"{question_id}_score"] = record["scores"].get(question_id)
+        rows.append(row)
+    return pd.DataFrame(rows, columns=_row_columns()).astype(_row_dtypes())
+
+
+def _row_columns() -> List[str]:
+    columns = ["user_id", "joined_at", "raw_x", "raw_y", "final_x", "final_y"]
+    for question_id in QUESTIONS:
+        columns += [question_id, f"{question_id}_at", f"{question_id}_score"]
+    return columns
+
+
+def _row_dtypes() -> Dict[str, str]:
+    """坐标与得分为浮点数，其余为字符串（保证每批的列类型一致）"""
+    return {
+        column: "float64" if column.endswith(("_x", "_y", "_score")) else "object"
+        for column in _row_columns()
+    }
+
+
+def export_chunks(redis_manager: RedisManager, fmt: str = "ndjson", batch_size: int = 500,
+                  compress: bool = True) -> Iterator[bytes]:
+    """逐批产出导出文件的字节块（ndjson或csv，默认gzip压缩），可直接用于流式响应或写入文件"""
+    return _encode_chunks(iter_export_records(redis_manager, batch_size), fmt, compress)
+
+
+def _encode_chunks(batches: Iterator[List[Dict[str, Any]]], fmt: str, compress: bool) -> Iterator[bytes]:
+    if fmt not in ("ndjson", "csv"):
+        raise ValueError(f"Format {fmt} cannot be streamed as chunks, use write_export")
+    # wbits=31：gzip文件格式
+    compressor = zlib.compressobj(wbits=31) if compress else None
+
+    for i, records in enumerate(batches):
+        if fmt == "ndjson":
+            text = "".join(json.dumps(record, ensure_ascii=False) + "\n" for record in records)
+        elif i == 0:
+            # 首批是导出信息与统计，csv只包含用户行
+            text = ",".join(_row_columns()) + "\n"
+        else:
+            text = user_rows(records).to_csv(index=False, header=False)
+        chunk = text.encode("utf-8")
+        chunk = compressor.compress(chunk) if compressor else chunk
+        if chunk:
+            yield chunk
+
+    if compressor:
+        yield compressor.flush()
+
+
+def write_export(redis_manager: RedisManager, fileobj, fmt: str = "ndjson", batch_size: int = 500) -> int:
+    """将导出写入二进制文件对象，返回导出的用户数"""
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format: {fmt}")
+    if fmt == "parquet" and pq is None:
+        raise RuntimeError("pyarrow is not installed (pip install pyarrow)")
+
+    users = 0
+    batches = iter_export_records(redis_manager, batch_size)
+    # 首批是导出信息与统计
+    header = next(batches)
+
+    def user_batches():
+        nonlocal users
+        for records in batches:
+            users += len(records)
+            yield records
+
+    if fmt != "parquet":
+        for chunk in _encode_chunks(itertools.chain([header], user_batches()), fmt, compress=True):
+            fileobj.write(chunk)
+        return users
+
+    schema = pa.schema([
+        (column, pa.float64() if dtype == "float64" else pa.string())
+        for column, dtype in _row_dtypes().items()
+    ])
+    with pq.ParquetWriter(fileobj, schema, compression="zstd") as writer:
+        for records in user_batches():
+            writer.write_table(pa.Table.from_pandas(user_rows(records), schema=schema, preserve_index=False))
+    return users
+
+
+def export_bytes(redis_manager: RedisManager, fmt: str = "ndjson", batch_size: int = 500) -> bytes:
+    """导出为内存中的字节串（管理工具的下载按钮使用；压缩后的体积远小于JSON文本）"""
+    buffer = io.BytesIO()
+    write_export(redis_manager, buffer, fmt, batch_size)
+    return buffer.getvalue()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stream all questionnaire data to a file")
+    parser.add_argument("--format", choices=EXPORT_FORMATS, default="ndjson")
+    parser.add_argument("--output", required=True, help="output file")
+    parser.add_argument("--batch-size", type=int, default=500, help="users read per pipeline")
+    args = parser.parse_args()
+
+    redis_manager = RedisManager()
+    with open(args.output, "wb") as f:
+        users = write_export(redis_manager, f, args.format, args.batch_size)
+    redis_manager.close()
+    print(f"Exported {users} users to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,222 @@
+"""
+导入导出的数据
+
+读取 export_data 的JSON或 backend.data_export 的NDJSON（可为gzip压缩），把答案、回答者集合与
+问题统计写入（通常是空的预发布）Redis。得分不导入，由重算生成：
+- 默认按用户分批，每批一次pipeline读取旧答案、一次pipeline写入
+- --replay 按原答题时间顺序逐次回放提交（同一用户同一秒的答案为一次提交），
+  配合 --recompute 在每 --recompute-every 次提交后增量重算，复现演出时的重算过程
+
+    python -m backend.data_import data.ndjson.gz --redis-db 15 --recompute
+    python -m backend.data_import data.ndjson.gz --redis-db 15 --flush --replay --recompute
+"""
+import argparse
+import gzip
+import io
+import json
+import os
+import sys
+import time
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+# Add project root to path to allow running this file directly
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backend.redis_manager import RedisManager
+from backend.scoring_engine import ScoringEngine
+
+# 一次提交：(用户ID, 加入时间, {题目ID: (答案, 答题时间)})
+Submission = Tuple[str, float, Dict[str, Tuple[Any, Optional[float]]]]
+
+
+def open_export(path: str) -> io.TextIOBase:
+    """以文本方式打开导出文件，按文件头识别gzip压缩"""
+    with open(path, "rb") as f:
+        compressed = f.read(2) == b"\x1f\x8b"
+    if compressed:
+        return gzip.open(path, "rt", encoding="utf-8")
+    return open(path, "r", encoding="utf-8")
+
+
+def iter_user_records(path: str) -> Iterator[Dict[str, Any]]:
+    """依次产出导出文件中的用户记录 {"user_id", "joined_at", "answers"}
+
+    NDJSON逐行读取；export_data的JSON需要整体解析（其中没有加入时间，joined_at为None）。
+    """
+    with open_export(path) as f:
+        first_line = f.readline()
+        try:
+            header = json.loads(first_line)
+        except json.JSONDecodeError:
+            header = None
+
+        if isinstance(header, dict) and header.get("type") == "export":
+            for line in f:
+                record = json.loads(line)
+                if record.get("type") == "user":
+                    yield record
+            return
+
+        data = json.loads(first_line + f.read())
+        for user_id, user in data.get("users", {}).items():
+            yield {"user_id": user_id, "joined_at": None, "answers": user.get("answers", {})}
+
+
+def _epoch(timestamp: Any) -> Optional[float]:
+    if timestamp is None or timestamp == "":
+        return None
+    if isinstance(timestamp, str):
+        return datetime.fromisoformat(timestamp).timestamp()
+    return float(timestamp)
+
+
+def record_submissions(record: Dict[str, Any], split: bool = False) -> List[Submission]:
+    """将用户记录转换为提交；split=True时按答题时间拆分为多次提交（按时间先后）
+
+    没有加入时间时以最早的答题时间作为加入时间。
+    """
+    answers = {
+        question_id: (answer_data["answer"], _epoch(answer_data.get("timestamp")))
+        for question_id, answer_data in record["answers"].items()
+    }
+    timestamps = [timestamp for _, timestamp in answers.values() if timestamp is not None]
+    joined_at = _epoch(record.get("joined_at"))
+    if joined_at is None:
+        joined_at = min(timestamps) if timestamps else datetime.now().timestamp()
+
+    if not split:
+        return [(record["user_id"], joined_at, answers)]
+
+    by_time: Dict[float, Dict[str, Tuple[Any, Optional[float]]]] = {}
+    for question_id, (answer, timestamp) in answers.items():
+        # 没有答题时间的答案视为加入时提交
+        by_time.setdefault(timestamp if timestamp is not None else joined_at, {})[question_id] = (answer, timestamp)
+    return [(record["user_id"], joined_at, by_time[timestamp]) for timestamp in sorted(by_time)]
+
+
+def submission_time(submission: Submission) -> float:
+    """提交的时间：其中答案的答题时间，没有时为加入时间"""
+    _, joined_at, answers = submission
+    timestamp = next(iter(answers.values()))[1] if answers else None
+    return timestamp if timestamp is not None else joined_at
+
+
+def _batches(items: Iterator[Any], size: int) -> Iterator[List[Any]]:
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def import_export(redis_manager: RedisManager, path: str, batch_size: int = 1000, replay: bool = False,
+                  scoring_engine: Optional[ScoringEngine] = None, recompute_every: int = 1) -> Dict[str, Any]:
+    """导入导出文件，返回导入量与吞吐报告
+
+    不回放时按用户分批导入（每批batch_size个用户），传入scoring_engine则导入完成后全量重算一次。
+    回放时先读入全部提交并按答题时间排序：传入scoring_engine时每recompute_every次提交写入一次并增量重算这些用户，
+    否则按batch_size次提交一批写入。
+    """
+    started = time.perf_counter()
+    write_seconds = 0.0
+    recompute_seconds = 0.0
+    recompute_runs = 0
+    pipelines = 0
+    users = set()
+    answers = 0
+    submission_count = 0
+
+    def write(batch: List[Submission]):
+        nonlocal write_seconds, pipelines, answers, submission_count
+        batch_started = time.perf_counter()
+        answers += redis_manager.import_answers(batch)
+        write_seconds += time.perf_counter() - batch_started
+        # 每批读取旧答案与写入各一次pipeline
+        pipelines += 2
+        submission_count += len(batch)
+        users.update(user_id for user_id, _, _ in batch)
+
+    def recompute(changed_user_ids: Optional[List[str]] = None):
+        nonlocal recompute_seconds, recompute_runs
+        recompute_started = time.perf_counter()
+        if changed_user_ids is None:
+            scoring_engine.recalculate_all_scores()
+        else:
+            scoring_engine.recalculate_incremental(changed_user_ids)
+        recompute_seconds += time.perf_counter() - recompute_started
+        recompute_runs += 1
+
+    if not replay:
+        for records in _batches(iter_user_records(path), batch_size):
+            write([submission for record in records for submission in record_submissions(record)])
+        if scoring_engine is not None and users:
+            recompute()
+    else:
+        # 同一时间的提交按加入时间先后
+        submissions = sorted(
+            (submission for record in iter_user_records(path) for submission in record_submissions(record, split=True)),
+            key=lambda submission: (submission_time(submission), submission[1]),
+        )
+        step = recompute_every if scoring_engine is not None else batch_size
+        for batch in _batches(iter(submissions), step):
+            write(batch)
+            if scoring_engine is not None:
+                recompute(sorted({user_id for user_id, _, _ in batch}))
+
+    elapsed = time.perf_counter() - started
+    return {
+        "source": path,
+        "mode": "replay" if replay else "bulk",
+        "timestamp": datetime.now().isoformat(),
+        "users": len(users),
+        "submissions": submission_count,
+        "answers": answers,
+        "pipelines": pipelines,
+        "write_s": round(write_seconds, 4),
+        "answers_per_s": round(answers / write_seconds, 1) if write_seconds else None,
+        "users_per_s": round(len(users) / write_seconds, 1) if write_seconds else None,
+        "recompute": {"runs": recompute_runs, "seconds": round(recompute_seconds, 4)},
+        "wall_s": round(elapsed, 4),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import an export file into Redis")
+    parser.add_argument("path", help="export_data JSON or data_export NDJSON (optionally gzip compressed)")
+    parser.add_argument("--redis-db", type=int, default=None, help="target database (must be empty)")
+    parser.add_argument("--flush", action="store_true", help="flush the target database before importing")
+    parser.add_argument("--batch-size", type=int, default=1000, help="users (or replayed submissions) per pipeline")
+    parser.add_argument("--replay", action="store_true", help="replay submissions in original answer time order")
+    parser.add_argument("--recompute", action="store_true",
+                        help="recompute scores after the import (with --replay: incrementally while replaying)")
+    parser.add_argument("--recompute-every", type=int, default=1, help="replayed submissions per incremental recompute")
+    parser.add_argument("--output", help="write the JSON report to this file")
+    args = parser.parse_args()
+
+    redis_manager = RedisManager(db=args.redis_db)
+    if redis_manager.redis_client.dbsize() and not args.flush:
+        sys.exit("the Redis database is not empty; choose an empty --redis-db or pass --flush")
+    redis_manager.clear_all_data()
+
+    scoring_engine = None
+    if args.recompute:
+        scoring_engine = ScoringEngine(redis_manager)
+
+    report = import_export(redis_manager, args.path, args.batch_size, args.replay,
+                           scoring_engine, args.recompute_every)
+    redis_manager.close()
+
+    encoded = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(encoded)
+    else:
+        print(encoded)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+实时推送：单个Redis订阅接收每代重算的变化，再分发给所有连接的客户端
+"""
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from typing import Any, Awaitable, Callable, Dict, Optional, Set
+
+import redis.asyncio as aioredis
+
+from backend.async_redis_manager import AsyncRedisManager
+
+logger = logging.getLogger(__name__)
+
+
+class LiveUpdates:
+    def __init__(self, redis_manager: AsyncRedisManager,
+                 transform: Optional[Callable[[Dict[str, Any]], Awaitable[Dict[str, Any]]]] = None,
+                 queue_size: int = 32, retry_delay: float = 1.0):
+        """transform在分发前对每条消息调用一次（所有客户端共享结果），可用于补充题目计数等信息"""
+        self.redis_manager = redis_manager
+        self.transform = transform
+        self.queue_size = queue_size
+        self.retry_delay = retry_delay
+        self._subscribers: Set[asyncio.Queue] = set()
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        """启动后台订阅任务"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """停止订阅任务"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    @property
+    def client_count(self) -> int:
+        return len(self._subscribers)
+
+    @property
+    def running(self) -> bool:
+        """订阅任务是否仍在运行（/health 据此报告推送是否可用）"""
+        return self._task is not None and not self._task.done()
+
+    @asynccontextmanager
+    async def subscribe(self):
+        """注册一个客户端，产出接收变化消息的队列"""
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        self._subscribers.add(queue)
+        try:
+            yield queue
+        finally:
+            self._subscribers.discard(queue)
+
+    def _publish(self, update: Dict[str, Any]):
+        for queue in list(self._subscribers):
+            if queue.full():
+                # 客户端读取过慢时丢弃其最旧的一条，不阻塞其他客户端
+                queue.get_nowait()
+            queue.put_nowait(update)
+
+    async def _run(self):
+        """订阅并分发变化；任何异常（连接断开、消息格式错误等）都记录后等待retry_delay秒重新订阅，任务不会退出"""
+        while True:
+            try:
+                async for update in self.redis_manager.listen_scores_updates():
+                    if update is None:
+                        continue
+                    if self.transform is not None:
+                        try:
+                            update = await self.transform(update)
+                        except Exception:
+                            # 补充信息失败时仍推送原始变化
+                            logger.exception("Error preparing live update")
+                    self._publish(update)
+            except (aioredis.ConnectionError, aioredis.TimeoutError) as e:
+                logger.warning("Live updates subscription lost, retrying: %s", e)
+            except Exception:
+                logger.exception("Live updates listener failed, resubscribing")
+            await asyncio.sleep(self.retry_delay)
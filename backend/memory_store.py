@@ -0,0 +1,639 @@
+"""
+进程内的Redis替身：纯Python实现RedisManager用到的命令子集，无需网络
+
+支持字符串、哈希、集合、列表、有序集合、流、SCAN、pipeline与WATCH/MULTI事务，接口与返回值
+与 redis.Redis(decode_responses=True) 一致，可作为RedisManager的存储后端（client=MemoryRedis()，
+或设置环境变量 REDIS_BACKEND=memory）。可选的模拟延迟：
+    MEMORY_REDIS_LATENCY_MS          每次网络往返（单条命令或一个pipeline）的延迟，默认0
+    MEMORY_REDIS_COMMAND_LATENCY_MS  每条命令的执行耗时（与Redis一样串行执行），默认0
+数据只存在于当前进程中，不支持发布/订阅（publish只返回0），后台重算服务等其他进程无法共享。
+"""
+import fnmatch
+import itertools
+import math
+import os
+import threading
+import time
+from bisect import bisect_left, insort
+from collections import Counter
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import redis
+
+
+def _encode(value: Any) -> str:
+    """与redis-py的编码规则一致：字符串原样保存，整数转为十进制，浮点数用repr"""
+    if isinstance(value, str):
+        return value
+    if isinstance(value, bytes):
+        return value.decode("utf-8")
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise redis.DataError(f"Invalid input of type: '{type(value).__name__}'. "
+                              "Convert to a bytes, string, int or float first.")
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+def _to_int(value: str) -> int:
+    try:
+        return int(value)
+    except ValueError:
+        raise redis.ResponseError("value is not an integer or out of range")
+
+
+def _index_range(length: int, start: int, end: int) -> Tuple[int, int]:
+    """LRANGE/ZRANGE的下标（含两端，可为负数）转换为切片范围"""
+    if start < 0:
+        start = max(length + start, 0)
+    if end < 0:
+        end = length + end
+    return start, min(end, length - 1) + 1
+
+
+def _score_bound(value: Any) -> Tuple[float, bool]:
+    """ZCOUNT的分值边界：(分值, 是否不含)，支持 "(" 前缀与 -inf/+inf"""
+    if isinstance(value, str):
+        exclusive = value.startswith("(")
+        return float(value[1:] if exclusive else value), exclusive
+    return float(value), False
+
+
+class _SortedSet:
+    """有序集合：成员 -> 分值，并按 (分值, 成员) 维护有序列表"""
+    __slots__ = ("scores", "entries")
+
+    def __init__(self):
+        self.scores: Dict[str, float] = {}
+        self.entries: List[Tuple[float, str]] = []
+
+    def __len__(self) -> int:
+        return len(self.scores)
+
+    def add(self, member: str, score: float) -> bool:
+        """添加或更新成员，返回是否为新成员"""
+        old = self.scores.get(member)
+        if old == score:
+            return False
+        if old is not None:
+            del self.entries[bisect_left(self.entries, (old, member))]
+        self.scores[member] = score
+        insort(self.entries, (score, member))
+        return old is None
+
+    def remove(self, member: str) -> bool:
+        score = self.scores.pop(member, None)
+        if score is None:
+            return False
+        del self.entries[bisect_left(self.entries, (score, member))]
+        return True
+
+    def count(self, min_score: Any, max_score: Any) -> int:
+        low, low_exclusive = _score_bound(min_score)
+        high, high_exclusive = _score_bound(max_score)
+        # (score,) 排在所有分值为score的 (score, member) 之前
+        start = bisect_left(self.entries, (math.nextafter(low, math.inf) if low_exclusive else low,))
+        if high == math.inf and not high_exclusive:
+            stop = len(self.entries)
+        else:
+            stop = bisect_left(self.entries, (high if high_exclusive else math.nextafter(high, math.inf),))
+        return max(stop - start, 0)
+
+
+class _Stream:
+    """流：按ID递增的 (ms, seq, 字段) 列表"""
+    __slots__ = ("entries",)
+
+    def __init__(self):
+        self.entries: List[Tuple[int, int, Dict[str, str]]] = []
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    @staticmethod
+    def parse_id(value: str, upper: bool) -> Tuple[int, float]:
+        """解析流ID边界（"-"、"+"、"ms"或"ms-seq"），省略序号时按上下界补齐"""
+        if value == "-":
+            return 0, 0
+        if value == "+":
+            return math.inf, math.inf
+        ms, _, seq = value.partition("-")
+        return int(ms), int(seq) if seq else (math.inf if upper else 0)
+
+    def select(self, min_id: str, max_id: str) -> List[Tuple[int, int, Dict[str, str]]]:
+        low_exclusive, high_exclusive = min_id.startswith("("), max_id.startswith("(")
+        low = self.parse_id(min_id.lstrip("("), upper=False)
+        high = self.parse_id(max_id.lstrip("("), upper=True)
+        return [
+            entry for entry in self.entries
+            if (entry[:2] > low if low_exclusive else entry[:2] >= low)
+            and (entry[:2] < high if high_exclusive else entry[:2] <= high)
+        ]
+
+
+class _Commands:
+    """命令接口（参数与返回值同redis-py）；实际执行由execute_command完成"""
+
+    def execute_command(self, *args, **options):
+        raise NotImplementedError
+
+    # 键与服务器
+    def ping(self):
+        return self.execute_command("PING")
+
+    def dbsize(self):
+        return self.execute_command("DBSIZE")
+
+    def flushdb(self):
+        return self.execute_command("FLUSHDB")
+
+    def delete(self, *names):
+        return self.execute_command("DEL", *names)
+
+    def exists(self, *names):
+        return self.execute_command("EXISTS", *names)
+
+    def keys(self, pattern: str = "*"):
+        return self.execute_command("KEYS", pattern)
+
+    def scan(self, cursor: int = 0, match: Optional[str] = None, count: Optional[int] = None):
+        return self.execute_command("SCAN", cursor, match, count)
+
+    def publish(self, channel: str, message: Any):
+        return self.execute_command("PUBLISH", channel, _encode(message))
+
+    # 字符串
+    def get(self, name: str):
+        return self.execute_command("GET", name)
+
+    def set(self, name: str, value: Any, nx: bool = False):
+        return self.execute_command("SET", name, _encode(value), nx=nx)
+
+    def incr(self, name: str, amount: int = 1):
+        return self.execute_command("INCRBY", name, amount)
+
+    incrby = incr
+
+    # 哈希
+    def hset(self, name: str, key: Optional[str] = None, value: Any = None,
+             mapping: Optional[Dict[str, Any]] = None, items: Optional[List[Any]] = None):
+        if key is None and not mapping and not items:
+            raise redis.DataError("'hset' with no key value pairs")
+        pairs = []
+        if key is not None:
+            pairs.append((key, value))
+        if items:
+            pairs.extend(zip(items[::2], items[1::2]))
+        if mapping:
+            pairs.extend(mapping.items())
+        return self.execute_command("HSET", name, [(_encode(k), _encode(v)) for k, v in pairs])
+
+    def hget(self, name: str, key: str):
+        return self.execute_command("HGET", name, key)
+
+    def hmget(self, name: str, keys, *args):
+        keys = [keys] if isinstance(keys, str) else list(keys)
+        return self.execute_command("HMGET", name, keys + list(args))
+
+    def hgetall(self, name: str):
+        return self.execute_command("HGETALL", name)
+
+    def hincrby(self, name: str, key: str, amount: int = 1):
+        return self.execute_command("HINCRBY", name, key, amount)
+
+    def hdel(self, name: str, *keys):
+        return self.execute_command("HDEL", name, *keys)
+
+    # 集合
+    def sadd(self, name: str, *values):
+        return self.execute_command("SADD", name, *[_encode(value) for value in values])
+
+    def srem(self, name: str, *values):
+        return self.execute_command("SREM", name, *[_encode(value) for value in values])
+
+    def smembers(self, name: str):
+        return self.execute_command("SMEMBERS", name)
+
+    def scard(self, name: str):
+        return self.execute_command("SCARD", name)
+
+    # 列表
+    def rpush(self, name: str, *values):
+        return self.execute_command("RPUSH", name, *[_encode(value) for value in values])
+
+    def lpop(self, name: str):
+        return self.execute_command("LPOP", name)
+
+    def lrange(self, name: str, start: int, end: int):
+        return self.execute_command("LRANGE", name, start, end)
+
+    def blpop(self, keys, timeout: Optional[float] = 0):
+        keys = [keys] if isinstance(keys, str) else list(keys)
+        return self.execute_command("BLPOP", keys, timeout or 0)
+
+    # 有序集合
+    def zadd(self, name: str, mapping: Dict[str, float], nx: bool = False):
+        return self.execute_command("ZADD", name, [(_encode(m), float(s)) for m, s in mapping.items()], nx=nx)
+
+    def zrem(self, name: str, *values):
+        return self.execute_command("ZREM", name, *[_encode(value) for value in values])
+
+    def zcard(self, name: str):
+        return self.execute_command("ZCARD", name)
+
+    def zcount(self, name: str, min: Any, max: Any):
+        return self.execute_command("ZCOUNT", name, min, max)
+
+    def zscore(self, name: str, value: str):
+        return self.execute_command("ZSCORE", name, value)
+
+    def zrange(self, name: str, start: int, end: int, desc: bool = False, withscores: bool = False):
+        return self.execute_command("ZRANGE", name, start, end, desc=desc, withscores=withscores)
+
+    def zrevrange(self, name: str, start: int, end: int, withscores: bool = False):
+        return self.execute_command("ZRANGE", name, start, end, desc=True, withscores=withscores)
+
+    # 流
+    def xadd(self, name: str, fields: Dict[str, Any], id: str = "*"):
+        return self.execute_command("XADD", name, {_encode(k): _encode(v) for k, v in fields.items()}, id)
+
+    def xrange(self, name: str, min: str = "-", max: str = "+", count: Optional[int] = None):
+        return self.execute_command("XRANGE", name, min, max, count)
+
+    def xrevrange(self, name: str, max: str = "+", min: str = "-", count: Optional[int] = None):
+        return self.execute_command("XRANGE", name, min, max, count, reverse=True)
+
+    def scan_iter(self, match: Optional[str] = None, count: Optional[int] = None) -> Iterator[str]:
+        cursor = None
+        while cursor != 0:
+            cursor, keys = self.scan(cursor or 0, match=match, count=count)
+            yield from keys
+
+
+class MemoryRedis(_Commands):
+    """进程内的Redis：所有命令在一把锁内串行执行（同Redis单线程模型），可在多个线程间共享"""
+
+    def __init__(self, latency_ms: Optional[float] = None, command_latency_ms: Optional[float] = None):
+        if latency_ms is None:
+            latency_ms = float(os.getenv("MEMORY_REDIS_LATENCY_MS", 0))
+        if command_latency_ms is None:
+            command_latency_ms = float(os.getenv("MEMORY_REDIS_COMMAND_LATENCY_MS", 0))
+        self.latency = latency_ms / 1000
+        self.command_latency = command_latency_ms / 1000
+        # 没有连接池（RedisManager.pool_stats据此返回空的连接池状态）
+        self.connection_pool = None
+        self._lock = threading.RLock()
+        # BLPOP等待列表写入
+        self._pushed = threading.Condition(self._lock)
+        self._data: Dict[str, Any] = {}
+        # 键 -> 写入次数，用于WATCH检测并发修改
+        self._versions: Counter = Counter()
+
+    def pipeline(self, transaction: bool = True) -> "MemoryPipeline":
+        return MemoryPipeline(self, transaction)
+
+    def close(self):
+        pass
+
+    def execute_command(self, *args, **options):
+        return self._execute(args, options)
+
+    def _execute(self, args: Tuple, options: Dict[str, Any]):
+        """一次往返执行单条命令（pipeline的立即执行也经由这里，不重复计入客户端上的统计）"""
+        self._round_trip()
+        with self._lock:
+            return self._run(args, options)
+
+    def _round_trip(self):
+        """模拟一次网络往返（不占用锁，与其他客户端的往返并行）"""
+        if self.latency:
+            time.sleep(self.latency)
+
+    def _run(self, args: Tuple, options: Dict[str, Any]):
+        """在锁内执行一条命令"""
+        if self.command_latency:
+            time.sleep(self.command_latency)
+        handler = getattr(self, f"_{args[0].lower()}", None)
+        if handler is None:
+            raise redis.ResponseError(f"unknown command '{args[0]}'")
+        return handler(*args[1:], **options)
+
+    def _typed(self, name: str, kind: type, create: bool = False):
+        """按类型读取键（不存在时返回None或新建），类型不符时与Redis一样报WRONGTYPE"""
+        value = self._data.get(name)
+        if value is None:
+            if create:
+                value = self._data[name] = kind()
+            return value
+        if not isinstance(value, kind):
+            raise redis.ResponseError("WRONGTYPE Operation against a key holding the wrong kind of value")
+        return value
+
+    def _touch(self, name: str):
+        """记录键被修改（使WATCH该键的事务失败），容器为空时删除键"""
+        self._versions[name] += 1
+        value = self._data.get(name)
+        if value is not None and not isinstance(value, str) and not len(value):
+            del self._data[name]
+
+    def _watch(self, *names) -> Dict[str, int]:
+        return {name: self._versions[name] for name in names}
+
+    # 键与服务器
+    def _ping(self):
+        return True
+
+    def _dbsize(self):
+        return len(self._data)
+
+    def _flushdb(self):
+        for name in list(self._data):
+            self._versions[name] += 1
+        self._data.clear()
+        return True
+
+    def _del(self, *names):
+        deleted = 0
+        for name in names:
+            if self._data.pop(name, None) is not None:
+                self._versions[name] += 1
+                deleted += 1
+        return deleted
+
+    def _exists(self, *names):
+        return sum(name in self._data for name in names)
+
+    def _keys(self, pattern: str):
+        return [name for name in self._data if fnmatch.fnmatchcase(name, pattern)]
+
+    def _scan(self, cursor: int, match: Optional[str], count: Optional[int]):
+        """游标为键在插入顺序中的位置（与Redis一样，遍历期间的修改可能导致漏项或重复）"""
+        count = count or 10
+        names = list(itertools.islice(self._data, cursor, cursor + count))
+        next_cursor = cursor + count if len(names) == count and cursor + count < len(self._data) else 0
+        if match is not None:
+            names = [name for name in names if fnmatch.fnmatchcase(name, match)]
+        return next_cursor, names
+
+    def _publish(self, channel: str, message: str):
+        # 不支持订阅，没有接收者
+        return 0
+
+    # 字符串
+    def _get(self, name: str):
+        return self._typed(name, str)
+
+    def _set(self, name: str, value: str, nx: bool = False):
+        if nx and name in self._data:
+            return None
+        self._data[name] = value
+        self._touch(name)
+        return True
+
+    def _incrby(self, name: str, amount: int):
+        value = _to_int(self._typed(name, str) or "0") + amount
+        self._data[name] = str(value)
+        self._touch(name)
+        return value
+
+    # 哈希
+    def _hset(self, name: str, pairs: List[Tuple[str, str]]):
+        hash_ = self._typed(name, dict, create=True)
+        added = 0
+        for key, value in pairs:
+            added += key not in hash_
+            hash_[key] = value
+        self._touch(name)
+        return added
+
+    def _hget(self, name: str, key: str):
+        return (self._typed(name, dict) or {}).get(key)
+
+    def _hmget(self, name: str, keys: List[str]):
+        hash_ = self._typed(name, dict) or {}
+        return [hash_.get(key) for key in keys]
+
+    def _hgetall(self, name: str):
+        return dict(self._typed(name, dict) or {})
+
+    def _hincrby(self, name: str, key: str, amount: int):
+        hash_ = self._typed(name, dict, create=True)
+        value = _to_int(hash_.get(key, "0")) + amount
+        hash_[key] = str(value)
+        self._touch(name)
+        return value
+
+    def _hdel(self, name: str, *keys):
+        hash_ = self._typed(name, dict) or {}
+        deleted = sum(hash_.pop(key, None) is not None for key in keys)
+        if deleted:
+            self._touch(name)
+        return deleted
+
+    # 集合
+    def _sadd(self, name: str, *values):
+        set_ = self._typed(name, set, create=True)
+        before = len(set_)
+        set_.update(values)
+        self._touch(name)
+        return len(set_) - before
+
+    def _srem(self, name: str, *values):
+        set_ = self._typed(name, set) or set()
+        before = len(set_)
+        set_.difference_update(values)
+        if len(set_) != before:
+            self._touch(name)
+        return before - len(set_)
+
+    def _smembers(self, name: str):
+        return set(self._typed(name, set) or ())
+
+    def _scard(self, name: str):
+        return len(self._typed(name, set) or ())
+
+    # 列表
+    def _rpush(self, name: str, *values):
+        list_ = self._typed(name, list, create=True)
+        list_.extend(values)
+        length = len(list_)
+        self._touch(name)
+        self._pushed.notify_all()
+        return length
+
+    def _lpop(self, name: str):
+        list_ = self._typed(name, list)
+        if not list_:
+            return None
+        value = list_.pop(0)
+        self._touch(name)
+        return value
+
+    def _lrange(self, name: str, start: int, end: int):
+        list_ = self._typed(name, list) or []
+        start, stop = _index_range(len(list_), start, end)
+        return list_[start:stop]
+
+    def _blpop(self, names: List[str], timeout: float):
+        """依次检查各列表，都为空时等待写入（timeout为0表示一直等待）"""
+        deadline = time.monotonic() + timeout if timeout else None
+        while True:
+            for name in names:
+                if self._typed(name, list):
+                    return name, self._lpop(name)
+            remaining = deadline - time.monotonic() if deadline is not None else None
+            if remaining is not None and remaining <= 0:
+                return None
+            self._pushed.wait(remaining)
+
+    # 有序集合
+    def _zadd(self, name: str, pairs: List[Tuple[str, float]], nx: bool = False):
+        zset = self._typed(name, _SortedSet, create=True)
+        added = 0
+        for member, score in pairs:
+            if nx and member in zset.scores:
+                continue
+            added += zset.add(member, score)
+        self._touch(name)
+        return added
+
+    def _zrem(self, name: str, *members):
+        zset = self._typed(name, _SortedSet)
+        if zset is None:
+            return 0
+        removed = sum(zset.remove(member) for member in members)
+        if removed:
+            self._touch(name)
+        return removed
+
+    def _zcard(self, name: str):
+        return len(self._typed(name, _SortedSet) or ())
+
+    def _zcount(self, name: str, min_score: Any, max_score: Any):
+        zset = self._typed(name, _SortedSet)
+        return zset.count(min_score, max_score) if zset is not None else 0
+
+    def _zscore(self, name: str, member: str):
+        zset = self._typed(name, _SortedSet)
+        return zset.scores.get(member) if zset is not None else None
+
+    def _zrange(self, name: str, start: int, end: int, desc: bool = False, withscores: bool = False):
+        zset = self._typed(name, _SortedSet)
+        if zset is None:
+            return []
+        entries = zset.entries[::-1] if desc else zset.entries
+        start, stop = _index_range(len(entries), start, end)
+        if withscores:
+            return [(member, score) for score, member in entries[start:stop]]
+        return [member for _, member in entries[start:stop]]
+
+    # 流
+    def _xadd(self, name: str, fields: Dict[str, str], entry_id: str):
+        stream = self._typed(name, _Stream, create=True)
+        last = stream.entries[-1][:2] if stream.entries else (0, 0)
+        if entry_id == "*":
+            ms = max(int(time.time() * 1000), last[0])
+            new_id = (ms, last[1] + 1 if ms == last[0] else 0)
+        else:
+            ms, _, seq = entry_id.partition("-")
+            new_id = (int(ms), int(seq or 0))
+            if new_id <= last:
+                if not stream.entries:
+                    del self._data[name]
+                raise redis.ResponseError("The ID specified in XADD is equal or smaller than the target "
+                                          "stream top item")
+        stream.entries.append((new_id[0], new_id[1], fields))
+        self._touch(name)
+        return f"{new_id[0]}-{new_id[1]}"
+
+    def _xrange(self, name: str, min_id: str, max_id: str, count: Optional[int], reverse: bool = False):
+        stream = self._typed(name, _Stream)
+        if stream is None:
+            return []
+        entries = stream.select(str(min_id), str(max_id))
+        if reverse:
+            entries.reverse()
+        if count is not None:
+            entries = entries[:count]
+        return [(f"{ms}-{seq}", dict(fields)) for ms, seq, fields in entries]
+
+
+class MemoryPipeline(_Commands):
+    """MemoryRedis的pipeline：命令排队后在execute时一次执行（一次往返）
+
+    transaction=True时整批在锁内原子执行；watch()之后、multi()之前的命令立即执行，
+    被监视的键在execute前被修改时抛出redis.WatchError，与redis-py相同。
+    """
+
+    def __init__(self, store: MemoryRedis, transaction: bool = True):
+        self.store = store
+        self.transaction = transaction
+        self.command_stack: List[Tuple[Tuple, Dict[str, Any]]] = []
+        self.watching = False
+        self.explicit_transaction = False
+        self._watched: Dict[str, int] = {}
+
+    def __enter__(self) -> "MemoryPipeline":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.reset()
+
+    def __len__(self) -> int:
+        return len(self.command_stack)
+
+    def reset(self):
+        self.command_stack = []
+        self.watching = False
+        self.explicit_transaction = False
+        self._watched = {}
+
+    def execute_command(self, *args, **options):
+        if self.watching and not self.explicit_transaction:
+            return self.immediate_execute_command(*args, **options)
+        self.command_stack.append((args, options))
+        return self
+
+    def immediate_execute_command(self, *args, **options):
+        return self.store._execute(args, options)
+
+    def watch(self, *names):
+        if self.explicit_transaction:
+            raise redis.RedisError("Cannot issue a WATCH after a MULTI")
+        self.watching = True
+        self._watched.update(self.immediate_execute_command("WATCH", *names))
+        return True
+
+    def unwatch(self):
+        self._watched = {}
+        self.watching = False
+        return True
+
+    def multi(self):
+        if self.explicit_transaction:
+            raise redis.RedisError("Cannot issue nested calls to MULTI")
+        if self.command_stack:
+            raise redis.RedisError("Commands without an initial WATCH have already been issued")
+        self.explicit_transaction = True
+
+    def execute(self, raise_on_error: bool = True) -> List[Any]:
+        stack, watched = self.command_stack, self._watched
+        if not stack and not watched:
+            return []
+        store = self.store
+        store._round_trip()
+        try:
+            with store._lock:
+                if any(store._versions[name] != version for name, version in watched.items()):
+                    raise redis.WatchError("Watched variable changed.")
+                results = []
+                for args, options in stack:
+                    try:
+                        results.append(store._run(args, options))
+                    except redis.ResponseError as e:
+                        results.append(e)
+        finally:
+            self.reset()
+        if raise_on_error:
+            for result in results:
+                if isinstance(result, redis.ResponseError):
+                    raise result
+        return results
@@ -0,0 +1,40 @@
+"""
+数据迁移：升级后对已有数据执行一次（均可重复执行）
+
+    python -m backend.migrations            # 执行全部迁移
+    python -m backend.migrations user_registry
+"""
+import os
+import sys
+
+# Add project root to path to allow running this file directly
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backend.redis_manager import RedisManager
+
+MIGRATIONS = {
+    # 从 user:answers:* 键补全用户注册表 users:all
+    "user_registry": lambda redis_manager: redis_manager.backfill_user_registry(),
+    # 组合题答案改为位掩码存储，统计改为按选项计数
+    "combination_masks": lambda redis_manager: redis_manager.migrate_combination_answers(),
+    # 答案由JSON改为紧凑编码（类型标记 + 值，选择题存选项下标，时间戳为Unix秒）
+    "compact_answers": lambda redis_manager: redis_manager.migrate_answer_encoding(),
+    # 数值题的分布计数由按取值（value:*）改为直方图分桶（bin:*），按答案重建统计（建议在没有观众提交时执行）
+    "numeric_histograms": lambda redis_manager: len(redis_manager.check_question_stats(repair=True)),
+}
+
+
+def main():
+    names = sys.argv[1:] or list(MIGRATIONS)
+    unknown = [name for name in names if name not in MIGRATIONS]
+    if unknown:
+        sys.exit(f"Unknown migrations: {', '.join(unknown)} (available: {', '.join(MIGRATIONS)})")
+
+    redis_manager = RedisManager()
+    for name in names:
+        result = MIGRATIONS[name](redis_manager)
+        print(f"{name}: {result}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,215 @@
+"""
+全体答案的列式快照
+
+一次性读取所有 user:answers:* 哈希，按题目整理为NumPy列：
+数值题为浮点数组，选择题与文本题为整数编码的分类数组，组合题为选项位掩码。
+从Redis加载时直接按列解析紧凑编码（选项下标即分类编码、位掩码与数值直接转换），不构造逐个答案的字典。
+评分规则基于快照批量计算，不再逐题逐人访问Redis。
+"""
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from backend.redis_manager import RedisManager, combination_mask, decode_answer_value, split_encoded_answer
+from config.questions import QUESTIONS, QuestionType
+
+
+class PopulationSnapshot:
+    def __init__(self, user_ids: List[str], all_answers: Dict[str, Dict[str, Any]]):
+        """根据用户列表及其答案（get_all_user_answers的返回值）构建快照"""
+        self.user_ids = list(user_ids)
+        self.user_index = {user_id: i for i, user_id in enumerate(self.user_ids)}
+        n = len(self.user_ids)
+
+        # 每道题：是否作答（bool[n]）
+        self.present: Dict[str, np.ndarray] = {}
+        # 数值题：float[n]，未作答或无法转换为数值时为NaN
+        self.values: Dict[str, np.ndarray] = {}
+        # 选择题/文本题：int32[n] 分类编码（-1为未作答）及编码对应的答案（先按选项顺序，再按首次出现顺序）
+        self.codes: Dict[str, np.ndarray] = {}
+        self.categories: Dict[str, List[Any]] = {}
+        # 组合题：int64[n] 位掩码，第i位表示选择了第i个选项
+        self.masks: Dict[str, np.ndarray] = {}
+
+        columns: Dict[str, List[Any]] = {}
+        for i, user_id in enumerate(self.user_ids):
+            for question_id, answer_data in all_answers.get(user_id, {}).items():
+                if question_id in QUESTIONS:
+                    if question_id not in columns:
+                        columns[question_id] = [None] * n
+                    columns[question_id][i] = answer_data
+
+        for question_id, column in columns.items():
+            present = np.array([answer_data is not None for answer_data in column], dtype=bool)
+            answers = [answer_data["answer"] if answer_data is not None else None for answer_data in column]
+            self.present[question_id] = present
+
+            question_type = QUESTIONS[question_id]["type"]
+            if question_type == QuestionType.NUMBER.value:
+                self.values[question_id] = np.array([_to_float(answer) for answer in answers], dtype=float)
+            elif question_type == QuestionType.COMBINATION.value:
+                self.masks[question_id] = np.array(
+                    [combination_mask(question_id, answer) for answer in answers], dtype=np.int64
+                )
+            else:
+                self._encode_categories(question_id, answers, present)
+
+    @classmethod
+    def load(cls, redis_manager) -> "PopulationSnapshot":
+        """从Redis读取所有用户的答案（单次pipeline）构建快照"""
+        user_ids = redis_manager.get_all_users()
+        return cls.from_encoded(user_ids, redis_manager.get_encoded_answers(user_ids))
+
+    @classmethod
+    def from_encoded(cls, user_ids: List[str], encoded_answers: Dict[str, Dict[str, str]]) -> "PopulationSnapshot":
+        """根据未解码的存储值（get_encoded_answers的返回值）构建快照，结果与解码后构建相同"""
+        snapshot = cls(user_ids, {})
+        n = len(snapshot.user_ids)
+        columns: Dict[str, List[Optional[str]]] = {}
+        for i, user_id in enumerate(snapshot.user_ids):
+            for question_id, encoded in encoded_answers.get(user_id, {}).items():
+                if question_id in QUESTIONS:
+                    if question_id not in columns:
+                        columns[question_id] = [None] * n
+                    columns[question_id][i] = split_encoded_answer(encoded)[1]
+
+        for question_id, values in columns.items():
+            present = np.array([value is not None for value in values], dtype=bool)
+            snapshot.present[question_id] = present
+
+            question_type = QUESTIONS[question_id]["type"]
+            if question_type == QuestionType.NUMBER.value:
+                snapshot.values[question_id] = np.array([
+                    np.nan if value is None
+                    else float(value[1:]) if value[0] in "if"
+                    else _to_float(_decode_value(question_id, value))
+                    for value in values
+                ], dtype=float)
+            elif question_type == QuestionType.COMBINATION.value:
+                snapshot.masks[question_id] = np.array([
+                    0 if value is None
+                    else int(value[1:]) if value[0] == "m"
+                    else combination_mask(question_id, _decode_value(question_id, value))
+                    for value in values
+                ], dtype=np.int64)
+            else:
+                # 选项下标即分类编码（分类先按选项顺序排列），其余答案解码后再编码
+                codes = np.array([int(value[1:]) if value is not None and value[0] == "o" else -1
+                                  for value in values], dtype=np.int32)
+                answers = [
+                    _decode_value(question_id, value) if value is not None and value[0] != "o" else None
+                    for value in values
+                ]
+                snapshot._encode_categories(question_id, answers, present & (codes < 0), codes)
+        return snapshot
+
+    def __len__(self) -> int:
+        return len(self.user_ids)
+
+    def _encode_categories(self, question_id: str, answers: List[Any], present: np.ndarray,
+                           codes: Optional[np.ndarray] = None):
+        """为present处的答案分配分类编码（codes中已有的编码保持不变）"""
+        categories = list(QUESTIONS[question_id].get("options", []))
+        lookup = {category: code for code, category in enumerate(categories)}
+        if codes is None:
+            codes = np.full(len(answers), -1, dtype=np.int32)
+        for i in np.flatnonzero(present):
+            answer = answers[i]
+            key = tuple(answer) if isinstance(answer, list) else answer
+            if key not in lookup:
+                lookup[key] = len(categories)
+                categories.append(key)
+            codes[i] = lookup[key]
+        self.codes[question_id] = codes
+        self.categories[question_id] = categories
+
+    def respondents(self, question_id: str) -> np.ndarray:
+        """作答该题的用户下标（按快照中的用户顺序）"""
+        present = self.present.get(question_id)
+        return np.flatnonzero(present) if present is not None else np.array([], dtype=int)
+
+    def respondent_ids(self, question_id: str) -> List[str]:
+        """作答该题的用户ID"""
+        return [self.user_ids[i] for i in self.respondents(question_id)]
+
+    def numeric(self, question_id: str) -> np.ndarray:
+        """题目答案的数值列（未作答或无法转换为数值时为NaN），选择题/文本题按分类逐个转换"""
+        if question_id in self.values:
+            return self.values[question_id]
+        if question_id in self.codes:
+            lookup = np.array([_to_float(category) for category in self.categories[question_id]] + [np.nan])
+            return lookup[self.codes[question_id]]
+        return np.full(len(self), np.nan)
+
+    def counts_by_category(self, question_id: str) -> Dict[Any, int]:
+        """选择题/文本题各答案的人数（只含有人选择的答案）"""
+        codes = self.codes.get(question_id)
+        if codes is None:
+            return {}
+        counts = np.bincount(codes[codes >= 0], minlength=len(self.categories[question_id]))
+        return {
+            category: count
+            for category, count in zip(self.categories[question_id], counts.tolist()) if count > 0
+        }
+
+    def category_values(self, question_id: str, indices: Optional[np.ndarray] = None) -> np.ndarray:
+        """选择题/文本题的答案（object数组，未作答为None）"""
+        codes = self.codes.get(question_id)
+        if codes is None:
+            return np.full(len(self) if indices is None else len(indices), None, dtype=object)
+        lookup = np.empty(len(self.categories[question_id]) + 1, dtype=object)
+        lookup[:-1] = self.categories[question_id]
+        return lookup[codes if indices is None else codes[indices]]
+
+    def option_counts(self, question_id: str) -> np.ndarray:
+        """组合题每个选项被选择的人数（按选项顺序）"""
+        n_options = len(QUESTIONS[question_id].get("options", []))
+        masks = self.masks.get(question_id)
+        if masks is None:
+            return np.zeros(n_options, dtype=int)
+        return option_bits(masks, n_options).sum(axis=0)
+
+    def combo_keys(self, question_id: str, masks: np.ndarray) -> List[str]:
+        """组合题位掩码对应的组合键（与问题统计中的 combo: 字段一致）"""
+        options = QUESTIONS[question_id].get("options", [])
+        return [
+            ",".join(sorted(option for i, option in enumerate(options) if int(mask) >> i & 1))
+            for mask in masks
+        ]
+
+    def answer(self, question_id: str, index: int) -> Any:
+        """还原某个用户对某题的答案"""
+        if question_id not in self.present or not self.present[question_id][index]:
+            return None
+        if question_id in self.values:
+            value = self.values[question_id][index]
+            return None if np.isnan(value) else float(value)
+        if question_id in self.masks:
+            return self.combo_keys(question_id, [self.masks[question_id][index]])[0].split(",")
+        category = self.categories[question_id][self.codes[question_id][index]]
+        return list(category) if isinstance(category, tuple) else category
+
+
+def option_bits(masks: np.ndarray, n_options: int) -> np.ndarray:
+    """将位掩码展开为 (用户数, 选项数) 的0/1矩阵"""
+    return (np.asarray(masks, dtype=np.int64)[:, None] >> np.arange(n_options)) & 1
+
+
+def popcount(masks: np.ndarray, n_options: int) -> np.ndarray:
+    """每个位掩码中置位的个数"""
+    return option_bits(masks, n_options).sum(axis=1)
+
+
+def _decode_value(question_id: str, value: str) -> Any:
+    """解码单个存储值（去掉时间戳后的紧凑编码，或旧格式的JSON）"""
+    if value.startswith("{"):
+        return RedisManager._decode_answer(value, question_id)["answer"]
+    return decode_answer_value(question_id, value)
+
+
+def _to_float(value: Any) -> float:
+    """尝试将答案转换为浮点数，失败返回NaN"""
+    try:
+        return float(value)
+    except (ValueError, TypeError):
+        return np.nan
@@ -0,0 +1,103 @@
+"""
+后台重算服务
+
+从Redis队列读取答题提交产生的重算任务，把一段时间内的多次提交合并为一次增量重算，
+完成后更新 scores:version，前端据此轮询坐标是否已经更新。
+
+启动方式：python -m backend.recompute_worker
+"""
+import logging
+import os
+import sys
+import time
+from typing import Any, Dict, Optional
+
+# Add project root to path to allow running this file directly
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backend.redis_manager import RedisManager, storage_backend
+from backend.scoring_engine import ScoringEngine
+
+logger = logging.getLogger(__name__)
+
+
+class RecomputeWorker:
+    def __init__(self, redis_manager, scoring_engine, block_timeout: int = 5, coalesce_window: float = 0.2):
+        """初始化后台重算服务
+
+        coalesce_window: 收到第一个任务后等待的秒数，期间到达的提交会合并到同一次重算中
+        """
+        self.redis_manager = redis_manager
+        self.scoring_engine = scoring_engine
+        self.block_timeout = block_timeout
+        self.coalesce_window = coalesce_window
+
+    def run_once(self) -> Optional[Dict[str, Any]]:
+        """处理一批积压的任务，没有任务时返回None"""
+        first_user_id = self.redis_manager.wait_recompute_job(self.block_timeout)
+        if first_user_id is None:
+            return None
+
+        # 等待同一波提交到齐，合并为一次重算
+        if self.coalesce_window > 0:
+            time.sleep(self.coalesce_window)
+        backlog, version = self.redis_manager.drain_recompute_jobs()
+        user_ids = [first_user_id] + backlog
+
+        try:
+            report = self._recompute(sorted(set(user_ids)))
+        except Exception:
+            # 任务已从队列取出：放回队列，得分版本保持不变，避免这些提交的得分一直过期
+            self.redis_manager.requeue_recompute_jobs(user_ids)
+            raise
+        self.redis_manager.set_scores_version(version)
+        report["version"] = version
+        report["jobs"] = len(user_ids)
+        return report
+
+    def _recompute(self, user_ids):
+        """增量重算；失败时退回全量重算（全量重算覆盖所有用户，不依赖摘要比较）"""
+        try:
+            return self.scoring_engine.recalculate_incremental(user_ids)
+        except Exception:
+            logger.exception("Incremental recompute failed, falling back to a full recompute")
+        self.scoring_engine.recalculate_all_scores()
+        total_users = len(self.redis_manager.get_all_users())
+        return {"changed_questions": None, "touched_users": total_users, "total_users": total_users}
+
+    def run_forever(self):
+        """持续处理重算任务"""
+        logger.info("Recompute worker started")
+        while True:
+            try:
+                report = self.run_once()
+                if report:
+                    logger.info(
+                        "Recomputed version %s: %s jobs, %s/%s users touched",
+                        report["version"], report["jobs"], report["touched_users"], report["total_users"],
+                    )
+            except Exception:
+                logger.exception("Error during recompute, jobs requeued")
+                time.sleep(1)
+
+
+def main():
+    if storage_backend() == "memory":
+        sys.exit("REDIS_BACKEND=memory keeps data inside one process; "
+                 "run the app with RECOMPUTE_IN_BACKGROUND=false instead of a separate worker")
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    redis_manager = RedisManager()
+    registered = redis_manager.backfill_user_registry()
+    if registered:
+        logger.info("Registered %s existing users in the user index", registered)
+    scoring_engine = ScoringEngine(redis_manager)
+    worker = RecomputeWorker(
+        redis_manager,
+        scoring_engine,
+        coalesce_window=float(os.environ.get("RECOMPUTE_COALESCE_SECONDS", 0.2)),
+    )
+    worker.run_forever()
+
+
+if __name__ == "__main__":
+    main()
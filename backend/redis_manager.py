@@ -3,47 +3,315 @@ Redis数据管理器
 """
 import redis
 import json
-from typing import Dict, Any, List, Optional
+import base64
+import struct
+import uuid
+from typing import Dict, Any, Iterator, List, Optional, Tuple
 from datetime import datetime
+from functools import lru_cache
+import math
 import os
+from backend.memory_store import MemoryRedis
+from backend.redis_metrics import instrument_client, instrumentation_enabled
+from config.questions import DEFAULT_HISTOGRAM_BINS, HISTOGRAM_BINS, QUESTIONS, QuestionType, ScoringRule
+
+# 组合题：答案以位掩码整数存储（第i位表示选择了第i个选项），问题统计按选项计数（option:{选项}）
+COMBINATION_QUESTIONS = {
+    question_id for question_id, question in QUESTIONS.items()
+    if question["type"] == QuestionType.COMBINATION.value
+}
+
+# 按众数投票评分的组合题，问题统计额外按组合计数（combo:{排序后的选项}），供单用户评分读取组合票数
+COMBO_VOTE_QUESTIONS = {
+    question_id for question_id in COMBINATION_QUESTIONS
+    if QUESTIONS[question_id].get("rule") == ScoringRule.MAJORITY_VOTE.value
+}
+
+# 用户注册表：有序集合，成员为用户ID，分值为首次答题时间（Unix时间戳）；所有遍历用户的操作都经由它
+USERS_KEY = "users:all"
+
+# 坐标历史：每代重算一条流记录，ID为 {generation}-0；每隔若干代写一次全量关键帧
+AXES_HISTORY_KEY = "axes:history"
+HISTORY_KEYFRAME_INTERVAL = int(os.getenv("HISTORY_KEYFRAME_INTERVAL", 20))
+
+# 每代重算结束后发布变化的频道（API的实时推送订阅此频道）
+SCORES_UPDATES_CHANNEL = "scores:updates"
+
+def connection_settings(host=None, port=None, db=None, password=None, decode_responses=True,
+                        max_connections=None, socket_timeout=None, socket_connect_timeout=None,
+                        health_check_interval=None) -> Dict[str, Any]:
+    """Redis连接池参数：显式参数优先，其次为环境变量
+
+    连接池大小、超时与健康检查间隔对应环境变量
+    REDIS_MAX_CONNECTIONS / REDIS_SOCKET_TIMEOUT / REDIS_CONNECT_TIMEOUT / REDIS_HEALTH_CHECK_INTERVAL。
+    """
+    return {
+        "host": host or os.environ.get('REDIS_HOST', 'localhost'),
+        "port": port or int(os.environ.get('REDIS_PORT', 6379)),
+        "db": db if db is not None else int(os.environ.get('REDIS_DB', 0)),
+        "password": password or os.environ.get('REDIS_PASSWORD'),
+        "decode_responses": decode_responses,
+        "max_connections": max_connections or int(os.environ.get('REDIS_MAX_CONNECTIONS', 50)),
+        "socket_timeout": socket_timeout or float(os.environ.get('REDIS_SOCKET_TIMEOUT', 10)),
+        "socket_connect_timeout": socket_connect_timeout or float(os.environ.get('REDIS_CONNECT_TIMEOUT', 5)),
+        "health_check_interval": health_check_interval or int(os.environ.get('REDIS_HEALTH_CHECK_INTERVAL', 30)),
+    }
+
+
+def storage_backend() -> str:
+    """RedisManager默认使用的存储后端（环境变量REDIS_BACKEND）：redis 或 memory"""
+    return os.getenv("REDIS_BACKEND", "redis").lower()
+
+
+def combination_mask(question_id: str, answer: Any) -> int:
+    """组合题答案（选项列表，或已编码的位掩码）对应的位掩码，不在选项中的值忽略"""
+    if isinstance(answer, int) and not isinstance(answer, bool):
+        return answer
+    if not isinstance(answer, list):
+        return 0
+    options = QUESTIONS[question_id].get("options", [])
+    return sum(1 << i for i, option in enumerate(options) if option in answer)
+
+
+def combination_options(question_id: str, mask: int) -> List[str]:
+    """位掩码对应的选项列表（按选项顺序）"""
+    options = QUESTIONS[question_id].get("options", [])
+    return [option for i, option in enumerate(options) if mask >> i & 1]
+
+
+def histogram_bucket(question_id: str, value: float) -> str:
+    """数值答案所在的直方图分桶（见config.questions.HISTOGRAM_BINS）
+
+    区间 [下限, 下限+宽度) 记为 "下限-上限"（宽度为1时只记下限），小于0记为 "<0"，不小于max记为 "max+"。
+    """
+    bins = HISTOGRAM_BINS.get(QUESTIONS.get(question_id, {}).get("input_type"), DEFAULT_HISTOGRAM_BINS)
+    width, upper = bins["width"], bins["max"]
+    if math.isnan(value):
+        return "NaN"
+    if value < 0:
+        return "<0"
+    if value >= upper:
+        return f"{upper}+"
+    lower = int(value // width) * width
+    return str(lower) if width == 1 else f"{lower}-{lower + width}"
+
+
+# 选择题答案在选项中的下标（紧凑编码中以选项下标存储）
+OPTION_INDEX = {
+    question_id: {option: i for i, option in enumerate(question["options"])}
+    for question_id, question in QUESTIONS.items()
+    if question["type"] == QuestionType.SINGLE_CHOICE.value and question.get("options")
+}
+
+
+def encode_answer_value(question_id: Optional[str], answer: Any) -> str:
+    """答案的紧凑编码：类型标记 + 值
+
+    o 选项下标（选择题）、m 位掩码（组合题）、i 整数、f 浮点数、s 字符串、j 其余类型的JSON。
+    """
+    if question_id in COMBINATION_QUESTIONS and isinstance(answer, list):
+        return f"m{combination_mask(question_id, answer)}"
+    if isinstance(answer, str):
+        index = OPTION_INDEX.get(question_id, {}).get(answer)
+        return f"o{index}" if index is not None else f"s{answer}"
+    if isinstance(answer, bool) or answer is None:
+        return "j" + json.dumps(answer)
+    if isinstance(answer, int):
+        return f"m{answer}" if question_id in COMBINATION_QUESTIONS else f"i{answer}"
+    if isinstance(answer, float):
+        return f"f{answer!r}"
+    return "j" + json.dumps(answer, ensure_ascii=False)
+
+
+def decode_answer_value(question_id: Optional[str], value: str) -> Any:
+    """还原encode_answer_value编码的答案（组合题还原为选项列表）"""
+    tag, payload = value[:1], value[1:]
+    if tag == "o":
+        return QUESTIONS[question_id]["options"][int(payload)]
+    if tag == "s":
+        return payload
+    if tag == "i":
+        return int(payload)
+    if tag == "f":
+        return float(payload)
+    if tag == "m":
+        return combination_options(question_id, int(payload))
+    return json.loads(payload)
+
+
+@lru_cache(maxsize=4096)
+def epoch_isoformat(epoch: str) -> Optional[str]:
+    """存储的Unix时间戳（秒）转换为本地时间的ISO字符串（同一次提交的答案共用一个时间戳，结果缓存）"""
+    return datetime.fromtimestamp(int(epoch)).isoformat() if epoch else None
+
+
+def split_encoded_answer(encoded: str) -> Tuple[str, str]:
+    """拆分紧凑编码的存储值为 (时间戳, 编码后的答案)；旧格式（JSON）返回 (None, 原值)"""
+    if encoded.startswith("{"):
+        return None, encoded
+    epoch, _, value = encoded.partition(":")
+    return epoch, value
+
 
 class RedisManager:
-    def __init__(self, host=None, port=None, db=None, password=None, decode_responses=True):
-        """初始化Redis连接"""
-        # Use environment variables if provided, otherwise use defaults
-        self.redis_client = redis.Redis(
-            host=host or os.environ.get('REDIS_HOST', 'localhost'),
-            port=port or int(os.environ.get('REDIS_PORT', 6379)),
-            db=db if db is not None else int(os.environ.get('REDIS_DB', 0)),
-            password=password or os.environ.get('REDIS_PASSWORD'),
-            decode_responses=decode_responses
-        )
-        
+    def __init__(self, host=None, port=None, db=None, password=None, decode_responses=True,
+                 client=None, **pool_options):
+        """初始化Redis连接池（池参数见connection_settings）。同一个实例可在多个线程间共享。
+
+        client为可替换的存储后端：任何与 redis.Redis(decode_responses=True) 接口一致的客户端，
+        如进程内的 backend.memory_store.MemoryRedis 或fakeredis。未传入时按环境变量 REDIS_BACKEND
+        选择：redis（默认，连接Redis服务器）或 memory（进程内存储，无需网络）。
+        设置 REDIS_INSTRUMENTATION=true 时，所有命令计入 backend.redis_metrics.REDIS_METRICS（默认不统计）。
+        """
+        if client is None and storage_backend() == "memory":
+            client = MemoryRedis()
+        if client is not None:
+            self.redis_client = client
+            self.connection_pool = getattr(client, "connection_pool", None)
+        else:
+            self.connection_pool = redis.ConnectionPool(
+                **connection_settings(host, port, db, password, decode_responses, **pool_options)
+            )
+            self.redis_client = redis.Redis(connection_pool=self.connection_pool)
+        if instrumentation_enabled():
+            instrument_client(self.redis_client)
+
+    def ping(self) -> bool:
+        """检查Redis是否可用"""
+        try:
+            return bool(self.redis_client.ping())
+        except redis.RedisError:
+            return False
+
+    def pool_stats(self) -> Dict[str, int]:
+        """连接池状态：上限、已创建、空闲与使用中的连接数"""
+        pool = self.connection_pool
+        if pool is None:
+            # 进程内存储没有连接池
+            return {"max_connections": 0, "created_connections": 0,
+                    "available_connections": 0, "in_use_connections": 0}
+        return {
+            "max_connections": pool.max_connections,
+            "created_connections": pool._created_connections,
+            "available_connections": len(pool._available_connections),
+            "in_use_connections": len(pool._in_use_connections),
+        }
+
+    def close(self):
+        """断开连接池中的所有连接"""
+        if self.connection_pool is None:
+            self.redis_client.close()
+        else:
+            self.connection_pool.disconnect()
+
     def save_user_answer(self, user_id: str, question_id: str, answer: Any) -> bool:
         """保存用户答案"""
+        return self.save_user_answers(user_id, {question_id: answer})
+
+    def save_user_answers(self, user_id: str, answers: Dict[str, Any]) -> bool:
+        """批量保存用户答案，整份提交在一个MULTI/EXEC事务中写入
+
+        统计按与该用户旧答案的差异增减（重复提交不会重复计数）。事务期间监视该用户的答案键，
+        若旧答案在读取后被并发修改则重试，保证统计与答案始终一致。
+        """
+        if not answers:
+            return True
+
         try:
             # 用户答案键：user:answers:{user_id}
             key = f"user:answers:{user_id}"
-            
-            # 将答案转换为JSON字符串存储
-            answer_data = {
-                "answer": answer,
-                "timestamp": datetime.now().isoformat()
-            }
-            
-            self.redis_client.hset(key, question_id, json.dumps(answer_data))
-            
-            # 记录该问题的所有回答者
-            self.redis_client.sadd(f"question:respondents:{question_id}", user_id)
-            
-            # 更新问题的答案统计
-            self._update_question_stats(question_id, answer)
-            
+            joined_at = datetime.now().timestamp()
+            timestamp = int(joined_at)
+            question_ids = list(answers.keys())
+
+            with self.redis_client.pipeline() as pipe:
+                while True:
+                    try:
+                        pipe.watch(key)
+                        previous = dict(zip(question_ids, pipe.hmget(key, question_ids)))
+
+                        pipe.multi()
+                        pipe.zadd(USERS_KEY, {user_id: joined_at}, nx=True)
+                        pipe.set("question:versions:epoch", uuid.uuid4().hex[:8], nx=True)
+                        pipe.hset(key, mapping={
+                            question_id: self._encode_answer(answer, timestamp, question_id)
+                            for question_id, answer in answers.items()
+                        })
+
+                        for question_id, answer in answers.items():
+                            # 记录该问题的所有回答者
+                            pipe.sadd(f"question:respondents:{question_id}", user_id)
+
+                            # 更新问题的答案统计（撤销旧答案的计数）
+                            old_answer = previous[question_id]
+                            if old_answer is not None:
+                                old_answer = self._decode_answer(old_answer, question_id)["answer"]
+                            self._update_question_stats(pipe, question_id, answer, old_answer)
+
+                        pipe.execute()
+                        break
+                    except redis.WatchError:
+                        continue
             return True
         except Exception as e:
-            print(f"Error saving answer: {e}")
+            print(f"Error saving answers: {e}")
             return False
     
+    def import_answers(self, submissions: List[Tuple[str, float, Dict[str, Tuple[Any, Any]]]]) -> int:
+        """批量导入答案：一次pipeline读取涉及用户的旧答案，再用一次pipeline写入全部答案及统计，返回写入的答案数
+
+        submissions为按顺序应用的提交 [(用户ID, 加入时间, {题目ID: (答案, 答题时间)})]，答题时间为Unix时间戳或ISO字符串。
+        统计与回答者集合的维护方式与save_user_answers相同（按新旧答案差异增减，重复导入不会重复计数），
+        但写入不在事务中，只用于没有观众提交的库（如导入演出数据的预发布Redis）。
+        """
+        if not submissions:
+            return 0
+
+        user_ids = list(dict.fromkeys(user_id for user_id, _, _ in submissions))
+        current = {
+            user_id: {
+                question_id: self._decode_answer(encoded, question_id)["answer"]
+                for question_id, encoded in raw_answers.items()
+            }
+            for user_id, raw_answers in self.get_encoded_answers(user_ids).items()
+        }
+
+        joined, encoded, respondents = {}, {}, {}
+        stats_deltas: Dict[Tuple[str, str], int] = {}
+        changed_questions = set()
+        written = 0
+        for user_id, joined_at, answers in submissions:
+            joined[user_id] = min(joined_at, joined.get(user_id, joined_at))
+            for question_id, (answer, timestamp) in answers.items():
+                old_fields = set(self._stats_fields(question_id, current[user_id].get(question_id)))
+                new_fields = set(self._stats_fields(question_id, answer))
+                if old_fields != new_fields:
+                    changed_questions.add(question_id)
+                    for field in old_fields - new_fields:
+                        stats_deltas[question_id, field] = stats_deltas.get((question_id, field), 0) - 1
+                    for field in new_fields - old_fields:
+                        stats_deltas[question_id, field] = stats_deltas.get((question_id, field), 0) + 1
+
+                current[user_id][question_id] = answer
+                encoded.setdefault(user_id, {})[question_id] = self._encode_answer(answer, timestamp, question_id)
+                respondents.setdefault(question_id, set()).add(user_id)
+                written += 1
+
+        pipe = self.redis_client.pipeline(transaction=False)
+        pipe.zadd(USERS_KEY, joined, nx=True)
+        pipe.set("question:versions:epoch", uuid.uuid4().hex[:8], nx=True)
+        for user_id, mapping in encoded.items():
+            pipe.hset(f"user:answers:{user_id}", mapping=mapping)
+        for question_id, users in respondents.items():
+            pipe.sadd(f"question:respondents:{question_id}", *users)
+        for (question_id, field), delta in sorted(stats_deltas.items()):
+            if delta:
+                pipe.hincrby(f"question:stats:{question_id}", field, delta)
+        for question_id in sorted(changed_questions):
+            pipe.hincrby("question:versions", question_id, 1)
+        pipe.execute()
+        return written
+
     def get_user_answers(self, user_id: str) -> Dict[str, Any]:
         """获取用户的所有答案"""
         key = f"user:answers:{user_id}"
@@ -51,11 +319,60 @@ class RedisManager:
         
         answers = {}
         for question_id, answer_json in raw_answers.items():
-            answer_data = json.loads(answer_json)
+            answer_data = self._decode_answer(answer_json, question_id)
             answers[question_id] = answer_data
             
         return answers
-    
+
+    def get_all_user_answers(self, user_ids: Optional[List[str]] = None) -> Dict[str, Dict[str, Any]]:
+        """批量获取多个用户的答案（单次pipeline读取）"""
+        if user_ids is None:
+            user_ids = self.get_all_users()
+
+        return {
+            user_id: {
+                question_id: self._decode_answer(encoded, question_id)
+                for question_id, encoded in raw_answers.items()
+            }
+            for user_id, raw_answers in self.get_encoded_answers(user_ids).items()
+        }
+
+    @staticmethod
+    def _encode_answer(answer: Any, timestamp: Any = None, question_id: Optional[str] = None) -> str:
+        """将答案编码为紧凑字符串存储："{Unix时间戳（秒）}:{encode_answer_value}"
+
+        如 "1760700000:o2"（选择题的第3个选项）；timestamp可为Unix时间戳或ISO时间字符串，为None时留空。
+        """
+        if isinstance(timestamp, str):
+            timestamp = datetime.fromisoformat(timestamp).timestamp()
+        epoch = "" if timestamp is None else int(timestamp)
+        return f"{epoch}:{encode_answer_value(question_id, answer)}"
+
+    @staticmethod
+    def _decode_answer(encoded: str, question_id: Optional[str] = None) -> Dict[str, Any]:
+        """解析存储的答案为 {"answer", "timestamp"}（时间戳还原为ISO字符串，组合题还原为选项列表）
+
+        兼容旧格式：JSON {"answer": ..., "timestamp": ISO时间}。
+        """
+        epoch, value = split_encoded_answer(encoded)
+        if epoch is None:
+            answer_data = json.loads(value)
+            answer = answer_data.get("answer")
+            if question_id in COMBINATION_QUESTIONS and isinstance(answer, int) and not isinstance(answer, bool):
+                answer_data["answer"] = combination_options(question_id, answer)
+            return answer_data
+        return {
+            "answer": decode_answer_value(question_id, value),
+            "timestamp": epoch_isoformat(epoch),
+        }
+
+    def get_encoded_answers(self, user_ids: List[str]) -> Dict[str, Dict[str, str]]:
+        """批量读取多个用户未解码的答案（单次pipeline），供PopulationSnapshot按列解码"""
+        pipe = self.redis_client.pipeline(transaction=False)
+        for user_id in user_ids:
+            pipe.hgetall(f"user:answers:{user_id}")
+        return dict(zip(user_ids, pipe.execute()))
+
     def get_question_answers(self, question_id: str) -> List[Dict[str, Any]]:
         """获取某个问题的所有答案"""
         respondents = self.redis_client.smembers(f"question:respondents:{question_id}")
@@ -64,7 +381,7 @@ class RedisManager:
         for user_id in respondents:
             answer_json = self.redis_client.hget(f"user:answers:{user_id}", question_id)
             if answer_json:
-                answer_data = json.loads(answer_json)
+                answer_data = self._decode_answer(answer_json, question_id)
                 all_answers.append({
                     "user_id": user_id,
                     "answer": answer_data["answer"],
@@ -120,34 +437,244 @@ class RedisManager:
     def get_question_stats(self, question_id: str) -> Dict[str, Any]:
         """获取问题统计信息"""
         stats_key = f"question:stats:{question_id}"
-        return self.redis_client.hgetall(stats_key)
+        return self._drop_empty_counts(self.redis_client.hgetall(stats_key))
     
-    def _update_question_stats(self, question_id: str, answer: Any):
-        """更新问题统计信息"""
-        stats_key = f"question:stats:{question_id}"
-        
+    def get_all_question_stats(self, question_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """批量获取多个问题的统计信息"""
+        pipe = self.redis_client.pipeline(transaction=False)
+        for question_id in question_ids:
+            pipe.hgetall(f"question:stats:{question_id}")
+        return {
+            question_id: self._drop_empty_counts(stats)
+            for question_id, stats in zip(question_ids, pipe.execute())
+        }
+
+    def get_question_version(self, question_id: str) -> str:
+        """问题统计的版本标识，统计每次变化都会改变，可用作缓存键或ETag
+
+        前缀为首次写入答案时生成的随机标识，清空数据后重新生成，避免版本号从0重新计数时与旧版本混淆。
+        """
+        pipe = self.redis_client.pipeline(transaction=False)
+        pipe.get("question:versions:epoch")
+        pipe.hget("question:versions", question_id)
+        return self._format_question_version(*pipe.execute())
+
+    def get_question_distribution_counts(self, question_id: str) -> Tuple[str, int, Dict[str, int]]:
+        """在一个事务中读取问题统计的版本、回答人数及各计数字段（option:/combo:/bin:），不扫描回答者"""
+        pipe = self.redis_client.pipeline()
+        pipe.get("question:versions:epoch")
+        pipe.hget("question:versions", question_id)
+        pipe.scard(f"question:respondents:{question_id}")
+        pipe.hgetall(f"question:stats:{question_id}")
+        epoch, version, total_respondents, stats = pipe.execute()
+        return (self._format_question_version(epoch, version), total_respondents,
+                {field: int(count) for field, count in self._drop_empty_counts(stats).items()})
+
+    @staticmethod
+    def _format_question_version(epoch: Optional[str], version: Optional[str]) -> str:
+        return f"{epoch or 0}-{version or 0}"
+
+    @staticmethod
+    def _drop_empty_counts(stats: Dict[str, Any]) -> Dict[str, Any]:
+        """去掉因答案修改而减到0的计数"""
+        return {field: count for field, count in stats.items() if int(count) > 0}
+
+    @staticmethod
+    def _stats_fields(question_id: str, answer: Any) -> List[str]:
+        """答案在问题统计中对应的计数字段"""
+        # 对于组合题（如火锅调料），分别统计每个选项被选择的人数，字段数不超过选项数
+        if question_id in COMBINATION_QUESTIONS:
+            options = combination_options(question_id, combination_mask(question_id, answer))
+            fields = [f"option:{option}" for option in options]
+            if question_id in COMBO_VOTE_QUESTIONS and answer is not None:
+                fields.append("combo:" + ",".join(sorted(options)))
+            return fields
+
         # 对于选择题，统计每个选项的数量
         if isinstance(answer, str):
-            self.redis_client.hincrby(stats_key, f"option:{answer}", 1)
-        
-        # 对于数值题，存储所有值用于计算
-        elif isinstance(answer, (int, float)):
-            values_key = f"question:values:{question_id}"
-            self.redis_client.rpush(values_key, answer)
-        
-        # 对于组合题（如火锅调料），存储组合
-        elif isinstance(answer, list):
-            combo_key = ",".join(sorted(answer))
-            self.redis_client.hincrby(stats_key, f"combo:{combo_key}", 1)
-    
+            return [f"option:{answer}"]
+
+        # 其他题目中的列表答案按组合计数
+        if isinstance(answer, list):
+            return ["combo:" + ",".join(sorted(answer))]
+
+        # 数值题按直方图分桶计数（不按取值，字段数不随答案增长），用于答案分布
+        if isinstance(answer, (int, float)) and not isinstance(answer, bool):
+            return ["bin:" + histogram_bucket(question_id, answer)]
+
+        return []
+
+    @classmethod
+    def _update_question_stats(cls, client, question_id: str, answer: Any, previous_answer: Any = None):
+        """按新旧答案的差异更新问题统计信息"""
+        stats_key = f"question:stats:{question_id}"
+        old_fields = set(cls._stats_fields(question_id, previous_answer))
+        new_fields = set(cls._stats_fields(question_id, answer))
+        if old_fields == new_fields:
+            return
+
+        for field in sorted(old_fields - new_fields):
+            client.hincrby(stats_key, field, -1)
+        for field in sorted(new_fields - old_fields):
+            client.hincrby(stats_key, field, 1)
+        client.hincrby("question:versions", question_id, 1)
+
+    def get_numeric_answers(self, question_id: str) -> List[float]:
+        """某题所有可转换为数值的答案（一次pipeline读取全部回答者的答案，无法转换的答案不参与排名）"""
+        respondents = list(self.redis_client.smembers(f"question:respondents:{question_id}"))
+        pipe = self.redis_client.pipeline(transaction=False)
+        for user_id in respondents:
+            pipe.hget(f"user:answers:{user_id}", question_id)
+
+        values = []
+        for encoded in pipe.execute():
+            if not encoded:
+                continue
+            try:
+                values.append(float(self._decode_answer(encoded, question_id)["answer"]))
+            except (ValueError, TypeError):
+                continue
+        return values
+
+    def check_question_stats(self, repair: bool = False) -> Dict[str, Dict[str, Any]]:
+        """一致性检查：根据 user:answers:* 重建问题统计与回答者集合，报告偏差
+
+        repair=True时用重建结果覆盖现有数据（并删除旧版本遗留的 question:values:* 列表与 question:rank:* 排名索引，
+        按取值计数的 value:* 字段也由此改为直方图分桶），
+        建议在没有观众提交时执行。修复前先补全用户注册表，避免未登记用户的答案被当作不存在。
+        """
+        if repair:
+            self.backfill_user_registry()
+        all_answers = self.get_all_user_answers()
+
+        expected_stats, expected_respondents = {}, {}
+        for user_id, answers in all_answers.items():
+            for question_id, answer_data in answers.items():
+                answer = answer_data["answer"]
+                expected_respondents.setdefault(question_id, set()).add(user_id)
+
+                for field in self._stats_fields(question_id, answer):
+                    question_stats = expected_stats.setdefault(question_id, {})
+                    question_stats[field] = question_stats.get(field, 0) + 1
+
+        question_ids = sorted(set(QUESTIONS) | set(expected_respondents))
+        pipe = self.redis_client.pipeline(transaction=False)
+        for question_id in question_ids:
+            pipe.hgetall(f"question:stats:{question_id}")
+            pipe.smembers(f"question:respondents:{question_id}")
+            pipe.exists(f"question:values:{question_id}", f"question:rank:{question_id}")
+        results = pipe.execute()
+
+        drift = {}
+        for i, question_id in enumerate(question_ids):
+            stats, respondents, legacy_keys = results[3 * i:3 * i + 3]
+            stats = {field: int(count) for field, count in stats.items()}
+            expected = expected_stats.get(question_id, {})
+            report = {}
+
+            stats_drift = {
+                field: {"actual": stats.get(field, 0), "expected": expected.get(field, 0)}
+                for field in set(stats) | set(expected)
+                if stats.get(field, 0) != expected.get(field, 0)
+            }
+            if stats_drift:
+                report["stats"] = stats_drift
+
+            expected_users = expected_respondents.get(question_id, set())
+            if set(respondents) != expected_users:
+                report["respondents"] = {
+                    "missing": len(expected_users - set(respondents)),
+                    "extra": len(set(respondents) - expected_users),
+                }
+
+            if legacy_keys:
+                report["legacy_keys"] = legacy_keys
+
+            if report:
+                drift[question_id] = report
+
+        if repair and drift:
+            pipe = self.redis_client.pipeline()
+            pipe.set("question:versions:epoch", uuid.uuid4().hex[:8], nx=True)
+            for question_id in drift:
+                pipe.hincrby("question:versions", question_id, 1)
+                pipe.delete(
+                    f"question:stats:{question_id}",
+                    f"question:respondents:{question_id}",
+                    f"question:rank:{question_id}",
+                    f"question:values:{question_id}",
+                )
+                if expected_stats.get(question_id):
+                    pipe.hset(f"question:stats:{question_id}", mapping=expected_stats[question_id])
+                if expected_respondents.get(question_id):
+                    pipe.sadd(f"question:respondents:{question_id}", *expected_respondents[question_id])
+            pipe.execute()
+
+        return drift
+
     def get_all_users(self) -> List[str]:
-        """获取所有用户ID"""
-        users = set()
-        for key in self.redis_client.scan_iter("user:answers:*"):
-            user_id = key.split(":")[-1]
-            users.add(user_id)
-        return list(users)
+        """获取所有用户ID（按首次答题时间排序）"""
+        return self.redis_client.zrange(USERS_KEY, 0, -1)
+
+    def backfill_user_registry(self) -> int:
+        """迁移：扫描已有的 user:answers:* 键补全用户注册表，返回新登记的用户数
+
+        以用户最早的答题时间作为加入时间；已登记的用户保持不变，可重复执行。
+        """
+        user_ids = [key.split(":", 2)[-1] for key in self.redis_client.scan_iter("user:answers:*")]
+        all_answers = self.get_all_user_answers(user_ids)
+
+        joined = {}
+        for user_id, answers in all_answers.items():
+            timestamps = [
+                datetime.fromisoformat(answer["timestamp"]).timestamp()
+                for answer in answers.values() if answer.get("timestamp")
+            ]
+            joined[user_id] = min(timestamps) if timestamps else datetime.now().timestamp()
+
+        if not joined:
+            return 0
+        return self.redis_client.zadd(USERS_KEY, joined, nx=True)
     
+    def migrate_combination_answers(self) -> int:
+        """迁移：将组合题以选项列表存储的旧答案改写为位掩码，并按选项计数重建这些题目的统计，返回改写的答案数
+
+        不按众数投票评分的组合题，旧的 combo:* 组合计数由check_question_stats修复时删除；可重复执行，建议在没有观众提交时执行。
+        """
+        return self.migrate_answer_encoding(sorted(COMBINATION_QUESTIONS))
+
+    def migrate_answer_encoding(self, question_ids: Optional[List[str]] = None) -> int:
+        """迁移：将旧格式（JSON）存储的答案改写为紧凑编码（见_encode_answer），返回改写的答案数
+
+        答案与时间戳（精确到秒）不变；改写了以选项列表存储的组合题答案时，按选项计数重建统计。
+        读取时两种格式都能解析，迁移前后无需停机；可重复执行。
+        """
+        user_ids = self.get_all_users()
+        encoded_answers = self.get_encoded_answers(user_ids)
+
+        rewritten = 0
+        combination_lists = False
+        pipe = self.redis_client.pipeline(transaction=False)
+        for user_id, raw_answers in encoded_answers.items():
+            updates = {}
+            for question_id, encoded in raw_answers.items():
+                if question_ids is not None and question_id not in question_ids:
+                    continue
+                if split_encoded_answer(encoded)[0] is not None:
+                    continue
+                answer_data = json.loads(encoded)
+                answer = answer_data.get("answer")
+                combination_lists |= question_id in COMBINATION_QUESTIONS and isinstance(answer, list)
+                updates[question_id] = self._encode_answer(answer, answer_data.get("timestamp"), question_id)
+            if updates:
+                pipe.hset(f"user:answers:{user_id}", mapping=updates)
+                rewritten += len(updates)
+        pipe.execute()
+
+        if combination_lists:
+            self.check_question_stats(repair=True)
+        return rewritten
+
     def get_leaderboard(self, top_n: int = 10) -> List[Dict[str, Any]]:
         """获取排行榜"""
         leaderboard_data = self.redis_client.zrevrange("leaderboard:users", 0, top_n-1, withscores=True)
@@ -165,7 +692,10 @@ class RedisManager:
     def save_user_raw_axes(self, user_id: str, raw_x: float, raw_y: float):
         """保存用户原始轴得分"""
         key = f"user:axes:raw:{user_id}"
-        self.redis_client.hset(key, mapping={"x": raw_x, "y": raw_y})
+        pipe = self.redis_client.pipeline()
+        pipe.hset(key, mapping={"x": raw_x, "y": raw_y})
+        pipe.incr("axes:raw:version")
+        pipe.execute()
 
     def get_user_raw_axes(self, user_id: str) -> tuple[float, float]:
         """获取用户原始轴得分"""
@@ -175,18 +705,57 @@ class RedisManager:
 
     def get_all_user_raw_axes(self) -> List[Dict[str, float]]:
         """获取所有用户的原始轴得分"""
-        all_scores = []
-        for key in self.redis_client.scan_iter("user:axes:raw:*"):
-            data = self.redis_client.hgetall(key)
-            if "x" in data and "y" in data:
-                all_scores.append({"x": float(data["x"]), "y": float(data["y"])})
-        return all_scores
+        return list(self._get_all_axes("user:axes:raw:").values())
+
+    def get_raw_axes_by_user(self) -> Dict[str, Tuple[float, float]]:
+        """按用户获取全部原始轴得分（单次pipeline）"""
+        return {user_id: (axes["x"], axes["y"]) for user_id, axes in self._get_all_axes("user:axes:raw:").items()}
+
+    def _get_all_axes(self, prefix: str) -> Dict[str, Dict[str, float]]:
+        """按用户注册表单次pipeline读取全部坐标，返回有坐标的用户"""
+        user_ids = self.get_all_users()
+        pipe = self.redis_client.pipeline(transaction=False)
+        for user_id in user_ids:
+            pipe.hgetall(f"{prefix}{user_id}")
+        return {
+            user_id: {"x": float(data["x"]), "y": float(data["y"])}
+            for user_id, data in zip(user_ids, pipe.execute()) if "x" in data and "y" in data
+        }
         
+    def get_axis_stats(self) -> Tuple[int, Optional[Dict[str, Dict[str, Any]]]]:
+        """获取原始坐标的当前版本号，以及该版本已缓存的轴分布（未缓存时为None）"""
+        pipe = self.redis_client.pipeline(transaction=False)
+        pipe.get("axes:raw:version")
+        pipe.hmget("axes:stats", "version", "x", "y")
+        version, (cached_version, x_stats, y_stats) = pipe.execute()
+        version = int(version or 0)
+        if cached_version is None or int(cached_version) != version:
+            return version, None
+        return version, {"x": json.loads(x_stats), "y": json.loads(y_stats)}
+
+    def save_axis_stats(self, version: int, x: Dict[str, Any], y: Dict[str, Any],
+                        x_sorted: List[float], y_sorted: List[float]):
+        """缓存某一版本原始坐标的轴分布（中位数、最值及排序后的原始分）"""
+        self.redis_client.hset("axes:stats", mapping={
+            "version": version,
+            "x": json.dumps(x),
+            "y": json.dumps(y),
+            "x_sorted": json.dumps(x_sorted),
+            "y_sorted": json.dumps(y_sorted),
+        })
+
     def save_user_final_axes(self, user_id: str, final_x: float, final_y: float):
         """保存用户最终轴得分"""
         key = f"user:axes:final:{user_id}"
         self.redis_client.hset(key, mapping={"x": final_x, "y": final_y})
 
+    def save_all_user_final_axes(self, final_axes: Dict[str, Tuple[float, float]]):
+        """在一个pipeline中保存多个用户的最终轴得分"""
+        pipe = self.redis_client.pipeline(transaction=False)
+        for user_id, (final_x, final_y) in final_axes.items():
+            pipe.hset(f"user:axes:final:{user_id}", mapping={"x": final_x, "y": final_y})
+        pipe.execute()
+
     def get_user_final_axes(self, user_id: str) -> tuple[float, float]:
         """获取用户最终轴得分"""
         key = f"user:axes:final:{user_id}"
@@ -195,12 +764,302 @@ class RedisManager:
 
     def get_all_user_final_axes(self) -> List[Dict[str, float]]:
         """获取所有用户的最终轴得分"""
-        all_scores = []
-        for key in self.redis_client.scan_iter("user:axes:final:*"):
-            data = self.redis_client.hgetall(key)
+        return list(self._get_all_axes("user:axes:final:").values())
+
+    def save_recompute_results(self, user_scores: Dict[str, Dict[str, float]],
+                               raw_axes: Dict[str, Tuple[float, float]],
+                               final_axes: Dict[str, Tuple[float, float]],
+                               question_scores: Dict[str, Dict[str, Any]],
+                               summaries: Optional[Dict[str, str]] = None,
+                               axis_stats: Optional[Dict[str, Any]] = None,
+                               positions: Optional[Dict[str, Tuple[float, float]]] = None,
+                               keyframe: bool = False):
+        """在一个pipeline中写回重算结果
+
+        原始坐标有变化时递增 axes:raw:version；传入axis_stats时，
+        将其作为新版本的轴分布缓存写入 axes:stats。
+        传入positions（重算后全体用户的最终坐标）时，分配新的重算代数并追加一条坐标历史：
+        关键帧记录全体用户，其余只记录final_axes中坐标有变化的用户；同时缓存全体平均坐标到 scores:average，
+        写入后在 scores:updates 频道发布本代的变化。
+        写入失败时异常直接抛出，由调用方（后台重算服务）把任务放回队列。
+        """
+        with self.redis_client.pipeline() as pipe:
+            while True:
+                try:
+                    if positions is not None:
+                        # 代数的分配与坐标历史、结果的写入在同一个事务中（监视 scores:generation），
+                        # 并发重算时代数按提交顺序递增，流记录ID总是大于上一条
+                        pipe.watch("scores:generation")
+                        generation = int(pipe.get("scores:generation") or 0) + 1
+                        keyframe = keyframe or (generation - 1) % HISTORY_KEYFRAME_INTERVAL == 0
+                        records = positions if keyframe else {user_id: positions[user_id] for user_id in final_axes}
+                        pipe.multi()
+                        pipe.set("scores:generation", generation)
+                        pipe.xadd(AXES_HISTORY_KEY, self._encode_positions(records, keyframe),
+                                  id=f"{generation}-0")
+                    for user_id, scores in user_scores.items():
+                        if scores:
+                            pipe.hset(f"user:scores:{user_id}", mapping=scores)
+                    for user_id, (raw_x, raw_y) in raw_axes.items():
+                        pipe.hset(f"user:axes:raw:{user_id}", mapping={"x": raw_x, "y": raw_y})
+                    for user_id, (final_x, final_y) in final_axes.items():
+                        pipe.hset(f"user:axes:final:{user_id}", mapping={"x": final_x, "y": final_y})
+                    for question_id, score_data in question_scores.items():
+                        pipe.hset(f"question:scores:{question_id}", mapping={
+                            "avg_score": score_data.get("avg_score", 0),
+                            "total_respondents": score_data.get("total_respondents", 0),
+                            "score_distribution": json.dumps(score_data.get("distribution", {}))
+                        })
+                    if summaries:
+                        pipe.hset("scoring:summaries", mapping=summaries)
+                    if positions is not None:
+                        average_x, average_y = self._average_position(positions.values())
+                        pipe.hset("scores:average",
+                                  mapping={"x": average_x, "y": average_y, "generation": generation})
+                    if raw_axes:
+                        pipe.incr("axes:raw:version")
+                    results = pipe.execute()
+                    break
+                except redis.WatchError:
+                    continue
+
+        if raw_axes and axis_stats:
+            self.save_axis_stats(results[-1], **axis_stats)
+        if positions is not None:
+            self.publish_scores_update(generation, final_axes, (average_x, average_y))
+
+    @staticmethod
+    def _encode_positions(records: Dict[str, Tuple[float, float]], keyframe: bool) -> Dict[str, Any]:
+        """将一代坐标编码为流记录：用户ID按行拼接，坐标为base64的小端float32 (x, y) 序列"""
+        coords = [value for position in records.values() for value in position]
+        return {
+            "keyframe": int(keyframe),
+            "users": "\n".join(records),
+            "xy": base64.b64encode(struct.pack(f"<{len(coords)}f", *coords)).decode("ascii"),
+        }
+
+    @staticmethod
+    def _decode_positions(fields: Dict[str, str]) -> Dict[str, Tuple[float, float]]:
+        """解析_encode_positions写入的流记录"""
+        user_ids = fields["users"].split("\n") if fields["users"] else []
+        coords = struct.unpack(f"<{2 * len(user_ids)}f", base64.b64decode(fields["xy"]))
+        return {
+            user_id: (round(coords[2 * i], 3), round(coords[2 * i + 1], 3))
+            for i, user_id in enumerate(user_ids)
+        }
+
+    def publish_scores_update(self, generation: int, final_axes: Dict[str, Tuple[float, float]],
+                              average: Tuple[float, float]):
+        """发布一代重算的变化：坐标有变化的用户及新的全体平均坐标"""
+        self.redis_client.publish(SCORES_UPDATES_CHANNEL, json.dumps({
+            "generation": generation,
+            "final_axes": {user_id: list(position) for user_id, position in final_axes.items()},
+            "average": list(average),
+        }))
+
+    @staticmethod
+    def _average_position(positions) -> Tuple[float, float]:
+        """一组 (x, y) 坐标的平均值（为空时为原点）"""
+        positions = list(positions)
+        if not positions:
+            return 0, 0
+        return (sum(x for x, _ in positions) / len(positions),
+                sum(y for _, y in positions) / len(positions))
+
+    def get_score_snapshot(self, user_id: str) -> Dict[str, Any]:
+        """只读地获取用户已保存的最终坐标与缓存的全体平均坐标（单次pipeline，不触发任何计算或写入）"""
+        pipe = self.redis_client.pipeline(transaction=False)
+        self._queue_score_snapshot(pipe, user_id)
+        snapshot = self._parse_score_snapshot(pipe.execute())
+        if snapshot["average"] is None:
+            # 尚无缓存的平均坐标（升级后首次重算之前），退回到按已保存的最终坐标计算
+            snapshot["average"] = self._average_position(
+                (axes["x"], axes["y"]) for axes in self.get_all_user_final_axes()
+            )
+        return snapshot
+
+    @staticmethod
+    def _queue_score_snapshot(pipe, user_id: str):
+        pipe.exists(f"user:answers:{user_id}")
+        pipe.hmget(f"user:axes:final:{user_id}", "x", "y")
+        pipe.hmget("scores:average", "x", "y", "generation")
+        pipe.get("scores:version")
+        pipe.get("recompute:requested_version")
+
+    @staticmethod
+    def _parse_score_snapshot(results: List[Any]) -> Dict[str, Any]:
+        """解析_queue_score_snapshot的结果
+
+        stale表示该用户尚无坐标，或仍有已提交但未完成的重算任务。
+        """
+        exists, (final_x, final_y), (average_x, average_y, generation), version, requested = results
+        final = None if final_x is None or final_y is None else (float(final_x), float(final_y))
+        average = None if average_x is None else (float(average_x), float(average_y))
+        return {
+            "exists": bool(exists),
+            "final": final,
+            "average": average,
+            "generation": int(generation or 0),
+            "stale": final is None or int(requested or 0) > int(version or 0),
+        }
+
+    def get_scores_generation(self) -> int:
+        """获取最近一次重算写入的代数（尚未重算过时为0）"""
+        return int(self.redis_client.get("scores:generation") or 0)
+
+    def get_axes_history_generations(self) -> List[int]:
+        """列出坐标历史中记录的所有代数"""
+        return [int(entry_id.split("-")[0])
+                for entry_id, _ in self.redis_client.xrange(AXES_HISTORY_KEY)]
+
+    def get_positions_at_generation(self, generation: int,
+                                    batch_size: int = 100) -> Dict[str, Tuple[float, float]]:
+        """还原第generation代重算结束时全体用户的最终坐标
+
+        从该代向前分批读取，直到最近的关键帧，再按时间顺序叠加增量记录。
+        """
+        entries = []
+        end = f"{generation}-0"
+        while True:
+            batch = self.redis_client.xrevrange(AXES_HISTORY_KEY, max=end, min="-", count=batch_size)
+            for entry_id, fields in batch:
+                entries.append(fields)
+                if fields.get("keyframe") == "1":
+                    break
+            else:
+                if len(batch) == batch_size:
+                    end = f"({batch[-1][0]}"
+                    continue
+            break
+
+        positions = {}
+        for fields in reversed(entries):
+            positions.update(self._decode_positions(fields))
+        return positions
+
+    def replay_axes_history(self, start: int = 1, end: Optional[int] = None,
+                            batch_size: int = 100) -> Iterator[Tuple[int, Dict[str, Tuple[float, float]]]]:
+        """按代回放坐标历史，依次产出 (代数, 该代结束时全体用户的最终坐标)
+
+        每代产出的是同一个被原地更新的字典，调用方需要保留时请自行复制。
+        """
+        positions = self.get_positions_at_generation(start - 1, batch_size) if start > 1 else {}
+        cursor = f"{start}-0"
+        last = f"{end}-0" if end is not None else "+"
+        while True:
+            batch = self.redis_client.xrange(AXES_HISTORY_KEY, min=cursor, max=last, count=batch_size)
+            for entry_id, fields in batch:
+                if fields.get("keyframe") == "1":
+                    positions.clear()
+                positions.update(self._decode_positions(fields))
+                yield int(entry_id.split("-")[0]), positions
+            if len(batch) < batch_size:
+                break
+            cursor = f"({batch[-1][0]}"
+
+    def get_scoring_summaries(self) -> Dict[str, str]:
+        """获取上次重算时记录的各题全体统计摘要"""
+        return self.redis_client.hgetall("scoring:summaries")
+
+    def get_all_user_results(self, user_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """批量获取用户已保存的得分、原始坐标和最终坐标"""
+        pipe = self.redis_client.pipeline(transaction=False)
+        for user_id in user_ids:
+            self._queue_user_results(pipe, user_id)
+        raw_results = pipe.execute()
+
+        return {
+            user_id: self._parse_user_results(*raw_results[3 * i:3 * i + 3])
+            for i, user_id in enumerate(user_ids)
+        }
+
+    @staticmethod
+    def _queue_user_results(pipe, user_id: str):
+        pipe.hgetall(f"user:scores:{user_id}")
+        pipe.hgetall(f"user:axes:raw:{user_id}")
+        pipe.hgetall(f"user:axes:final:{user_id}")
+
+    @staticmethod
+    def _parse_user_results(scores: Dict[str, str], raw: Dict[str, str], final: Dict[str, str]) -> Dict[str, Any]:
+        def axes(data):
             if "x" in data and "y" in data:
-                all_scores.append({"x": float(data["x"]), "y": float(data["y"])})
-        return all_scores
+                return float(data["x"]), float(data["y"])
+            return None
+
+        return {
+            "scores": {question_id: float(score) for question_id, score in scores.items()},
+            "raw": axes(raw),
+            "final": axes(final),
+        }
+
+    def iter_user_batches(self, batch_size: int = 500) -> Iterator[List[Tuple[str, float]]]:
+        """按首次答题时间分批遍历用户注册表，依次产出 [(用户ID, 加入时间)]
+
+        按下标分页：新用户的加入时间总是最晚，遍历期间登记的用户追加在末尾，不会打乱或重复已产出的批次。
+        """
+        start = 0
+        while True:
+            batch = self.redis_client.zrange(USERS_KEY, start, start + batch_size - 1, withscores=True)
+            if batch:
+                yield batch
+            if len(batch) < batch_size:
+                break
+            start += batch_size
+
+    def get_user_records(self, user_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """单次pipeline读取一批用户的答案、得分、原始坐标和最终坐标（供导出逐批读取）"""
+        pipe = self.redis_client.pipeline(transaction=False)
+        for user_id in user_ids:
+            pipe.hgetall(f"user:answers:{user_id}")
+            self._queue_user_results(pipe, user_id)
+        raw_results = pipe.execute()
+
+        records = {}
+        for i, user_id in enumerate(user_ids):
+            raw_answers, *results = raw_results[4 * i:4 * i + 4]
+            records[user_id] = {
+                "answers": {
+                    question_id: self._decode_answer(encoded, question_id)
+                    for question_id, encoded in raw_answers.items()
+                },
+                **self._parse_user_results(*results),
+            }
+        return records
+
+    def enqueue_recompute(self, user_id: str) -> int:
+        """提交后台重算任务，返回该任务对应的得分版本号"""
+        pipe = self.redis_client.pipeline()
+        pipe.rpush("recompute:jobs", user_id)
+        pipe.incr("recompute:requested_version")
+        _, version = pipe.execute()
+        return version
+
+    def wait_recompute_job(self, timeout: int = 5) -> Optional[str]:
+        """阻塞等待下一个重算任务，超时返回None"""
+        job = self.redis_client.blpop("recompute:jobs", timeout=timeout)
+        return job[1] if job else None
+
+    def drain_recompute_jobs(self) -> Tuple[List[str], int]:
+        """取出队列中积压的全部任务，并返回完成后可以标记的得分版本号"""
+        pipe = self.redis_client.pipeline()
+        pipe.lrange("recompute:jobs", 0, -1)
+        pipe.delete("recompute:jobs")
+        pipe.get("recompute:requested_version")
+        backlog, _, version = pipe.execute()
+        return backlog, int(version or 0)
+
+    def requeue_recompute_jobs(self, user_ids: List[str]):
+        """重算失败时把取出的任务放回队列，下次重算时重新处理"""
+        if user_ids:
+            self.redis_client.rpush("recompute:jobs", *user_ids)
+
+    def set_scores_version(self, version: int):
+        """标记得分已更新到指定版本"""
+        self.redis_client.set("scores:version", version)
+
+    def get_scores_version(self) -> int:
+        """获取当前得分所对应的版本号"""
+        return int(self.redis_client.get("scores:version") or 0)
 
     def get_question_respondent_count(self, question_id: str) -> int:
         """获取问题的回答者总数"""
@@ -211,26 +1070,28 @@ class RedisManager:
         self.redis_client.flushdb()
     
     def export_data(self) -> Dict[str, Any]:
-        """导出所有数据"""
+        """导出所有数据（一次性构建在内存中；数据量大时用 backend.data_export 流式导出）"""
         data = {
             "users": {},
             "questions": {},
             "timestamp": datetime.now().isoformat()
         }
         
-        # 导出用户数据
-        for user_id in self.get_all_users():
-            data["users"][user_id] = {
-                "answers": self.get_user_answers(user_id),
-                "scores": self.get_user_scores(user_id)
-            }
+        # 导出用户数据（逐批pipeline读取）
+        for batch in self.iter_user_batches():
+            records = self.get_user_records([user_id for user_id, _ in batch])
+            for user_id, record in records.items():
+                data["users"][user_id] = {"answers": record["answers"], "scores": record["scores"]}
         
-        # 导出问题统计
-        from config.questions import QUESTIONS
-        for question_id in QUESTIONS.keys():
+        # 导出问题统计，各题答案由已读取的用户答案整理，不再逐个回答者读取
+        for question_id, stats in self.get_all_question_stats(list(QUESTIONS)).items():
             data["questions"][question_id] = {
-                "stats": self.get_question_stats(question_id),
-                "answers": self.get_question_answers(question_id)
+                "stats": stats,
+                "answers": [
+                    {"user_id": user_id, **user["answers"][question_id]}
+                    for user_id, user in data["users"].items()
+                    if question_id in user["answers"]
+                ]
             }
         
-        return data 
\ No newline at end of file
+        return data
@@ -0,0 +1,299 @@
+"""
+Redis调用统计：按命令类型计数、记录每次调用的延迟分布，并把开销归到发起调用的评分引擎方法上
+
+RedisManager与AsyncRedisManager创建客户端后调用instrument_client/instrument_async_client，
+命令（含pipeline与事务中的命令）记录到进程内的REDIS_METRICS。由环境变量控制：
+    REDIS_INSTRUMENTATION   是否启用（默认false：每个命令都要回溯调用栈归因，只在分析时开启；
+                            scoring_benchmark 与管理工具的“Redis调用统计”会为自己的客户端单独启用）
+    REDIS_SLOW_CALL_MS      慢调用阈值（毫秒），超过时记录到慢调用日志并打印（默认0，不记录）
+"""
+import os
+import sys
+import threading
+import time
+from collections import Counter, deque
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+# 延迟直方图的桶上限（秒）
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+# 归因时识别的模块及其类名，按优先级排列：优先归到评分引擎的方法，其次是数据管理器的方法
+CALLER_MODULES = (
+    ("backend.scoring_engine", "ScoringEngine"),
+    ("backend.redis_manager", "RedisManager"),
+    ("backend.async_redis_manager", "AsyncRedisManager"),
+)
+
+
+def instrumentation_enabled() -> bool:
+    return os.getenv("REDIS_INSTRUMENTATION", "false").lower() == "true"
+
+
+def is_instrumented(client) -> bool:
+    """客户端是否已安装统计"""
+    return getattr(client, "_redis_metrics", None) is not None
+
+
+class RedisMetrics:
+    def __init__(self, slow_call_ms: Optional[float] = None, slow_log_size: int = 100):
+        if slow_call_ms is None:
+            slow_call_ms = float(os.getenv("REDIS_SLOW_CALL_MS", 0))
+        self.slow_call_ms = slow_call_ms
+        self._lock = threading.Lock()
+        self._slow_log_size = slow_log_size
+        self.reset()
+
+    def reset(self):
+        """清空所有统计"""
+        with self._lock:
+            # (调用方, 命令) -> 次数
+            self.commands: Counter = Counter()
+            # 调用方 -> 网络往返次数 / 累计耗时（秒）
+            self.round_trips: Counter = Counter()
+            self.seconds: Counter = Counter()
+            # 命令（pipeline记为PIPELINE，事务记为MULTI） -> [各桶计数..., 总次数], 累计耗时
+            self.latency_buckets: Dict[str, List[int]] = {}
+            self.latency_sum: Counter = Counter()
+            self.slow_calls = deque(maxlen=self._slow_log_size)
+            self.slow_calls_total = 0
+
+    def record(self, caller: str, kind: str, commands: List[str], seconds: float):
+        """记录一次网络往返：kind为单条命令名或PIPELINE/MULTI，commands为其中的命令名"""
+        with self._lock:
+            for command in commands:
+                self.commands[(caller, command)] += 1
+            self.round_trips[caller] += 1
+            self.seconds[caller] += seconds
+
+            buckets = self.latency_buckets.setdefault(kind, [0] * (len(LATENCY_BUCKETS) + 1))
+            for i, bound in enumerate(LATENCY_BUCKETS):
+                if seconds <= bound:
+                    buckets[i] += 1
+            buckets[-1] += 1
+            self.latency_sum[kind] += seconds
+
+            slow = self.slow_call_ms > 0 and seconds * 1000 >= self.slow_call_ms
+            if slow:
+                self.slow_calls_total += 1
+                self.slow_calls.append({
+                    "time": datetime.now().isoformat(timespec="milliseconds"),
+                    "caller": caller,
+                    "kind": kind,
+                    "commands": len(commands),
+                    "ms": round(seconds * 1000, 2),
+                })
+        if slow:
+            print(f"Slow Redis call: {caller} {kind} ({len(commands)} commands) {seconds * 1000:.1f}ms")
+
+    def by_caller(self) -> List[Dict[str, Any]]:
+        """按调用方汇总（耗时从高到低）：累计耗时、往返次数与各命令次数"""
+        with self._lock:
+            per_caller: Dict[str, Counter] = {}
+            for (caller, command), count in self.commands.items():
+                per_caller.setdefault(caller, Counter())[command] = count
+            return [
+                {
+                    "caller": caller,
+                    "seconds": round(seconds, 4),
+                    "round_trips": self.round_trips[caller],
+                    "commands": dict(per_caller.get(caller, Counter()).most_common()),
+                }
+                for caller, seconds in self.seconds.most_common()
+            ]
+
+    def format_summary(self, limit: int = 20) -> List[str]:
+        """可读的汇总行，如 "ScoringEngine._real_time_rank_score: 12400 HGET, 1.8s" """
+        lines = []
+        for row in self.by_caller()[:limit]:
+            commands = ", ".join(f"{count} {command}" for command, count in row["commands"].items())
+            lines.append(f"{row['caller']}: {commands}, {row['seconds']:.3f}s ({row['round_trips']} round trips)")
+        return lines
+
+    def latency_histograms(self) -> Dict[str, Dict[str, Any]]:
+        """各命令的延迟分布（累积计数，与Prometheus直方图相同）"""
+        with self._lock:
+            return {
+                kind: {
+                    "buckets": dict(zip([str(bound) for bound in LATENCY_BUCKETS] + ["+Inf"], buckets)),
+                    "count": buckets[-1],
+                    "sum": round(self.latency_sum[kind], 6),
+                }
+                for kind, buckets in sorted(self.latency_buckets.items())
+            }
+
+    def prometheus(self) -> str:
+        """Prometheus文本格式的指标"""
+        lines = [
+            "# HELP redis_commands_total Redis commands issued, by calling method and command.",
+            "# TYPE redis_commands_total counter",
+        ]
+        with self._lock:
+            for (caller, command), count in sorted(self.commands.items()):
+                lines.append(f'redis_commands_total{{caller="{caller}",command="{command}"}} {count}')
+
+            lines += [
+                "# HELP redis_round_trips_total Redis round trips (single commands, pipelines and transactions).",
+                "# TYPE redis_round_trips_total counter",
+            ]
+            for caller, count in sorted(self.round_trips.items()):
+                lines.append(f'redis_round_trips_total{{caller="{caller}"}} {count}')
+
+            lines += [
+                "# HELP redis_call_seconds_total Time spent waiting on Redis, by calling method.",
+                "# TYPE redis_call_seconds_total counter",
+            ]
+            for caller, seconds in sorted(self.seconds.items()):
+                lines.append(f'redis_call_seconds_total{{caller="{caller}"}} {seconds:.6f}')
+
+            lines += [
+                "# HELP redis_call_duration_seconds Latency of each Redis round trip, by command.",
+                "# TYPE redis_call_duration_seconds histogram",
+            ]
+            for kind, buckets in sorted(self.latency_buckets.items()):
+                for bound, count in zip(LATENCY_BUCKETS, buckets):
+                    lines.append(f'redis_call_duration_seconds_bucket{{command="{kind}",le="{bound}"}} {count}')
+                lines.append(f'redis_call_duration_seconds_bucket{{command="{kind}",le="+Inf"}} {buckets[-1]}')
+                lines.append(f'redis_call_duration_seconds_sum{{command="{kind}"}} {self.latency_sum[kind]:.6f}')
+                lines.append(f'redis_call_duration_seconds_count{{command="{kind}"}} {buckets[-1]}')
+
+            lines += [
+                "# HELP redis_slow_calls_total Redis round trips slower than REDIS_SLOW_CALL_MS.",
+                "# TYPE redis_slow_calls_total counter",
+                f"redis_slow_calls_total {self.slow_calls_total}",
+            ]
+        return "\n".join(lines) + "\n"
+
+
+# 进程内共享的统计（同步与异步客户端都记录到这里）
+REDIS_METRICS = RedisMetrics()
+
+
+def calling_method(depth_limit: int = 40) -> str:
+    """沿调用栈找到发起Redis调用的方法：优先评分引擎，其次数据管理器，否则为other"""
+    frame = sys._getframe(2)
+    found: Dict[str, str] = {}
+    for _ in range(depth_limit):
+        if frame is None:
+            break
+        module = frame.f_globals.get("__name__")
+        for priority, (caller_module, class_name) in enumerate(CALLER_MODULES):
+            if module == caller_module and caller_module not in found:
+                found[caller_module] = f"{class_name}.{frame.f_code.co_name}"
+                if priority == 0:
+                    return found[caller_module]
+        frame = frame.f_back
+    for caller_module, _ in CALLER_MODULES:
+        if caller_module in found:
+            return found[caller_module]
+    return "other"
+
+
+def _command_names(command_stack) -> List[str]:
+    """pipeline中排队的命令名（排队项为 (args, options)）"""
+    return [str(args[0]).upper() for args, _ in command_stack]
+
+
+def instrument_client(client, metrics: RedisMetrics = REDIS_METRICS):
+    """为同步客户端（redis.Redis）的直接命令与其创建的pipeline安装统计（重复调用无效）"""
+    if is_instrumented(client):
+        return client
+    client._redis_metrics = metrics
+    execute_command = client.execute_command
+    create_pipeline = client.pipeline
+
+    def instrumented_execute_command(*args, **options):
+        caller = calling_method()
+        started = time.perf_counter()
+        try:
+            return execute_command(*args, **options)
+        finally:
+            command = str(args[0]).upper()
+            metrics.record(caller, command, [command], time.perf_counter() - started)
+
+    def instrumented_pipeline(*args, **kwargs):
+        pipe = create_pipeline(*args, **kwargs)
+        pipeline_execute = pipe.execute
+        immediate_execute_command = pipe.immediate_execute_command
+
+        def execute(*execute_args, **execute_kwargs):
+            commands = _command_names(pipe.command_stack)
+            if not commands:
+                return pipeline_execute(*execute_args, **execute_kwargs)
+            caller = calling_method()
+            started = time.perf_counter()
+            try:
+                return pipeline_execute(*execute_args, **execute_kwargs)
+            finally:
+                metrics.record(caller, "MULTI" if pipe.transaction else "PIPELINE", commands,
+                               time.perf_counter() - started)
+
+        def immediate(*command_args, **options):
+            # WATCH之后、MULTI之前的命令立即执行
+            caller = calling_method()
+            started = time.perf_counter()
+            try:
+                return immediate_execute_command(*command_args, **options)
+            finally:
+                command = str(command_args[0]).upper()
+                metrics.record(caller, command, [command], time.perf_counter() - started)
+
+        pipe.execute = execute
+        pipe.immediate_execute_command = immediate
+        return pipe
+
+    client.execute_command = instrumented_execute_command
+    client.pipeline = instrumented_pipeline
+    return client
+
+
+def instrument_async_client(client, metrics: RedisMetrics = REDIS_METRICS):
+    """为异步客户端（redis.asyncio.Redis）的直接命令与其创建的pipeline安装统计（重复调用无效）"""
+    if is_instrumented(client):
+        return client
+    client._redis_metrics = metrics
+    execute_command = client.execute_command
+    create_pipeline = client.pipeline
+
+    async def instrumented_execute_command(*args, **options):
+        caller = calling_method()
+        started = time.perf_counter()
+        try:
+            return await execute_command(*args, **options)
+        finally:
+            command = str(args[0]).upper()
+            metrics.record(caller, command, [command], time.perf_counter() - started)
+
+    def instrumented_pipeline(*args, **kwargs):
+        pipe = create_pipeline(*args, **kwargs)
+        pipeline_execute = pipe.execute
+        immediate_execute_command = pipe.immediate_execute_command
+
+        async def execute(*execute_args, **execute_kwargs):
+            commands = _command_names(pipe.command_stack)
+            if not commands:
+                return await pipeline_execute(*execute_args, **execute_kwargs)
+            caller = calling_method()
+            started = time.perf_counter()
+            try:
+                return await pipeline_execute(*execute_args, **execute_kwargs)
+            finally:
+                metrics.record(caller, "MULTI" if pipe.is_transaction else "PIPELINE", commands,
+                               time.perf_counter() - started)
+
+        async def immediate(*command_args, **options):
+            caller = calling_method()
+            started = time.perf_counter()
+            try:
+                return await immediate_execute_command(*command_args, **options)
+            finally:
+                command = str(command_args[0]).upper()
+                metrics.record(caller, command, [command], time.perf_counter() - started)
+
+        pipe.execute = execute
+        pipe.immediate_execute_command = immediate
+        return pipe
+
+    client.execute_command = instrumented_execute_command
+    client.pipeline = instrumented_pipeline
+    return client
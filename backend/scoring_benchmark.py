@@ -0,0 +1,338 @@
+"""
+评分压测：生成一批模拟观众，测量各评分环节在不同人数下的耗时、Redis命令数与内存峰值
+
+默认使用进程内存储（backend.memory_store.MemoryRedis，可模拟每次往返的网络延迟），
+也可以使用fakeredis（需 pip install fakeredis）或连接本地Redis的一个空库：
+    python -m backend.scoring_benchmark --sizes 50,500,5000 --output bench.json
+    python -m backend.scoring_benchmark --latency-ms 0.5 --output bench.json   # 模拟0.5ms的往返延迟
+    python -m backend.scoring_benchmark --backend redis --redis-db 15 --output bench.json
+    python -m backend.scoring_benchmark --compare bench.json      # 与之前保存的结果对比
+    python -m backend.scoring_benchmark --sizes 5000 --encodings   # 比较答案的旧JSON与紧凑编码
+
+逐个用户的环节（calculate_user_scores等）随人数增长而变慢，只对前 --sample 个用户测量，
+报告单次调用的平均值；save_user_answers与recalculate_all_scores覆盖全部用户。
+内存默认报告进程的常驻内存峰值（进程内存储的数据也计算在内）；--tracemalloc 额外报告每个环节
+Python分配的峰值，但会使耗时明显变长。
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+from collections import Counter
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+# Add project root to path to allow running this file directly
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backend.memory_store import MemoryRedis
+from backend.population_snapshot import PopulationSnapshot
+from backend.redis_manager import RedisManager, combination_mask
+from backend.redis_metrics import REDIS_METRICS, instrument_client
+from backend.scoring_engine import ScoringEngine
+from config.questions import QUESTIONS, QuestionType
+
+DEFAULT_SIZES = [50, 500, 5000]
+
+# 文本题的候选答案（按大致热度排列）
+TEXT_CHOICES = {
+    "e": ["解放碑", "朝天门", "观音桥", "沙坪坝", "南坪", "杨家坪", "大渡口", "江北嘴"],
+    "p": ["INFP", "ENFP", "INFJ", "ISFJ", "INTJ", "ENTP", "ISTJ", "ESFJ",
+          "INTP", "ENFJ", "ISFP", "ESTJ", "ISTP", "ESFP", "ENTJ", "ESTP"],
+}
+
+
+def generate_audience(n: int, seed: int = 0) -> Dict[str, Dict[str, Any]]:
+    """生成n个模拟观众对所有题目的答案，分布大致贴近现场观众
+
+    选择题各选项的占比按题目随机偏斜；数值题按输入类型取值（身高近似正态、消费金额长尾、
+    次数类多为0或较小的整数）；组合题每种调料有各自的受欢迎程度。
+    """
+    rng = np.random.default_rng(seed)
+    columns = {}
+    for question_id, question in QUESTIONS.items():
+        columns[question_id] = _generate_column(rng, question_id, question, n)
+    return {
+        f"bench{i:05d}": {question_id: column[i] for question_id, column in columns.items()}
+        for i in range(n)
+    }
+
+
+def _generate_column(rng: np.random.Generator, question_id: str, question: Dict[str, Any], n: int) -> List[Any]:
+    question_type = question["type"]
+
+    if question_type == QuestionType.SINGLE_CHOICE.value:
+        options = question["options"]
+        weights = rng.dirichlet(np.full(len(options), 2.0))
+        return [options[i] for i in rng.choice(len(options), size=n, p=weights)]
+
+    if question_type == QuestionType.COMBINATION.value:
+        options = question["options"]
+        popularity = rng.beta(0.8, 1.6, size=len(options))
+        picks = rng.random((n, len(options))) < popularity
+        # 至少选一种调料
+        picks[np.arange(n), rng.integers(len(options), size=n)] |= ~picks.any(axis=1)
+        return [[option for option, picked in zip(options, row) if picked] for row in picks]
+
+    if question_type == QuestionType.TEXT.value:
+        choices = TEXT_CHOICES.get(question_id)
+        if choices is None:
+            return [f"观众{i}" for i in range(n)]
+        weights = 1 / np.arange(1, len(choices) + 1)
+        return [choices[i] for i in rng.choice(len(choices), size=n, p=weights / weights.sum())]
+
+    input_type = question.get("input_type")
+    if "mapping" in question:
+        keys = sorted(question["mapping"])
+        return rng.integers(keys[0], keys[-1] + 1, size=n).tolist()
+    if input_type == "height_cm":
+        return np.round(np.clip(rng.normal(166, 8, size=n), 140, 200), 1).tolist()
+    if input_type == "months":
+        local = rng.random(n) < 0.6
+        return np.where(local, rng.integers(120, 480, size=n), rng.integers(0, 36, size=n)).tolist()
+    if input_type == "years":
+        return np.where(rng.random(n) < 0.3, 0.0, np.round(rng.uniform(0, 30, size=n) * 2) / 2).tolist()
+    if input_type == "money":
+        return np.where(rng.random(n) < 0.2, 0.0, np.round(rng.lognormal(4, 1, size=n))).tolist()
+    if input_type in ("positive_integer", "count"):
+        zeros = rng.random(n) < (0.5 if question_id == "l" else 0.2)
+        return np.where(zeros, 0, rng.poisson(2, size=n)).tolist()
+    # 切蛋糕得分等没有输入类型的数值题
+    return rng.integers(0, 101, size=n).tolist()
+
+
+def max_rss_mb() -> Optional[float]:
+    """进程至今的常驻内存峰值（MB）"""
+    if resource is None:
+        return None
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux以KB为单位，macOS以字节为单位
+    return round(max_rss / (2 ** 20 if sys.platform == "darwin" else 2 ** 10), 1)
+
+
+def measure(calls: int, action: Callable[[], Any], track_memory: bool = False) -> Dict[str, Any]:
+    """执行action并返回耗时、命令数、往返次数（取自REDIS_METRICS，并按调用方法归因）与内存峰值"""
+    REDIS_METRICS.reset()
+    if track_memory:
+        tracemalloc.start()
+    started = time.perf_counter()
+    action()
+    elapsed = time.perf_counter() - started
+    peak = None
+    if track_memory:
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    by_caller = REDIS_METRICS.by_caller()
+    by_command = Counter()
+    for row in by_caller:
+        by_command.update(row["commands"])
+    total_commands = sum(by_command.values())
+    return {
+        "calls": calls,
+        "wall_s": round(elapsed, 4),
+        "per_call_ms": round(elapsed * 1000 / calls, 3) if calls else None,
+        "commands": total_commands,
+        "commands_per_call": round(total_commands / calls, 1) if calls else None,
+        "round_trips": sum(row["round_trips"] for row in by_caller),
+        "by_command": dict(by_command.most_common()),
+        "by_caller": REDIS_METRICS.format_summary(limit=10),
+        "max_rss_mb": max_rss_mb(),
+        "peak_traced_mb": round(peak / 2 ** 20, 2) if peak is not None else None,
+    }
+
+
+def run_size(redis_manager: RedisManager, n: int, seed: int, sample: int,
+             track_memory: bool = False) -> Dict[str, Any]:
+    """在空库中写入n个模拟观众并依次测量各环节"""
+    audience = generate_audience(n, seed)
+    user_ids = list(audience)
+    sampled = user_ids[:sample]
+    engine = ScoringEngine(redis_manager)
+    instrument_client(redis_manager.redis_client)
+
+    def save_all():
+        for user_id, answers in audience.items():
+            redis_manager.save_user_answers(user_id, answers)
+
+    def score_with_snapshot():
+        snapshot = PopulationSnapshot.load(redis_manager)
+        for user_id in sampled:
+            engine.calculate_user_scores(user_id, snapshot=snapshot)
+
+    phases = {}
+    phases["save_user_answers"] = measure(n, save_all, track_memory)
+    phases["recalculate_all_scores"] = measure(1, engine.recalculate_all_scores, track_memory)
+    phases["calculate_user_scores"] = measure(
+        len(sampled), lambda: [engine.calculate_user_scores(u) for u in sampled], track_memory
+    )
+    phases["calculate_user_scores_snapshot"] = measure(len(sampled), score_with_snapshot, track_memory)
+    phases["calculate_axes_scores"] = measure(
+        len(sampled), lambda: [engine.calculate_axes_scores(u) for u in sampled], track_memory
+    )
+    # 轴分布按原始坐标版本缓存，首次调用时计算
+    engine._axis_stats_cache = None
+    phases["get_final_axes_scores"] = measure(
+        len(sampled), lambda: [engine.get_final_axes_scores(u) for u in sampled], track_memory
+    )
+    phases["get_all_final_axes_scores"] = measure(n, engine.get_all_final_axes_scores, track_memory)
+    return {"users": n, "sampled_users": len(sampled), "phases": phases}
+
+
+def legacy_answer_json(question_id: str, answer: Any, timestamp: str) -> str:
+    """旧的答案存储格式：每个字段一个JSON（组合题为位掩码）"""
+    if isinstance(answer, list):
+        answer = combination_mask(question_id, answer)
+    return json.dumps({"answer": answer, "timestamp": timestamp})
+
+
+def measure_answer_encodings(redis_manager: RedisManager, n: int, seed: int, sample: int) -> Dict[str, Any]:
+    """分别以旧JSON格式与紧凑编码存储同一批答案，比较存储大小与各读取路径的耗时"""
+    audience = generate_audience(n, seed)
+    user_ids = list(audience)
+    instrument_client(redis_manager.redis_client)
+    for user_id, answers in audience.items():
+        redis_manager.save_user_answers(user_id, answers)
+
+    timestamp = datetime.now().isoformat()
+    layouts = {
+        "legacy_json": {
+            user_id: {question_id: legacy_answer_json(question_id, answer, timestamp)
+                      for question_id, answer in answers.items()}
+            for user_id, answers in audience.items()
+        },
+        "compact": redis_manager.get_encoded_answers(user_ids),
+    }
+
+    results = {}
+    for name, layout in layouts.items():
+        pipe = redis_manager.redis_client.pipeline(transaction=False)
+        for user_id, fields in layout.items():
+            pipe.hset(f"user:answers:{user_id}", mapping=fields)
+        pipe.execute()
+
+        values = [value for fields in layout.values() for value in fields.values()]
+        total_bytes = sum(len(value.encode("utf-8")) for value in values)
+        results[name] = {
+            "answers": len(values),
+            "bytes_per_answer": round(total_bytes / len(values), 1),
+            "total_mb": round(total_bytes / 2 ** 20, 2),
+            "get_all_user_answers": measure(1, lambda: redis_manager.get_all_user_answers(user_ids)),
+            "snapshot_load": measure(1, lambda: PopulationSnapshot.load(redis_manager)),
+            "get_user_answers": measure(
+                len(user_ids[:sample]), lambda: [redis_manager.get_user_answers(u) for u in user_ids[:sample]]
+            ),
+        }
+    return results
+
+
+def fake_redis_manager() -> RedisManager:
+    """使用进程内fakeredis的RedisManager"""
+    try:
+        import fakeredis
+    except ImportError:
+        sys.exit("fakeredis is not installed (pip install fakeredis), or use --backend memory")
+    return RedisManager(client=fakeredis.FakeRedis(decode_responses=True))
+
+
+def compare_reports(previous: Dict[str, Any], current: Dict[str, Any]) -> List[str]:
+    """逐项比较两次结果的耗时与命令数，返回可读的对比行"""
+    lines = []
+    for size, result in current["results"].items():
+        old_result = previous.get("results", {}).get(size)
+        if old_result is None:
+            continue
+        for phase, stats in result["phases"].items():
+            old = old_result["phases"].get(phase)
+            if old is None or not old["wall_s"]:
+                continue
+            lines.append(
+                f"N={size:>5} {phase:<32} time x{stats['wall_s'] / old['wall_s']:.2f} "
+                f"({old['wall_s']}s -> {stats['wall_s']}s), commands {old['commands']} -> {stats['commands']}"
+            )
+    return lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the scoring pipeline on a synthetic audience")
+    parser.add_argument("--sizes", default=",".join(map(str, DEFAULT_SIZES)), help="comma separated audience sizes")
+    parser.add_argument("--sample", type=int, default=50, help="users measured in the per-user phases")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--backend", choices=["memory", "fake", "redis"], default="memory")
+    parser.add_argument("--latency-ms", type=float, default=0.0,
+                        help="simulated round-trip latency of the memory backend")
+    parser.add_argument("--command-latency-ms", type=float, default=0.0,
+                        help="simulated per-command execution time of the memory backend")
+    parser.add_argument("--redis-db", type=int, default=None, help="database of the local Redis (must be empty)")
+    parser.add_argument("--flush", action="store_true", help="flush the local Redis database before running")
+    parser.add_argument("--tracemalloc", action="store_true",
+                        help="also report per-phase Python allocation peaks (inflates wall time)")
+    parser.add_argument("--encodings", action="store_true",
+                        help="compare the legacy JSON and compact answer encodings instead of the scoring phases")
+    parser.add_argument("--output", help="write the JSON report to this file")
+    parser.add_argument("--compare", help="previous JSON report to compare against")
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in args.sizes.split(",") if size]
+    report = {
+        "meta": {
+            "backend": args.backend,
+            "latency_ms": args.latency_ms if args.backend == "memory" else None,
+            "command_latency_ms": args.command_latency_ms if args.backend == "memory" else None,
+            "seed": args.seed,
+            "sample": args.sample,
+            "tracemalloc": args.tracemalloc,
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "timestamp": datetime.now().isoformat(),
+        },
+        "results": {},
+    }
+
+    for n in sizes:
+        if args.backend == "memory":
+            redis_manager = RedisManager(client=MemoryRedis(args.latency_ms, args.command_latency_ms))
+        elif args.backend == "fake":
+            redis_manager = fake_redis_manager()
+        else:
+            redis_manager = RedisManager(db=args.redis_db)
+            if redis_manager.redis_client.dbsize() and not args.flush:
+                sys.exit("the Redis database is not empty; choose an empty --redis-db or pass --flush")
+            redis_manager.clear_all_data()
+
+        print(f"Running N={n} ...", file=sys.stderr)
+        if args.encodings:
+            report.setdefault("encodings", {})[str(n)] = measure_answer_encodings(
+                redis_manager, n, args.seed, args.sample
+            )
+        else:
+            report["results"][str(n)] = run_size(redis_manager, n, args.seed, args.sample, args.tracemalloc)
+        if args.backend == "redis":
+            redis_manager.clear_all_data()
+        redis_manager.close()
+
+    encoded = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(encoded)
+    else:
+        print(encoded)
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            previous = json.load(f)
+        for line in compare_reports(previous, report):
+            print(line, file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,20 +1,104 @@
 """
 评分引擎
 """
+import hashlib
+import json
+import time
 import numpy as np
-from typing import Dict, Any, List, Tuple
+from typing import Dict, Any, List, Optional, Tuple
 from collections import Counter
+from contextlib import contextmanager, nullcontext
 from config.questions import QUESTIONS, ScoringRule
+from backend.population_snapshot import PopulationSnapshot, popcount
+from backend.redis_manager import combination_mask
+
+SCORED_QUESTIONS = [question_id for question_id, question in QUESTIONS.items() if question.get("rule")]
+
+# 坐标轴的组成题目
+X_AXIS_KEYS = ["a1", "a2", "b1", "c1", "c2", "c3", "e"]
+SUYANG_KEYS = ["f", "g", "j", "k", "l", "m", "n", "o1", "o2", "o3", "o4", "o5"]
+
+# 增量重算时记录的非题目摘要
+AXIS_WEIGHTS_SUMMARY = "weights:d"
+AXIS_STATS_SUMMARY = "axes"
+
+# 未注册钩子时使用的空上下文（避免每次评分都创建计时上下文）
+_NO_HOOKS = nullcontext()
 
 class ScoringEngine:
+    # 评分规则 -> 评分方法名，方法签名均为 (question_id, answer, config)
+    RULE_SCORERS = {
+        ScoringRule.STATIC_WEIGHT.value: "_static_weight_score",
+        ScoringRule.REAL_TIME_RANK.value: "_real_time_rank_score",
+        ScoringRule.DISTANCE_SCORE.value: "_distance_score",
+        ScoringRule.MAJORITY_VOTE.value: "_majority_vote_score",
+        ScoringRule.COUNT_RANK.value: "_count_rank_score",
+        ScoringRule.DYNAMIC_YN.value: "_dynamic_yn_score",
+        ScoringRule.VOTE_RANK_STATIC.value: "_vote_rank_static_score",
+        ScoringRule.STATIC_MAPPING.value: "_static_mapping_score",
+        ScoringRule.CONDITIONAL_RANK.value: "_conditional_rank_score",
+        ScoringRule.CONSENSUS_DISTANCE.value: "_consensus_distance_score",
+    }
+
     def __init__(self, redis_manager):
         self.redis_manager = redis_manager
-        
-    def calculate_user_scores(self, user_id: str) -> Dict[str, float]:
-        """计算用户所有题目的得分"""
+        self._rule_scorers = {rule: getattr(self, name) for rule, name in self.RULE_SCORERS.items()}
+        # 已注册的钩子（见backend.scoring_profiler.ScoringHook）
+        self.hooks: List[Any] = []
+        # 进程内缓存的轴分布：(原始坐标版本号, {"x": ..., "y": ...})
+        self._axis_stats_cache = None
+        # 最近一次用于单用户评分的快照及其全体摘要：(PopulationSnapshot, summaries)
+        self._snapshot_summaries = None
+
+    def add_hook(self, hook):
+        """注册钩子：在每条规则、每个用户、重算的每个阶段前后调用
+
+        钩子提供 before_rule(question_id, rule, users) / after_rule(question_id, rule, users, seconds)、
+        before_user(user_id) / after_user(user_id, seconds)、before_phase(phase) / after_phase(phase, seconds)。
+        """
+        if hook not in self.hooks:
+            self.hooks.append(hook)
+
+    def remove_hook(self, hook):
+        if hook in self.hooks:
+            self.hooks.remove(hook)
+
+    def _observe(self, event: str, *args):
+        """在代码块前后通知钩子（before_<event> / after_<event>，后者额外传入耗时）"""
+        if not self.hooks:
+            return _NO_HOOKS
+        return self._notify_around(event, args)
+
+    @contextmanager
+    def _notify_around(self, event: str, args: Tuple):
+        hooks = list(self.hooks)
+        for hook in hooks:
+            getattr(hook, f"before_{event}")(*args)
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            for hook in hooks:
+                getattr(hook, f"after_{event}")(*args, elapsed)
+
+    def calculate_user_scores(self, user_id: str, snapshot: Optional[PopulationSnapshot] = None) -> Dict[str, float]:
+        """计算用户所有题目的得分
+
+        传入PopulationSnapshot时，所有规则都基于快照中的全体答案评分，不再逐题访问Redis。
+        """
+        with self._observe("user", user_id):
+            return self._user_scores(user_id, snapshot)
+
+    def _user_scores(self, user_id: str, snapshot: Optional[PopulationSnapshot]) -> Dict[str, float]:
+        if snapshot is not None:
+            scores = self._snapshot_user_scores(user_id, snapshot)
+            self.redis_manager.save_user_score(user_id, scores)
+            return scores
+
         user_answers = self.redis_manager.get_user_answers(user_id)
         scores = {}
-        
+
         for question_id, answer_data in user_answers.items():
             answer = answer_data["answer"]
             question_config = QUESTIONS.get(question_id)
@@ -22,54 +106,57 @@ class ScoringEngine:
             if not question_config or "rule" not in question_config:
                 continue
                 
-            score = self._calculate_question_score(
-                question_id, 
-                answer, 
-                question_config,
-                user_id
-            )
+            with self._observe("rule", question_id, question_config["rule"], 1):
+                score = self._calculate_question_score(
+                    question_id, 
+                    answer, 
+                    question_config,
+                    user_id
+                )
             scores[question_id] = score
             
         # 保存得分
         self.redis_manager.save_user_score(user_id, scores)
-        
+
         return scores
-    
+
+    def _snapshot_user_scores(self, user_id: str, snapshot: PopulationSnapshot) -> Dict[str, float]:
+        """基于快照计算单个用户的题目得分（同一快照的全体摘要只计算一次）"""
+        if self._snapshot_summaries is None or self._snapshot_summaries[0] is not snapshot:
+            self._snapshot_summaries = (snapshot, self._population_summaries(snapshot))
+        summaries = self._snapshot_summaries[1]
+
+        index = np.array([snapshot.user_index[user_id]])
+        scores = {}
+        for question_id in SCORED_QUESTIONS:
+            if question_id in snapshot.present and snapshot.present[question_id][index[0]]:
+                with self._observe("rule", question_id, QUESTIONS[question_id]["rule"], 1):
+                    scores[question_id] = float(self._score_answers(
+                        question_id, snapshot, index, QUESTIONS[question_id], summaries[question_id]
+                    )[0])
+        return scores
+
     def _calculate_question_score(self, question_id: str, answer: Any, 
                                  question_config: Dict[str, Any], user_id: str) -> float:
         """根据评分规则计算单题得分"""
-        rule = question_config["rule"]
-        
-        if rule == ScoringRule.STATIC_WEIGHT.value:
-            return self._static_weight_score(answer, question_config)
-            
-        elif rule == ScoringRule.REAL_TIME_RANK.value:
-            return self._real_time_rank_score(question_id, answer, question_config)
-            
-        elif rule == ScoringRule.DISTANCE_SCORE.value:
-            return self._distance_score(question_id, answer, question_config)
-            
-        elif rule == ScoringRule.MAJORITY_VOTE.value:
-            return self._majority_vote_score(question_id, answer, question_config)
-            
-        elif rule == ScoringRule.COUNT_RANK.value:
-            return self._count_rank_score(question_id, answer, question_config)
-            
-        elif rule == ScoringRule.DYNAMIC_YN.value:
-            return self._dynamic_yn_score(question_id, answer, question_config)
-            
-        elif rule == ScoringRule.VOTE_RANK_STATIC.value:
-            return self._vote_rank_static_score(question_id, answer, question_config)
-            
-        elif rule == ScoringRule.STATIC_MAPPING.value:
-            return self._static_mapping_score(answer, question_config)
-
-        elif rule == ScoringRule.CONDITIONAL_RANK.value:
-            return self._conditional_rank_score(question_id, answer, question_config)
-
-        return 0
+        scorer = self._rule_scorers.get(question_config["rule"])
+        if scorer is None:
+            return 0
+        return scorer(question_id, answer, question_config)
     
-    def _static_weight_score(self, answer: str, config: Dict[str, Any]) -> float:
+    @staticmethod
+    def _rank_position(values: List[float], value: float) -> Dict[str, Any]:
+        """某数值在全体答案中的位置：总数、大于/小于/等于该值的答案数及最小/最大值"""
+        return {
+            "total": len(values),
+            "greater": sum(1 for other in values if other > value),
+            "less": sum(1 for other in values if other < value),
+            "equal": sum(1 for other in values if other == value),
+            "min": min(values) if values else None,
+            "max": max(values) if values else None,
+        }
+
+    def _static_weight_score(self, question_id: str, answer: str, config: Dict[str, Any]) -> float:
         """静态权重评分"""
         weights = config.get("weights", {})
         return weights.get(answer, 0)
@@ -82,32 +169,25 @@ class ScoringEngine:
         except (ValueError, TypeError):
             return 0.0
 
-        all_answers = self.redis_manager.get_question_answers(question_id)
-        
-        values = []
-        for a in all_answers:
-            try:
-                values.append(float(a["answer"]))
-            except (ValueError, TypeError):
-                continue
+        values = self.redis_manager.get_numeric_answers(question_id)
+        position = self._rank_position(values, user_answer_float)
 
-        if not values:
+        if position["total"] == 0:
             return config["range"][1]  # 第一个回答者得满分
             
-        # 排序并计算排名
-        values.sort(reverse=True)
-        rank = values.index(user_answer_float) + 1 if user_answer_float in values else len(values) + 1
+        # 降序排名：第一次出现的位置 = 严格大于该值的答案数 + 1
+        rank = position["greater"] + 1 if position["equal"] > 0 else position["total"] + 1
         
         # 线性映射到指定范围
         min_score, max_score = config["range"]
-        if len(values) == 1:
+        if position["total"] == 1:
             return max_score
         
         # Avoid division by zero if all valid answers are the same
-        if len(set(values)) == 1:
+        if position["min"] == position["max"]:
             return max_score
 
-        score = max_score - (rank - 1) * (max_score - min_score) / (len(values) - 1)
+        score = max_score - (rank - 1) * (max_score - min_score) / (position["total"] - 1)
         return round(score, 3)
     
     def _distance_score(self, question_id: str, answer: Any, 
@@ -163,12 +243,11 @@ class ScoringEngine:
         vote_counts = {}
         
         if isinstance(answer, list):
-            # 组合题（如火锅调料）
+            # 组合题（如火锅调料）与其他多选答案按组合计数（问题统计的 combo: 字段）
             for key, value in stats.items():
                 if key.startswith("combo:"):
-                    combo = key.replace("combo:", "")
-                    vote_counts[combo] = int(value)
-            
+                    vote_counts[key.replace("combo:", "")] = int(value)
+
             user_combo = ",".join(sorted(answer))
             
         else:
@@ -210,7 +289,11 @@ class ScoringEngine:
                          config: Dict[str, Any]) -> float:
         """动态Y/N判定评分"""
         stats = self.redis_manager.get_question_stats(question_id)
-        
+        return self._dynamic_yn_from_stats(answer, stats)
+
+    @staticmethod
+    def _dynamic_yn_from_stats(answer: str, stats: Dict[str, Any]) -> float:
+        """根据Y/N票数统计判定得分"""
         y_count = int(stats.get("option:Y", 0))
         n_count = int(stats.get("option:N", 0))
         
@@ -248,7 +331,7 @@ class ScoringEngine:
             return scores[rank - 1]
         return 0
 
-    def _static_mapping_score(self, answer: int, config: Dict[str, Any]) -> float:
+    def _static_mapping_score(self, question_id: str, answer: int, config: Dict[str, Any]) -> float:
         """静态映射评分"""
         # Ensure answer is an int for mapping lookup
         answer = int(answer)
@@ -262,65 +345,81 @@ class ScoringEngine:
         except (ValueError, TypeError):
             return 0.0
 
-        all_answers = self.redis_manager.get_question_answers(question_id)
-        
-        values = {}
-        for a in all_answers:
-            try:
-                values[a["user_id"]] = float(a["answer"])
-            except (ValueError, TypeError):
-                continue
+        values = self.redis_manager.get_numeric_answers(question_id)
+        position = self._rank_position(values, user_value)
 
-        if not values:
+        if position["total"] == 0:
             return config["range"][1]
 
         # Determine ranking direction based on the question
         reverse_rank = False
         if question_id == 'f':
             # For 'f', check the distribution of 'a1' answers
-            a1_answers = self.redis_manager.get_question_answers("a1")
-            a1_values = [a["answer"] for a in a1_answers]
-            y_count = a1_values.count("Y")
-            n_count = a1_values.count("N")
+            a1_stats = self.redis_manager.get_question_stats("a1")
+            y_count = int(a1_stats.get("option:Y", 0))
+            n_count = int(a1_stats.get("option:N", 0))
             if n_count > y_count:
                 reverse_rank = True
         elif question_id == 'l':
             # For 'l', check the distribution of its own answers
-            l_values = values.values()
-            zero_count = sum(1 for v in l_values if v == 0)
-            non_zero_count = len(l_values) - zero_count
+            zero_count = sum(1 for value in values if value == 0)
+            non_zero_count = position["total"] - zero_count
             if zero_count > non_zero_count:
                 reverse_rank = True
 
-        # Sort values by score (ascending by default)
-        sorted_values = sorted(values.items(), key=lambda item: item[1], reverse=reverse_rank)
-        
-        # Find user's rank
-        rank = -1
-        for i, (user, score) in enumerate(sorted_values):
-            if score == user_value:
-                rank = i + 1
-                break
-        
-        if rank == -1: # Should not happen if user is in values
-            rank = len(sorted_values) + 1
+        # Find user's rank (first occurrence, ascending by default)
+        if position["equal"] == 0: # Should not happen if user is in values
+            rank = position["total"] + 1
+        elif reverse_rank:
+            rank = position["greater"] + 1
+        else:
+            rank = position["less"] + 1
 
         # Linear mapping
         min_score, max_score = config["range"]
-        if len(sorted_values) == 1:
+        if position["total"] == 1:
             return max_score
             
-        score = max_score - (rank - 1) * (max_score - min_score) / (len(sorted_values) - 1)
+        score = max_score - (rank - 1) * (max_score - min_score) / (position["total"] - 1)
         return round(score, 3)
 
+    def _consensus_distance_score(self, question_id: str, answer: Any,
+                                  config: Dict[str, Any]) -> float:
+        """共识距离评分：与多数人选择的选项组合（共识油碟）越接近得分越高"""
+        stats = self.redis_manager.get_question_stats(question_id)
+        total = self.redis_manager.get_question_respondent_count(question_id)
+        counts = np.array([int(stats.get(f"option:{option}", 0)) for option in config["options"]])
+        consensus = self._consensus_mask(counts, total)
+        return self._consensus_scores(np.array([combination_mask(question_id, answer)]), consensus, config)[0]
+
+    @staticmethod
+    def _consensus_mask(option_counts: np.ndarray, total: int) -> int:
+        """超过半数回答者选择的选项组成的位掩码"""
+        return int(sum(1 << i for i in np.flatnonzero(2 * np.asarray(option_counts) > total)))
+
+    @staticmethod
+    def _consensus_scores(masks: np.ndarray, consensus: int, config: Dict[str, Any]) -> List[float]:
+        """按与共识位掩码的距离（jaccard或hamming）线性映射到分数区间"""
+        n_options = len(config["options"])
+        masks = np.asarray(masks, dtype=np.int64)
+        if config.get("metric") == "hamming":
+            distances = popcount(masks ^ consensus, n_options) / n_options
+        else:
+            union = popcount(masks | consensus, n_options)
+            overlap = popcount(masks & consensus, n_options)
+            # 两者都为空时视为完全一致
+            distances = 1 - np.divide(overlap, union, out=np.ones(len(masks)), where=union > 0)
+        min_score, max_score = config["range"]
+        scores = max_score - distances * (max_score - min_score)
+        return [round(score, 3) for score in scores.tolist()]
+
     def calculate_axes_scores(self, user_id: str):
         """计算用户的X, Y轴得分"""
         scores = self.redis_manager.get_user_scores(user_id)
         answers = self.redis_manager.get_user_answers(user_id)
 
         # X-axis: 实际重庆人
-        x_keys = ["a1", "a2", "b1", "c1", "c2", "c3", "e"]
-        raw_x = sum(scores.get(k, 0) for k in x_keys)
+        raw_x = sum(scores.get(k, 0) for k in X_AXIS_KEYS)
 
         b1_answer = answers.get("b1", {}).get("answer")
         if b1_answer == "YY":
@@ -345,8 +444,7 @@ class ScoringEngine:
         score_h1 = scores.get("h1", 0) # 区县
         score_h2 = scores.get("h2", 0) # 直辖
         
-        suyang_keys = ["f", "g", "j", "k", "l", "m", "n", "o1", "o2", "o3", "o4", "o5"]
-        score_suyang = sum(scores.get(k, 0) for k in suyang_keys)
+        score_suyang = sum(scores.get(k, 0) for k in SUYANG_KEYS)
 
         # 3. Calculate final weighted Y score
         raw_y = (w_d1 * score_h1) + (w_d2 * score_h2) + (w_d3 * score_suyang)
@@ -356,38 +454,116 @@ class ScoringEngine:
 
     def get_final_axes_scores(self, user_id: str) -> Tuple[float, float]:
         """获取用户最终的[-100, 100]范围内的坐标"""
-        all_axes_scores = self.redis_manager.get_all_user_raw_axes()
+        distribution = self.get_axis_distribution()
         
         user_raw_x, user_raw_y = self.redis_manager.get_user_raw_axes(user_id)
 
-        all_raw_x = [s['x'] for s in all_axes_scores]
-        all_raw_y = [s['y'] for s in all_axes_scores]
-
-        def map_to_scale(value, values):
-            if len(values) <= 1:
-                return 0
-            
-            median_val = np.median(values)
-            min_val = np.min(values)
-            max_val = np.max(values)
-
-            if value >= median_val:
-                # Avoid division by zero if all values above median are the same
-                if max_val == median_val:
-                    return 0
-                return 100 * (value - median_val) / (max_val - median_val)
-            else:
-                # Avoid division by zero if all values below median are the same
-                if min_val == median_val:
-                    return 0
-                return -100 * (value - median_val) / (min_val - median_val)
-
-        final_x = map_to_scale(user_raw_x, all_raw_x)
-        final_y = map_to_scale(user_raw_y, all_raw_y)
+        final_x = self._map_to_scale(user_raw_x, distribution["x"])
+        final_y = self._map_to_scale(user_raw_y, distribution["y"])
         
         self.redis_manager.save_user_final_axes(user_id, final_x, final_y)
         return final_x, final_y
 
+    def get_all_final_axes_scores(self) -> Dict[str, Tuple[float, float]]:
+        """一次性计算并保存所有已有原始坐标的用户的最终坐标
+
+        读取原始坐标与写回结果各一次pipeline，映射对整列向量化计算，结果与逐个调用get_final_axes_scores相同。
+        """
+        raw_axes = self.redis_manager.get_raw_axes_by_user()
+        if not raw_axes:
+            return {}
+        distribution = self.get_axis_distribution()
+
+        user_ids = list(raw_axes)
+        raw = np.array([raw_axes[user_id] for user_id in user_ids], dtype=float)
+        final_x = self._map_to_scale_array(raw[:, 0], distribution["x"])
+        final_y = self._map_to_scale_array(raw[:, 1], distribution["y"])
+        final_axes = dict(zip(user_ids, zip(final_x.tolist(), final_y.tolist())))
+
+        self.redis_manager.save_all_user_final_axes(final_axes)
+        return final_axes
+
+    def get_axis_distribution(self) -> Dict[str, Dict[str, Any]]:
+        """获取全体用户原始坐标的分布，按原始坐标版本号缓存在进程内和Redis中"""
+        version, cached = self.redis_manager.get_axis_stats()
+        if self._axis_stats_cache and self._axis_stats_cache[0] == version:
+            return self._axis_stats_cache[1]
+
+        if cached is None:
+            # 版本号先于原始坐标读取，期间若有写入，缓存会因版本过期而在下次重新计算
+            all_axes_scores = self.redis_manager.get_all_user_raw_axes()
+            all_raw_x = [s['x'] for s in all_axes_scores]
+            all_raw_y = [s['y'] for s in all_axes_scores]
+            stats = self._axis_cache_entry(all_raw_x, all_raw_y)
+            self.redis_manager.save_axis_stats(version, **stats)
+            cached = {"x": stats["x"], "y": stats["y"]}
+
+        self._axis_stats_cache = (version, cached)
+        return cached
+
+    @classmethod
+    def _axis_cache_entry(cls, all_raw_x: List[float], all_raw_y: List[float]) -> Dict[str, Any]:
+        """构造轴分布缓存内容"""
+        return {
+            "x": cls._axis_stats(all_raw_x),
+            "y": cls._axis_stats(all_raw_y),
+            "x_sorted": sorted(all_raw_x),
+            "y_sorted": sorted(all_raw_y),
+        }
+
+    @staticmethod
+    def _axis_stats(values: List[float]) -> Dict[str, Any]:
+        """计算一个轴上全体用户的分布统计（中位数、最小值、最大值）"""
+        if len(values) <= 1:
+            return {"count": len(values)}
+        return {
+            "count": len(values),
+            "median": float(np.median(values)),
+            "min": float(np.min(values)),
+            "max": float(np.max(values)),
+        }
+
+    @staticmethod
+    def _map_to_scale(value: float, stats: Dict[str, Any]) -> float:
+        """以中位数为锚点，将原始分映射到[-100, 100]"""
+        if stats["count"] <= 1:
+            return 0
+
+        median_val = stats["median"]
+        min_val = stats["min"]
+        max_val = stats["max"]
+
+        if value >= median_val:
+            # Avoid division by zero if all values above median are the same
+            if max_val == median_val:
+                return 0
+            return float(100 * (value - median_val) / (max_val - median_val))
+        else:
+            # Avoid division by zero if all values below median are the same
+            if min_val == median_val:
+                return 0
+            return float(-100 * (value - median_val) / (min_val - median_val))
+
+    @staticmethod
+    def _map_to_scale_array(values: np.ndarray, stats: Dict[str, Any]) -> np.ndarray:
+        """_map_to_scale的向量化版本：一次映射整列原始分，运算顺序相同，结果逐个相等"""
+        values = np.asarray(values, dtype=float)
+        mapped = np.zeros(len(values))
+        if stats["count"] <= 1:
+            return mapped
+
+        median_val = stats["median"]
+        min_val = stats["min"]
+        max_val = stats["max"]
+
+        above = values >= median_val
+        if max_val != median_val:
+            mapped[above] = 100 * (values[above] - median_val) / (max_val - median_val)
+        if min_val != median_val:
+            below = ~above
+            mapped[below] = -100 * (values[below] - median_val) / (min_val - median_val)
+        return mapped
+
     def calculate_question_scores(self, question_id: str) -> Dict[str, Any]:
         """计算问题的统计得分"""
         all_answers = self.redis_manager.get_question_answers(question_id)
@@ -430,22 +606,450 @@ class ScoringEngine:
         return avg_x, avg_y
 
     def recalculate_all_scores(self):
-        """重新计算所有用户的得分（用于距离评分等需要全局信息的题目）"""
-        all_users = self.redis_manager.get_all_users()
-        
+        """重新计算所有用户的得分（用于距离评分等需要全局信息的题目）
+
+        一次性批量读取全部答案构建列式快照，每道题的全体统计只计算一次，
+        再用NumPy对所有用户向量化评分，最后通过一个pipeline写回。
+        """
+        snapshot, summaries = self._load_population()
+        all_users = snapshot.user_ids
+
         # First, recalculate individual question scores for all users
-        for user_id in all_users:
-            self.calculate_user_scores(user_id)
-        
+        with self._observe("phase", "question_scores"):
+            user_scores = {user_id: {} for user_id in all_users}
+            for question_id in SCORED_QUESTIONS:
+                respondents = snapshot.respondents(question_id)
+                if not len(respondents):
+                    continue
+                with self._observe("rule", question_id, QUESTIONS[question_id]["rule"], len(respondents)):
+                    question_scores = self._score_answers(
+                        question_id, snapshot, respondents, QUESTIONS[question_id], summaries[question_id]
+                    )
+                for i, score in zip(respondents, question_scores):
+                    user_scores[all_users[i]][question_id] = float(score)
+
         # Then, calculate raw axes scores for all users
-        for user_id in all_users:
-            self.calculate_axes_scores(user_id)
-            
+        with self._observe("phase", "raw_axes"):
+            all_raw_x, all_raw_y = self._batch_axes_scores(
+                all_users, snapshot, user_scores, summaries[AXIS_WEIGHTS_SUMMARY]
+            )
+            raw_axes = dict(zip(all_users, zip(all_raw_x, all_raw_y)))
+
         # Finally, calculate final scaled axes scores for all users
-        for user_id in all_users:
-            self.get_final_axes_scores(user_id)
+        with self._observe("phase", "final_axes"):
+            axis_stats = self._axis_cache_entry(all_raw_x, all_raw_y)
+            x_stats, y_stats = axis_stats["x"], axis_stats["y"]
+            summaries[AXIS_STATS_SUMMARY] = {"x": x_stats, "y": y_stats}
+            final_axes = dict(zip(all_users, zip(self._map_to_scale_array(all_raw_x, x_stats).tolist(),
+                                                 self._map_to_scale_array(all_raw_y, y_stats).tolist())))
 
         # 更新问题统计
-        for question_id in QUESTIONS.keys():
-            if QUESTIONS[question_id].get("rule"):
-                self.calculate_question_scores(question_id) 
\ No newline at end of file
+        with self._observe("phase", "question_stats"):
+            question_score_data = {
+                question_id: self._question_score_data(question_id, snapshot, user_scores)
+                for question_id in SCORED_QUESTIONS
+            }
+
+        with self._observe("phase", "save_results"):
+            self.redis_manager.save_recompute_results(
+                user_scores, raw_axes, final_axes, question_score_data,
+                summaries={key: self._summary_digest(summary) for key, summary in summaries.items()},
+                axis_stats=axis_stats,
+                positions=final_axes,
+                keyframe=True
+            )
+
+    def recalculate_incremental(self, changed_user_ids: List[str]) -> Dict[str, Any]:
+        """增量重算：只重算全体统计发生变化的题目以及得分/坐标实际改变的用户
+
+        与上次重算保存的各题摘要（排序后的数值、众数排名、平均值、a1多数、d权重、轴分布）比较，
+        摘要未变的题目只为本次提交答案的用户评分。结果与recalculate_all_scores一致。
+        """
+        snapshot, summaries = self._load_population()
+        all_users = snapshot.user_ids
+        with self._observe("phase", "load_results"):
+            previous_digests = self.redis_manager.get_scoring_summaries()
+            stored = self.redis_manager.get_all_user_results(all_users)
+        digests = {key: self._summary_digest(summary) for key, summary in summaries.items()}
+        changed_users = set(changed_user_ids) & set(all_users)
+        changed_indices = np.array(sorted(snapshot.user_index[user_id] for user_id in changed_users), dtype=int)
+
+        # 1. 题目得分：摘要变化的题目重算全体回答者，否则只重算提交者
+        changed_questions = [q_id for q_id in SCORED_QUESTIONS if previous_digests.get(q_id) != digests[q_id]]
+        with self._observe("phase", "question_scores"):
+            user_scores = {user_id: dict(stored[user_id]["scores"]) for user_id in all_users}
+            score_changed_users = set()
+            rescored_questions = set()
+            for question_id in SCORED_QUESTIONS:
+                targets = snapshot.respondents(question_id)
+                if question_id not in changed_questions:
+                    targets = targets[np.isin(targets, changed_indices)]
+                if not len(targets):
+                    continue
+
+                rescored_questions.add(question_id)
+                with self._observe("rule", question_id, QUESTIONS[question_id]["rule"], len(targets)):
+                    question_scores = self._score_answers(
+                        question_id, snapshot, targets, QUESTIONS[question_id], summaries[question_id]
+                    )
+                for i, score in zip(targets, question_scores):
+                    user_id = all_users[i]
+                    if user_scores[user_id].get(question_id) != float(score):
+                        user_scores[user_id][question_id] = float(score)
+                        score_changed_users.add(user_id)
+
+        # 2. 原始坐标：d权重变化时全部重算，否则只重算得分或答案有变化的用户
+        touched = score_changed_users | changed_users
+        if previous_digests.get(AXIS_WEIGHTS_SUMMARY) != digests[AXIS_WEIGHTS_SUMMARY]:
+            axis_users = list(all_users)
+        else:
+            axis_users = [u for u in all_users if u in touched or stored[u]["raw"] is None]
+
+        with self._observe("phase", "raw_axes"):
+            raw_axes = {user_id: stored[user_id]["raw"] for user_id in all_users}
+            raw_changed_users = set()
+            new_raw_x, new_raw_y = self._batch_axes_scores(
+                axis_users, snapshot, user_scores, summaries[AXIS_WEIGHTS_SUMMARY]
+            )
+            for user_id, raw in zip(axis_users, zip(new_raw_x, new_raw_y)):
+                if raw_axes[user_id] != raw:
+                    raw_axes[user_id] = raw
+                    raw_changed_users.add(user_id)
+
+        # 3. 最终坐标：轴分布（中位数、最值）变化时全部重映射，否则只映射原始坐标变化的用户
+        with self._observe("phase", "final_axes"):
+            axis_stats = self._axis_cache_entry([raw_axes[u][0] for u in all_users],
+                                                [raw_axes[u][1] for u in all_users])
+            x_stats, y_stats = axis_stats["x"], axis_stats["y"]
+            summaries[AXIS_STATS_SUMMARY] = {"x": x_stats, "y": y_stats}
+            digests[AXIS_STATS_SUMMARY] = self._summary_digest(summaries[AXIS_STATS_SUMMARY])
+            if previous_digests.get(AXIS_STATS_SUMMARY) != digests[AXIS_STATS_SUMMARY]:
+                final_users = list(all_users)
+            else:
+                final_users = [u for u in all_users if u in raw_changed_users or stored[u]["final"] is None]
+
+            final_axes = {}
+            if final_users:
+                raw = np.array([raw_axes[user_id] for user_id in final_users], dtype=float)
+                mapped = zip(self._map_to_scale_array(raw[:, 0], x_stats).tolist(),
+                             self._map_to_scale_array(raw[:, 1], y_stats).tolist())
+                for user_id, final in zip(final_users, mapped):
+                    if stored[user_id]["final"] != final:
+                        final_axes[user_id] = final
+
+        with self._observe("phase", "question_stats"):
+            question_score_data = {
+                question_id: self._question_score_data(question_id, snapshot, user_scores)
+                for question_id in SCORED_QUESTIONS if question_id in rescored_questions
+            }
+
+        with self._observe("phase", "save_results"):
+            self.redis_manager.save_recompute_results(
+                {user_id: user_scores[user_id] for user_id in score_changed_users},
+                {user_id: raw_axes[user_id] for user_id in raw_changed_users},
+                final_axes,
+                question_score_data,
+                summaries=digests,
+                axis_stats=axis_stats,
+                positions={user_id: final_axes.get(user_id, stored[user_id]["final"]) for user_id in all_users}
+            )
+
+        touched_users = score_changed_users | raw_changed_users | set(final_axes)
+        return {
+            "changed_questions": changed_questions,
+            "touched_users": len(touched_users),
+            "total_users": len(all_users),
+        }
+
+    def _load_population(self) -> Tuple[PopulationSnapshot, Dict[str, Any]]:
+        """批量读取所有答案构建快照，并计算各题及d权重的全体摘要"""
+        with self._observe("phase", "load_snapshot"):
+            snapshot = PopulationSnapshot.load(self.redis_manager)
+        with self._observe("phase", "population_summaries"):
+            summaries = self._population_summaries(snapshot)
+        return snapshot, summaries
+
+    def _population_summaries(self, snapshot: PopulationSnapshot) -> Dict[str, Any]:
+        """计算所有计分题目及d权重的全体摘要"""
+        summaries = {
+            question_id: self._population_summary(question_id, snapshot, QUESTIONS[question_id])
+            for question_id in SCORED_QUESTIONS
+        }
+        summaries[AXIS_WEIGHTS_SUMMARY] = self._axis_weights(snapshot)
+        return summaries
+
+    @staticmethod
+    def _question_score_data(question_id: str, snapshot: PopulationSnapshot,
+                             user_scores: Dict[str, Dict[str, float]]) -> Dict[str, Any]:
+        """根据内存中的得分计算问题统计（与calculate_question_scores一致）"""
+        respondents = snapshot.respondent_ids(question_id)
+        scores = [user_scores[user_id][question_id] for user_id in respondents]
+        return {
+            "avg_score": float(np.mean(scores)) if scores else 0,
+            "total_respondents": len(respondents),
+            "distribution": dict(Counter(scores))
+        }
+
+    @staticmethod
+    def _summary_digest(summary: Any) -> str:
+        """计算摘要的指纹，用于判断全体统计是否变化"""
+        encoded = json.dumps(
+            summary, sort_keys=True, ensure_ascii=False,
+            default=lambda o: o.tolist() if hasattr(o, "tolist") else str(o)
+        )
+        return hashlib.sha1(encoded.encode("utf-8")).hexdigest()
+
+    def _population_summary(self, question_id: str, snapshot: PopulationSnapshot,
+                            config: Dict[str, Any]) -> Dict[str, Any]:
+        """根据快照计算某题评分所依赖的全体统计摘要"""
+        rule = config["rule"]
+
+        if rule in (ScoringRule.REAL_TIME_RANK.value, ScoringRule.COUNT_RANK.value):
+            values = snapshot.numeric(question_id)
+            return {"values": np.sort(values[~np.isnan(values)])}
+
+        elif rule == ScoringRule.CONDITIONAL_RANK.value:
+            values = snapshot.numeric(question_id)
+            values = np.sort(values[~np.isnan(values)])
+
+            # Determine ranking direction based on the question
+            reverse_rank = False
+            if question_id == 'f':
+                # For 'f', check the distribution of 'a1' answers
+                a1_counts = snapshot.counts_by_category("a1")
+                if a1_counts.get("N", 0) > a1_counts.get("Y", 0):
+                    reverse_rank = True
+            elif question_id == 'l':
+                # For 'l', check the distribution of its own answers
+                zero_count = int(np.count_nonzero(values == 0))
+                if zero_count > len(values) - zero_count:
+                    reverse_rank = True
+            return {"values": values, "reverse": reverse_rank}
+
+        elif rule == ScoringRule.DISTANCE_SCORE.value:
+            if config.get("metric") == "abs_diff_from_avg":
+                values = snapshot.numeric(question_id)
+                values = values[~np.isnan(values)]
+                if len(values) == 0:
+                    return {"count": 0}
+                avg_value = np.mean(values)
+                return {"count": len(values), "mean": avg_value, "distances": np.sort(np.abs(values - avg_value))}
+
+            respondents = snapshot.respondents(question_id)
+            if not len(respondents) or question_id not in snapshot.codes:
+                return {"count": 0}
+            # 众数：票数最多者中最先出现的答案（与Counter.most_common一致）
+            codes = snapshot.codes[question_id][respondents]
+            counts = np.bincount(codes, minlength=len(snapshot.categories[question_id]))
+            first_seen = np.full(len(counts), len(respondents))
+            np.minimum.at(first_seen, codes, np.arange(len(codes)))
+            leaders = np.flatnonzero(counts == counts.max())
+            mode_code = leaders[np.argmin(first_seen[leaders])]
+            return {
+                "count": len(respondents),
+                "mode": snapshot.categories[question_id][mode_code],
+                "mode_count": int(counts[mode_code]),
+            }
+
+        elif rule == ScoringRule.MAJORITY_VOTE.value:
+            # 只保留影响得分的部分：各选项/组合的名次与参与排名的数量
+            summary = {}
+            for kind, vote_counts in self._vote_counts(question_id, snapshot).items():
+                sorted_votes = np.sort(np.array(list(vote_counts.values()), dtype=int))
+                # 名次 = 1 + 票数严格多于该答案的选项数
+                ranks = len(sorted_votes) - np.searchsorted(
+                    sorted_votes, np.array(list(vote_counts.values()) + [0], dtype=int), side="right"
+                ) + 1
+                summary[kind] = {
+                    "count": len(vote_counts),
+                    "ranks": dict(zip(vote_counts.keys(), ranks[:-1].tolist())),
+                    "unseen_rank": int(ranks[-1]),
+                }
+            return summary
+
+        elif rule == ScoringRule.DYNAMIC_YN.value:
+            counts = snapshot.counts_by_category(question_id)
+            return {"y_leads": counts.get("Y", 0) > counts.get("N", 0)}
+
+        elif rule == ScoringRule.VOTE_RANK_STATIC.value:
+            if not len(snapshot.respondents(question_id)):
+                return {"order": None}
+            vote_counts = snapshot.counts_by_category(question_id)
+            # Options with 0 votes won't be in vote_counts, so we add them.
+            return {"order": sorted(
+                config["options"],
+                key=lambda option: vote_counts.get(option, 0),
+                reverse=True
+            )}
+
+        elif rule == ScoringRule.CONSENSUS_DISTANCE.value:
+            respondents = snapshot.respondents(question_id)
+            return {"consensus": self._consensus_mask(snapshot.option_counts(question_id), len(respondents))}
+
+        # 静态规则不依赖全体答案
+        return {}
+
+    @staticmethod
+    def _vote_counts(question_id: str, snapshot: PopulationSnapshot) -> Dict[str, Dict[str, int]]:
+        """各选项（option）与各组合（combo）的票数，与问题统计中的计数字段一致"""
+        vote_counts = {"option": {}, "combo": {}}
+        if question_id in snapshot.masks:
+            masks, counts = np.unique(snapshot.masks[question_id][snapshot.respondents(question_id)],
+                                      return_counts=True)
+            for key, count in zip(snapshot.combo_keys(question_id, masks), counts.tolist()):
+                vote_counts["combo"][key] = count
+        elif question_id in snapshot.codes:
+            for category, count in snapshot.counts_by_category(question_id).items():
+                if isinstance(category, tuple):
+                    key = ",".join(sorted(category))
+                    vote_counts["combo"][key] = vote_counts["combo"].get(key, 0) + count
+                elif isinstance(category, str):
+                    vote_counts["option"][category] = count
+        return vote_counts
+
+    def _score_answers(self, question_id: str, snapshot: PopulationSnapshot, indices: np.ndarray,
+                       config: Dict[str, Any], summary: Dict[str, Any]) -> List[float]:
+        """根据全体摘要为快照中indices处的用户批量评分，结果与逐个调用_calculate_question_score一致"""
+        rule = config["rule"]
+        max_score = config.get("range", [0, 0])[1]
+
+        if rule in (ScoringRule.REAL_TIME_RANK.value, ScoringRule.COUNT_RANK.value,
+                    ScoringRule.CONDITIONAL_RANK.value):
+            values = summary["values"]
+            user_values = snapshot.numeric(question_id)[indices]
+            invalid = np.isnan(user_values)
+            # 第一个回答者得满分；实时排名中所有答案相同时也得满分
+            if len(values) <= 1 or (rule != ScoringRule.CONDITIONAL_RANK.value and values[0] == values[-1]):
+                return np.where(invalid, 0.0, max_score).tolist()
+
+            descending = summary.get("reverse", True) if rule == ScoringRule.CONDITIONAL_RANK.value else True
+            ranks = self._first_occurrence_ranks(values, np.where(invalid, 0.0, user_values), descending=descending)
+            scores = self._linear_rank_scores(ranks, len(values), config)
+            return [0.0 if skip else score for skip, score in zip(invalid.tolist(), scores)]
+
+        elif rule == ScoringRule.DISTANCE_SCORE.value:
+            if summary["count"] <= 1:
+                return [max_score] * len(indices)
+
+            if config.get("metric") == "abs_diff_from_avg":
+                user_distances = np.abs(snapshot.numeric(question_id)[indices] - summary["mean"])
+                ranks = self._first_occurrence_ranks(summary["distances"], user_distances)
+            else:
+                # 与众数相同距离为0（名次1），否则距离为1（名次排在所有众数之后）
+                has_others = summary["count"] > summary["mode_count"]
+                other_rank = summary["mode_count"] + 1 if has_others else summary["count"] + 1
+                ranks = np.array([
+                    1 if answer == summary["mode"] else other_rank
+                    for answer in snapshot.category_values(question_id, indices)
+                ])
+            return self._linear_rank_scores(ranks, summary["count"], config)
+
+        elif rule == ScoringRule.MAJORITY_VOTE.value:
+            scores = np.full(len(indices), max_score, dtype=float)
+            if question_id in snapshot.masks:
+                masks, inverse = np.unique(snapshot.masks[question_id][indices], return_inverse=True)
+                kinds = np.full(len(indices), "combo", dtype=object)
+                keys = np.array(snapshot.combo_keys(question_id, masks), dtype=object)[inverse.reshape(-1)]
+            else:
+                answers = snapshot.category_values(question_id, indices)
+                kinds = np.array(["combo" if isinstance(a, tuple) else "option" for a in answers], dtype=object)
+                keys = np.array([",".join(sorted(a)) if isinstance(a, tuple) else a for a in answers], dtype=object)
+            for kind in ("combo", "option"):
+                votes = summary[kind]
+                selected = np.flatnonzero(kinds == kind)
+                if not len(selected) or votes["count"] <= 1:
+                    continue
+                ranks = np.array([votes["ranks"].get(key, votes["unseen_rank"]) for key in keys[selected]])
+                scores[selected] = self._linear_rank_scores(ranks, votes["count"], config)
+            return scores.tolist()
+
+        elif rule == ScoringRule.DYNAMIC_YN.value:
+            leader = "Y" if summary["y_leads"] else "N"
+            return np.where(snapshot.category_values(question_id, indices) == leader, 1, -1).tolist()
+
+        elif rule == ScoringRule.VOTE_RANK_STATIC.value:
+            scores = config.get("scores", [])
+            if summary["order"] is None:
+                return [scores[0]] * len(indices) # First voter gets top score
+            option_scores = {
+                option: scores[rank] if rank < len(scores) else 0
+                for rank, option in enumerate(summary["order"])
+            }
+            return [option_scores.get(answer, 0) for answer in snapshot.category_values(question_id, indices)]
+
+        elif rule == ScoringRule.CONSENSUS_DISTANCE.value:
+            masks = snapshot.masks.get(question_id, np.zeros(len(snapshot), dtype=np.int64))
+            return self._consensus_scores(masks[indices], summary["consensus"], config)
+
+        elif rule == ScoringRule.STATIC_WEIGHT.value and question_id in snapshot.codes:
+            weights = config.get("weights", {})
+            return [weights.get(answer, 0) for answer in snapshot.category_values(question_id, indices)]
+
+        # 其余与全体分布无关的规则直接逐个计算
+        return [
+            self._calculate_question_score(question_id, snapshot.answer(question_id, i), config, None)
+            for i in indices
+        ]
+
+    @staticmethod
+    def _linear_rank_scores(ranks: np.ndarray, n: int, config: Dict[str, Any]) -> List[float]:
+        """将排名线性映射到分数区间（与单用户评分的舍入方式保持一致）"""
+        min_score, max_score = config["range"]
+        scores = max_score - (ranks - 1) * (max_score - min_score) / (n - 1)
+        return [round(score, 3) for score in scores.tolist()]
+
+    @staticmethod
+    def _first_occurrence_ranks(sorted_values: np.ndarray, user_values: np.ndarray,
+                                descending: bool = False) -> np.ndarray:
+        """在已排序数组中查找每个值第一次出现的名次（从1开始），不存在则为len+1"""
+        n = len(sorted_values)
+        if descending:
+            # 降序中第一次出现的位置 = 严格大于该值的个数
+            position = n - np.searchsorted(sorted_values, user_values, side="right")
+            present = position < n
+            present[present] = sorted_values[n - 1 - position[present]] == user_values[present]
+        else:
+            position = np.searchsorted(sorted_values, user_values, side="left")
+            present = position < n
+            present[present] = sorted_values[position[present]] == user_values[present]
+        return np.where(present, position + 1, n + 1)
+
+    @staticmethod
+    def _axis_weights(snapshot: PopulationSnapshot) -> Tuple[float, float, float]:
+        """根据问题d的分布计算Y轴三个维度的权重"""
+        total_d = len(snapshot.respondents("d"))
+        w_d1, w_d2, w_d3 = 0, 0, 0
+        if total_d > 0:
+            d_counts = snapshot.counts_by_category("d")
+            w_d1 = d_counts.get("区县", 0) / total_d
+            w_d2 = d_counts.get("直辖", 0) / total_d
+            w_d3 = d_counts.get("素养", 0) / total_d
+        return w_d1, w_d2, w_d3
+
+    def _batch_axes_scores(self, user_ids: List[str], snapshot: PopulationSnapshot,
+                           user_scores: Dict[str, Dict[str, float]],
+                           weights: Tuple[float, float, float]) -> Tuple[List[float], List[float]]:
+        """批量计算用户的X, Y轴原始得分（与calculate_axes_scores一致）"""
+        def column(key):
+            return np.array([user_scores[user_id].get(key, 0) for user_id in user_ids], dtype=float)
+
+        # X-axis: 实际重庆人
+        raw_x = np.zeros(len(user_ids))
+        for key in X_AXIS_KEYS:
+            raw_x = raw_x + column(key)
+
+        b1_answers = snapshot.category_values(
+            "b1", np.array([snapshot.user_index[user_id] for user_id in user_ids], dtype=int)
+        )
+        raw_x = np.where(b1_answers == "YY", raw_x + column("b2"), raw_x)
+        raw_x = np.where(b1_answers == "YN", raw_x + (column("b3") + column("b4")), raw_x)
+        raw_x = np.where(b1_answers == "NN", raw_x + column("b5"), raw_x)
+
+        # Y-axis: 精神重庆人 (weighted)
+        w_d1, w_d2, w_d3 = weights
+        score_suyang = np.zeros(len(user_ids))
+        for key in SUYANG_KEYS:
+            score_suyang = score_suyang + column(key)
+
+        raw_y = (w_d1 * column("h1")) + (w_d2 * column("h2")) + (w_d3 * score_suyang)
+        return raw_x.tolist(), raw_y.tolist()
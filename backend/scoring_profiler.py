@@ -0,0 +1,205 @@
+"""
+评分引擎的钩子与性能分析
+
+ScoringHook为ScoringEngine.add_hook注册的钩子基类；ScoringTimer按规则、题目、阶段与用户汇总耗时；
+profile_recalculation在计时的同时用cProfile（或pyinstrument，需 pip install pyinstrument）
+采集一次完整的recalculate_all_scores：
+    python -m backend.scoring_profiler --output profile.json --raw recalc.prof
+    python -m backend.scoring_profiler --tool pyinstrument --raw profile.html
+"""
+import argparse
+import cProfile
+import io
+import json
+import marshal
+import os
+import pstats
+import sys
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, List
+
+# Add project root to path to allow running this file directly
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backend.redis_manager import RedisManager
+from backend.scoring_engine import ScoringEngine
+
+try:
+    from pyinstrument import Profiler as InstrumentProfiler
+except ImportError:
+    InstrumentProfiler = None
+
+PROFILE_TOOLS = ("cprofile", "pyinstrument")
+
+
+class ScoringHook:
+    """评分引擎钩子：按需覆盖以下方法，默认不做任何事
+
+    rule为ScoringRule的值，users为本次评分的用户数（单用户评分为1，批量重算为回答者人数），
+    seconds为对应代码块的耗时。重算阶段见ScoringEngine.recalculate_all_scores/recalculate_incremental。
+    """
+
+    def before_rule(self, question_id: str, rule: str, users: int):
+        pass
+
+    def after_rule(self, question_id: str, rule: str, users: int, seconds: float):
+        pass
+
+    def before_user(self, user_id: str):
+        pass
+
+    def after_user(self, user_id: str, seconds: float):
+        pass
+
+    def before_phase(self, phase: str):
+        pass
+
+    def after_phase(self, phase: str, seconds: float):
+        pass
+
+
+class ScoringTimer(ScoringHook):
+    """按规则、题目、重算阶段汇总调用次数、评分人数与耗时"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.rules: Dict[str, Dict[str, float]] = {}
+            self.questions: Dict[str, Dict[str, Any]] = {}
+            self.phases: Dict[str, Dict[str, float]] = {}
+            self.users = {"calls": 0, "seconds": 0.0}
+
+    def after_rule(self, question_id: str, rule: str, users: int, seconds: float):
+        with self._lock:
+            for entry in (self.rules.setdefault(rule, {"calls": 0, "users": 0, "seconds": 0.0}),
+                          self.questions.setdefault(question_id,
+                                                    {"rule": rule, "calls": 0, "users": 0, "seconds": 0.0})):
+                entry["calls"] += 1
+                entry["users"] += users
+                entry["seconds"] += seconds
+
+    def after_user(self, user_id: str, seconds: float):
+        with self._lock:
+            self.users["calls"] += 1
+            self.users["seconds"] += seconds
+
+    def after_phase(self, phase: str, seconds: float):
+        with self._lock:
+            entry = self.phases.setdefault(phase, {"calls": 0, "seconds": 0.0})
+            entry["calls"] += 1
+            entry["seconds"] += seconds
+
+    @staticmethod
+    def _rows(entries: Dict[str, Dict[str, Any]], key: str) -> List[Dict[str, Any]]:
+        """按累计耗时从高到低排列，附每人平均耗时（微秒）"""
+        rows = []
+        for name, entry in sorted(entries.items(), key=lambda item: -item[1]["seconds"]):
+            row = {key: name, **entry, "seconds": round(entry["seconds"], 6)}
+            if entry.get("users"):
+                row["us_per_user"] = round(entry["seconds"] * 1e6 / entry["users"], 2)
+            rows.append(row)
+        return rows
+
+    def report(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "phases": self._rows(self.phases, "phase"),
+                "rules": self._rows(self.rules, "rule"),
+                "questions": self._rows(self.questions, "question_id"),
+                "users": {"calls": self.users["calls"], "seconds": round(self.users["seconds"], 6)},
+            }
+
+
+def profile_recalculation(scoring_engine, tool: str = "cprofile", limit: int = 40,
+                          sort: str = "cumulative") -> Dict[str, Any]:
+    """计时并采集一次完整的recalculate_all_scores
+
+    返回的报告包含ScoringTimer的汇总与性能分析文本（cProfile按sort排序的前limit项，
+    或pyinstrument的调用树）；原始数据放在 "raw" 中（cProfile为可用pstats/snakeviz打开的
+    .prof内容，pyinstrument为HTML），不参与JSON序列化。
+    """
+    if tool not in PROFILE_TOOLS:
+        raise ValueError(f"Unknown profile tool: {tool}")
+    if tool == "pyinstrument" and InstrumentProfiler is None:
+        raise RuntimeError("pyinstrument is not installed (pip install pyinstrument)")
+
+    timer = ScoringTimer()
+    scoring_engine.add_hook(timer)
+    profiler = cProfile.Profile() if tool == "cprofile" else InstrumentProfiler()
+    started = time.perf_counter()
+    try:
+        if tool == "cprofile":
+            profiler.enable()
+        else:
+            profiler.start()
+        try:
+            scoring_engine.recalculate_all_scores()
+        finally:
+            if tool == "cprofile":
+                profiler.disable()
+            else:
+                profiler.stop()
+    finally:
+        scoring_engine.remove_hook(timer)
+    elapsed = time.perf_counter() - started
+
+    if tool == "cprofile":
+        text = io.StringIO()
+        stats = pstats.Stats(profiler, stream=text)
+        stats.sort_stats(sort).print_stats(limit)
+        # 与Stats.dump_stats写出的文件格式相同
+        raw = marshal.dumps(stats.stats)
+        profile_text = text.getvalue()
+    else:
+        raw = profiler.output_html()
+        profile_text = profiler.output_text(unicode=True, color=False)
+
+    return {
+        "tool": tool,
+        "timestamp": datetime.now().isoformat(),
+        "users": len(scoring_engine.redis_manager.get_all_users()),
+        "wall_s": round(elapsed, 4),
+        "timers": timer.report(),
+        "profile": profile_text,
+        "raw": raw,
+    }
+
+
+def report_json(report: Dict[str, Any]) -> str:
+    """报告的JSON文本（不含原始分析数据）"""
+    return json.dumps({key: value for key, value in report.items() if key != "raw"},
+                      ensure_ascii=False, indent=2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Profile a full recalculate_all_scores run")
+    parser.add_argument("--tool", choices=PROFILE_TOOLS, default="cprofile")
+    parser.add_argument("--limit", type=int, default=40, help="functions listed in the cProfile report")
+    parser.add_argument("--sort", default="cumulative", help="cProfile sort key")
+    parser.add_argument("--output", help="write the JSON report to this file")
+    parser.add_argument("--raw", help="write the raw profile (.prof for cProfile, .html for pyinstrument)")
+    args = parser.parse_args()
+
+    redis_manager = RedisManager()
+    report = profile_recalculation(ScoringEngine(redis_manager), args.tool, args.limit, args.sort)
+    redis_manager.close()
+
+    encoded = report_json(report)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(encoded)
+    else:
+        print(encoded)
+    if args.raw:
+        mode, raw = ("wb", report["raw"]) if isinstance(report["raw"], bytes) else ("w", report["raw"])
+        with open(args.raw, mode) as f:
+            f.write(raw)
+
+
+if __name__ == "__main__":
+    main()
@@ -21,6 +21,7 @@ class ScoringRule(Enum):
     VOTE_RANK_STATIC = "vote_rank_static"
     CONDITIONAL_RANK = "conditional_rank"
     STATIC_MAPPING = "static_mapping"
+    CONSENSUS_DISTANCE = "consensus_distance"
 
 QUESTIONS: Dict[str, Dict[str, Any]] = {
     # Unscored
@@ -63,4 +64,16 @@ QUESTIONS: Dict[str, Dict[str, Any]] = {
     "o3": {"id": "o3", "label": "量身高：今日在山城巷消费", "type": QuestionType.NUMBER.value, "rule": ScoringRule.REAL_TIME_RANK.value, "range": [0, 0.2], "input_type": "money"},
     "o4": {"id": "o4", "label": "量身高：2024 年带来的外地游客数", "type": QuestionType.NUMBER.value, "rule": ScoringRule.REAL_TIME_RANK.value, "range": [0, 0.2], "input_type": "count"},
     "o5": {"id": "o5", "label": "量身高：人生迄今带来的重庆户口数", "type": QuestionType.NUMBER.value, "rule": ScoringRule.REAL_TIME_RANK.value, "range": [0, 0.2], "input_type": "count"}
-} 
\ No newline at end of file
+}
+
+# 数值题答案分布的直方图分桶（按 input_type）：从0起宽度为width的定宽区间，不小于max的答案计入溢出桶，
+# 每题的计数字段数不超过 max / width + 2，与答案取值的多少无关
+HISTOGRAM_BINS: Dict[str, Dict[str, int]] = {
+    "positive_integer": {"width": 1, "max": 20},
+    "months": {"width": 12, "max": 360},
+    "height_cm": {"width": 5, "max": 250},
+    "years": {"width": 1, "max": 40},
+    "money": {"width": 50, "max": 1000},
+    "count": {"width": 1, "max": 20},
+}
+DEFAULT_HISTOGRAM_BINS = {"width": 10, "max": 100}